@@ -0,0 +1,161 @@
+# analysis/backtest/monte_carlo.py
+"""
+Monte Carlo Robustness Engine
+=============================
+
+✅ يعيد ترتيب/سحب نتائج الصفقات (R-Multiples) آلاف المرات
+✅ Bootstrap (سحب مع الإرجاع) أو Shuffle (نفس الصفقات بترتيب مختلف)
+✅ المحاكاة مقسّمة Batches وتتوزع على Process Pool
+✅ تقرير Percentiles لكل من: العائد النهائى + أقصى Drawdown
+✅ كل Batch بـ seed ثابت → نتائج قابلة للتكرار
+"""
+
+import os
+import random
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate
+
+from analysis.backtest.trade_stats import trades_to_r_array
+
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+# =====================
+# Worker
+# =====================
+def _simulate_batch(r_values, n_sims, method, seed):
+    """
+    يرجّع (returns, drawdowns) كمصفوفتين array('d') بطول n_sims
+    """
+    rng = random.Random(seed)
+    r_list = list(r_values)
+    n = len(r_list)
+
+    returns = array("d")
+    drawdowns = array("d")
+
+    for _ in range(n_sims):
+        if method == "shuffle":
+            seq = r_list[:]
+            rng.shuffle(seq)
+        else:
+            seq = rng.choices(r_list, k=n)
+
+        peak = 0.0
+        max_dd = 0.0
+        equity = 0.0
+        for equity in accumulate(seq):
+            if equity > peak:
+                peak = equity
+            elif peak - equity > max_dd:
+                max_dd = peak - equity
+
+        returns.append(equity)
+        drawdowns.append(max_dd)
+
+    return returns, drawdowns
+
+
+# =====================
+# Helpers
+# =====================
+def _percentiles(values, points=PERCENTILES):
+    if not values:
+        return {f"p{p}": 0.0 for p in points}
+    s = sorted(values)
+    n = len(s)
+    out = {}
+    for p in points:
+        k = (n - 1) * p / 100.0
+        lo = int(k)
+        hi = min(lo + 1, n - 1)
+        out[f"p{p}"] = round(s[lo] + (s[hi] - s[lo]) * (k - lo), 4)
+    return out
+
+
+# =====================
+# Main
+# =====================
+def run_monte_carlo(
+    trades=None,
+    r_values=None,
+    n_sims=10000,
+    method="bootstrap",
+    batch_size=1000,
+    workers=None,
+    seed=42,
+):
+    """
+    trades   : نتائج backtest_harmonic_patterns (أو r_values جاهزة)
+    method   : "bootstrap" أو "shuffle"
+    المخرج   : dict فيه percentiles للعائد والـ drawdown + احتمال خسارة
+    """
+    if r_values is None:
+        r_values = trades_to_r_array(trades or [])
+
+    if not r_values or n_sims <= 0:
+        return {
+            "simulations": 0,
+            "trades_per_sim": 0,
+            "method": method,
+            "return_r": _percentiles([]),
+            "max_drawdown_r": _percentiles([]),
+            "prob_loss": 0.0,
+        }
+
+    batch_size = max(1, int(batch_size))
+    batches = []
+    remaining = int(n_sims)
+    i = 0
+    while remaining > 0:
+        size = min(batch_size, remaining)
+        batches.append((size, seed + i))
+        remaining -= size
+        i += 1
+
+    returns = array("d")
+    drawdowns = array("d")
+    workers = max(1, int(workers or min(4, os.cpu_count() or 1)))
+
+    if workers == 1 or len(batches) == 1:
+        for size, s in batches:
+            ret, dd = _simulate_batch(r_values, size, method, s)
+            returns.extend(ret)
+            drawdowns.extend(dd)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(_simulate_batch, r_values, size, method, s)
+                for size, s in batches
+            ]
+            for fut in futures:
+                ret, dd = fut.result()
+                returns.extend(ret)
+                drawdowns.extend(dd)
+
+    losing = sum(1 for r in returns if r < 0)
+
+    return {
+        "simulations": len(returns),
+        "trades_per_sim": len(r_values),
+        "method": method,
+        "return_r": _percentiles(returns),
+        "max_drawdown_r": _percentiles(drawdowns),
+        "prob_loss": round(losing / len(returns) * 100, 2),
+    }
+
+
+def print_monte_carlo(result):
+    print("\n🎲 MONTE CARLO ROBUSTNESS")
+    print("-" * 60)
+    print(f"Simulations      : {result['simulations']} ({result['method']})")
+    print(f"Trades / sim     : {result['trades_per_sim']}")
+    print(f"P(total R < 0)   : {result['prob_loss']:.2f}%")
+    print("Return (R)       : " + " | ".join(
+        f"{k}: {v:+.2f}" for k, v in result["return_r"].items()
+    ))
+    print("Max DD (R)       : " + " | ".join(
+        f"{k}: {v:.2f}" for k, v in result["max_drawdown_r"].items()
+    ))
@@ -0,0 +1,254 @@
+# analysis/backtest/replay_smart_alerts.py
+"""
+Smart Alert Replay Engine
+=========================
+
+✅ يشغّل Pipeline التحذير الذكى بالكامل على شموع تاريخية:
+   metrics → risk → update_market_pulse → detect_institutional_events
+   → classify_alert_level → V11 voting (engine_smart_voting)
+✅ ساعة محاكاة (Simulated Clock) بدل time.time → أسرع بكتير من الزمن الحقيقى
+✅ بدون Network وبدون Telegram — القرار بيتسجل بس
+✅ كل قرار بيتسجل مع مدخلاته (JSONL) لضبط thresholds زى EARLY_WARNING_THRESHOLD
+✅ نفس الـ gaps والـ adaptive sleep بتاعة smart_alert_loop
+"""
+
+import json
+import os
+from collections import Counter, deque
+
+# وضع Offline: config.py محتاج القيم دى عشان يتعمله import، والـ Replay مش بيبعت حاجة
+os.environ.setdefault("TELEGRAM_TOKEN", "offline-replay")
+os.environ.setdefault("APP_BASE_URL", "http://localhost")
+
+import config  # noqa: E402
+from analysis.data.candles import get_historical_candles  # noqa: E402
+from analysis.data.intrabar_store import TF_SECONDS  # noqa: E402
+from analysis_engine import map_engine_snapshot  # noqa: E402
+from engine_pulse_ring import PulseRing  # noqa: E402
+from engine_smart_pulse import set_clock  # noqa: E402
+from engine_smart_snapshot import build_smart_snapshot_from_price_data  # noqa: E402
+from engine_smart_voting import evaluate_smart_alert_decision  # noqa: E402
+
+
+# =====================
+# Simulated clock
+# =====================
+class SimulatedClock:
+    def __init__(self, start=0.0):
+        self.now = float(start)
+
+    def __call__(self):
+        return self.now
+
+
+# =====================
+# 24h rolling window (O(1) لكل شمعة)
+# =====================
+class _Rolling24h:
+    """
+    High / Low / Open لآخر `window` شمعة باستخدام monotonic deques
+    بدل max/min على slice كل مرة.
+    """
+
+    def __init__(self, window):
+        self.window = max(1, int(window))
+        self.i = -1
+        self._highs = deque()   # (index, high) تنازلى
+        self._lows = deque()    # (index, low) تصاعدى
+        self._opens = deque()   # (index, open)
+
+    def push(self, c):
+        self.i += 1
+        i = self.i
+        start = i - self.window + 1
+
+        while self._highs and self._highs[-1][1] <= c["high"]:
+            self._highs.pop()
+        self._highs.append((i, c["high"]))
+        while self._highs[0][0] < start:
+            self._highs.popleft()
+
+        while self._lows and self._lows[-1][1] >= c["low"]:
+            self._lows.pop()
+        self._lows.append((i, c["low"]))
+        while self._lows[0][0] < start:
+            self._lows.popleft()
+
+        self._opens.append((i, c["open"]))
+        while self._opens[0][0] < start:
+            self._opens.popleft()
+
+        return self._opens[0][1], self._highs[0][1], self._lows[0][1]
+
+
+# =====================
+# Decision record
+# =====================
+def _decision_record(ts, snapshot, decision):
+    metrics = snapshot["metrics"]
+    early = decision.get("early_signal") or {}
+    return {
+        "time": ts,
+        "price": metrics.get("price"),
+        "change_pct": metrics.get("change_pct"),
+        "range_pct": metrics.get("range_pct"),
+        "volatility_score": metrics.get("volatility_score"),
+        "level": decision["level"],
+        "shock_score": decision["shock_score"],
+        "speed_index": decision["speed_index"],
+        "accel_index": decision["accel_index"],
+        "direction_confidence": decision["direction_confidence"],
+        "risk_score": decision["risk_score"],
+        "composite_intensity": round(decision["composite_intensity"], 3),
+        "move_intensity": round(decision["move_intensity"], 3),
+        "super_critical": decision["super_critical"],
+        "immediate_condition": decision["immediate_condition"],
+        "early_condition": decision["early_condition"],
+        "momentum_condition": decision["momentum_condition"],
+        "early_score": float(early.get("score", 0.0) or 0.0),
+        "early_direction": early.get("direction"),
+        "votes": decision["votes"],
+        "agree_count": decision["agree_count"],
+        "alert_flavor": decision["alert_flavor"],
+        "sent": decision["send"],
+    }
+
+
+# =====================
+# Main replay
+# =====================
+def replay_smart_alerts(
+    symbol="BTCUSDT",
+    timeframe="1m",
+    limit=600000,
+    candles=None,
+    honor_sleep=True,
+    early_threshold=None,
+    output_path=None,
+):
+    """
+    candles      : شموع جاهزة (اختيارى) بدل القراءة من data/
+    honor_sleep  : True → التقييم التالى بعد sleep_seconds (زى اللايف بالظبط)
+                   False → تقييم على كل شمعة
+    output_path  : لو موجود → كل قرار بيتكتب كسطر JSON (الذاكرة ثابتة)
+                   لو None → القرارات بترجع فى النتيجة
+    """
+    if candles is None:
+        candles = get_historical_candles(symbol=symbol, timeframe=timeframe, limit=limit)
+
+    if not candles:
+        print("❌ No candles to replay")
+        return None
+
+    tf_seconds = TF_SECONDS.get(timeframe, 60)
+    rolling = _Rolling24h(86400 // tf_seconds)
+
+    clock = SimulatedClock()
+    decisions = [] if output_path is None else None
+    flavors = Counter()
+    evaluated = 0
+    sent = 0
+
+    last_alert_ts = 0.0
+    last_critical_ts = 0.0
+    next_eval_ts = None
+
+    # State معزول: pulse ring خاص بالـ replay ونرجّع القديم فى الآخر
+    saved_ring = getattr(config, "PULSE_HISTORY", None)
+    config.PULSE_HISTORY = PulseRing(int(getattr(config, "PULSE_RING_CAPACITY", 60)))
+    set_clock(clock)
+
+    out_f = open(output_path, "w", encoding="utf-8") if output_path else None
+
+    print("\n🔁 Running Smart Alert Replay")
+    print("=" * 60)
+    print(f"Symbol    : {symbol}")
+    print(f"Timeframe : {timeframe}")
+    print(f"Candles   : {len(candles)}")
+    print("=" * 60)
+
+    try:
+        for idx, c in enumerate(candles):
+            ts = float(c.get("timestamp", idx * tf_seconds))
+            open_24h, high_24h, low_24h = rolling.push(c)
+
+            if next_eval_ts is not None and ts < next_eval_ts:
+                continue
+
+            clock.now = ts
+            price = float(c["close"])
+            change_pct = (price / open_24h - 1.0) * 100.0 if open_24h else 0.0
+
+            eng = build_smart_snapshot_from_price_data(
+                symbol,
+                {
+                    "price": price,
+                    "change_pct": change_pct,
+                    "high": high_24h,
+                    "low": low_24h,
+                },
+            )
+            if not eng:
+                continue
+
+            snapshot = map_engine_snapshot(eng)
+            decision = evaluate_smart_alert_decision(
+                snapshot,
+                now_ts=ts,
+                last_alert_ts=last_alert_ts,
+                last_critical_ts=last_critical_ts,
+                early_threshold=early_threshold,
+                log=False,
+            )
+            evaluated += 1
+
+            if decision["send"]:
+                sent += 1
+                flavors[decision["alert_flavor"]] += 1
+                last_alert_ts = ts
+                if decision["is_critical"]:
+                    last_critical_ts = ts
+
+            record = _decision_record(ts, snapshot, decision)
+            if out_f is not None:
+                out_f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            else:
+                decisions.append(record)
+
+            if honor_sleep:
+                next_eval_ts = ts + decision["sleep_seconds"]
+
+    finally:
+        set_clock(None)
+        config.PULSE_HISTORY = saved_ring
+        if out_f is not None:
+            out_f.close()
+
+    print("\n📊 REPLAY SUMMARY")
+    print("=" * 60)
+    print(f"Decisions        : {evaluated}")
+    print(f"Alerts sent      : {sent}")
+    for flavor, count in flavors.most_common():
+        print(f"  {flavor:16}: {count}")
+    print("=" * 60)
+
+    return {
+        "symbol": symbol,
+        "timeframe": timeframe,
+        "candles": len(candles),
+        "evaluated": evaluated,
+        "sent": sent,
+        "by_flavor": dict(flavors),
+        "decisions": decisions,
+    }
+
+
+# =====================
+# Run directly
+# =====================
+if __name__ == "__main__":
+    replay_smart_alerts(
+        symbol="BTCUSDT",
+        timeframe="1m",
+        output_path="replay_decisions.jsonl",
+    )
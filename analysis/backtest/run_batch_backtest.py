@@ -0,0 +1,307 @@
+# analysis/backtest/run_batch_backtest.py
+"""
+Batch Backtest Runner
+=====================
+
+✅ يكتشف كل سلاسل الشموع الموجودة فى data/ ({SYMBOL}_{TF}.csv)
+✅ يشغّل Harmonic Backtest + Market Structure Scan لكل سلسلة بالتوازى
+✅ يكتب نتيجة كل رمز فى ملف JSONL فور انتهائه (Streaming)
+✅ تقرير مجمّع حسب: Pattern / Direction / Symbol
+✅ الذاكرة محدودة: عدد السلاسل المحمّلة فى نفس الوقت = عدد الـ workers فقط
+"""
+
+import glob
+import json
+import os
+from array import array
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from analysis.data.candles import get_historical_candles
+from analysis.schools.harmonic_scanner import scan_harmonic_patterns
+from analysis.schools.harmonic_backtest import backtest_harmonic_patterns
+from analysis.schools.swing_engine import detect_swings
+from analysis.schools.market_structure.structure_scanner import scan_market_structure
+from analysis.backtest.trade_stats import (
+    compute_trade_stats,
+    export_stats_json,
+    print_trade_stats,
+    trade_r_multiple,
+)
+
+
+DATA_DIR = "data"
+DEFAULT_OUTPUT = "backtest_results.jsonl"
+
+
+# =====================
+# Discover series
+# =====================
+def discover_series(data_dir=DATA_DIR, timeframes=None):
+    """
+    يرجّع [(symbol, timeframe), ...] لكل ملف CSV بالشكل SYMBOL_TF.csv
+    """
+    series = []
+
+    for path in sorted(glob.glob(os.path.join(data_dir, "*_*.csv"))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        symbol, _, timeframe = name.rpartition("_")
+        if not symbol or not timeframe:
+            continue
+        if timeframes and timeframe not in timeframes:
+            continue
+        series.append((symbol, timeframe))
+
+    return series
+
+
+# =====================
+# Worker (يعمل داخل process منفصل)
+# =====================
+def _backtest_one_series(symbol, timeframe, limit, data_dir=DATA_DIR):
+    """
+    يحمّل سلسلة واحدة فقط ويرجّع نتيجة مختصرة قابلة للـ JSON.
+    الشموع نفسها لا ترجع للـ parent process حتى تبقى الذاكرة محدودة.
+    """
+    out = {
+        "symbol": symbol,
+        "timeframe": timeframe,
+        "candles": 0,
+        "swings": 0,
+        "patterns": 0,
+        "trades": [],
+        "structure": None,
+        "error": None,
+    }
+
+    try:
+        candles = get_historical_candles(
+            symbol=symbol,
+            timeframe=timeframe,
+            limit=limit,
+            data_dir=data_dir,
+        )
+        out["candles"] = len(candles)
+
+        if not candles or len(candles) < 50:
+            out["error"] = "Not enough candle data"
+            return out
+
+        # ---------- Harmonic ----------
+        swings = detect_swings(candles, lookback=3, min_move=0.002)
+        out["swings"] = len(swings)
+
+        if swings and len(swings) >= 5:
+            patterns = scan_harmonic_patterns(
+                symbol=symbol,
+                timeframe=timeframe,
+                swings=swings
+            )
+            out["patterns"] = len(patterns or [])
+            if patterns:
+                out["trades"] = backtest_harmonic_patterns(patterns, candles)
+
+        # ---------- Market Structure ----------
+        structure = scan_market_structure(candles)
+        out["structure"] = {
+            "valid": structure.get("valid", False),
+            "trend": structure.get("trend"),
+            "total_swings": structure.get("total_swings", 0),
+            "reason": structure.get("reason"),
+        }
+
+    except Exception as e:
+        out["error"] = str(e)
+
+    return out
+
+
+# =====================
+# Aggregation
+# =====================
+def _new_aggregate():
+    return {
+        "series": 0,
+        "failed": 0,
+        "trades": 0,
+        "open": 0,
+        "by_pattern": defaultdict(lambda: {"WIN": 0, "LOSS": 0}),
+        "by_direction": defaultdict(lambda: {"WIN": 0, "LOSS": 0}),
+        "by_symbol": defaultdict(lambda: {"WIN": 0, "LOSS": 0}),
+        "trend_by_symbol": {},
+        "r_values": array("d"),  # 8 bytes لكل صفقة فقط
+    }
+
+
+def _merge_result(agg, res):
+    agg["series"] += 1
+    if res.get("error"):
+        agg["failed"] += 1
+
+    key = f"{res['symbol']}_{res['timeframe']}"
+
+    structure = res.get("structure") or {}
+    if structure.get("valid"):
+        agg["trend_by_symbol"][key] = structure.get("trend")
+
+    for r in res.get("trades") or []:
+        if r["result"] not in ("WIN", "LOSS"):
+            agg["open"] += 1
+            continue
+        agg["trades"] += 1
+        agg["by_pattern"][r["pattern"]][r["result"]] += 1
+        agg["by_direction"][r["direction"]][r["result"]] += 1
+        agg["by_symbol"][key][r["result"]] += 1
+        r_multiple = trade_r_multiple(r)
+        if r_multiple is not None:
+            agg["r_values"].append(r_multiple)
+
+
+def _print_breakdown(title, stats, width):
+    print(f"\n{title}")
+    print("-" * 60)
+    for name, stat in sorted(stats.items()):
+        total = stat["WIN"] + stat["LOSS"]
+        if total == 0:
+            continue
+        wr = stat["WIN"] / total * 100
+        print(
+            f"{name:{width}} | Trades: {total:4} | "
+            f"W: {stat['WIN']:3} | L: {stat['LOSS']:3} | "
+            f"WR: {wr:5.1f}%"
+        )
+
+
+def print_aggregate_report(agg):
+    wins = sum(s["WIN"] for s in agg["by_symbol"].values())
+    losses = sum(s["LOSS"] for s in agg["by_symbol"].values())
+    total = wins + losses
+    win_rate = (wins / total * 100) if total else 0
+
+    print("\n📊 BATCH BACKTEST SUMMARY")
+    print("=" * 60)
+    print(f"Series scanned   : {agg['series']}")
+    print(f"Series failed    : {agg['failed']}")
+    print(f"Closed trades    : {total}")
+    print(f"Open trades      : {agg['open']}")
+    print(f"Wins             : {wins}")
+    print(f"Losses           : {losses}")
+    print(f"Win rate         : {win_rate:.2f}%")
+    print("=" * 60)
+
+    print_trade_stats(compute_trade_stats(r_values=agg["r_values"]))
+
+    _print_breakdown("📐 PERFORMANCE BY PATTERN", agg["by_pattern"], 15)
+    _print_breakdown("📈 PERFORMANCE BY DIRECTION", agg["by_direction"], 8)
+    _print_breakdown("🪙 PERFORMANCE BY SYMBOL", agg["by_symbol"], 15)
+
+    if agg["trend_by_symbol"]:
+        print("\n🧭 MARKET STRUCTURE TREND")
+        print("-" * 60)
+        for key, trend in sorted(agg["trend_by_symbol"].items()):
+            print(f"{key:15} | {trend}")
+
+
+# =====================
+# Main runner
+# =====================
+def run_batch_backtest(
+    data_dir=DATA_DIR,
+    timeframes=None,
+    limit=2000,
+    workers=None,
+    output_path=DEFAULT_OUTPUT,
+    stats_path=None,
+):
+    """
+    يشغّل الباك تست على كل السلاسل.
+    - نرسل للـ pool على الأكثر `workers` مهمة فى نفس الوقت
+      (مش كل السلاسل مرة واحدة) → الذاكرة محدودة.
+    - كل نتيجة تُكتب كسطر JSON فور انتهائها ثم تُدمج فى التجميع وتُرمى.
+    """
+    series = discover_series(data_dir=data_dir, timeframes=timeframes)
+
+    print("\n🔍 Running Batch Backtest")
+    print("=" * 60)
+    print(f"Data dir  : {data_dir}")
+    print(f"Series    : {len(series)}")
+    print(f"Candles   : {limit}")
+    print(f"Output    : {output_path}")
+    print("=" * 60)
+
+    if not series:
+        print("❌ No candle series found")
+        return None
+
+    workers = max(1, int(workers or min(4, os.cpu_count() or 1)))
+    agg = _new_aggregate()
+    pending = iter(series)
+
+    with open(output_path, "w", encoding="utf-8") as out_f, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+
+        in_flight = {}  # future → (symbol, timeframe)
+
+        def _submit_next():
+            try:
+                symbol, timeframe = next(pending)
+            except StopIteration:
+                return False
+            fut = pool.submit(_backtest_one_series, symbol, timeframe, limit, data_dir)
+            in_flight[fut] = (symbol, timeframe)
+            return True
+
+        for _ in range(workers):
+            if not _submit_next():
+                break
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+
+            for fut in done:
+                symbol, timeframe = in_flight.pop(fut)
+                try:
+                    res = fut.result()
+                except Exception as e:
+                    res = {
+                        "symbol": symbol,
+                        "timeframe": timeframe,
+                        "trades": [],
+                        "structure": None,
+                        "error": str(e),
+                    }
+
+                out_f.write(json.dumps(res, ensure_ascii=False) + "\n")
+                out_f.flush()
+
+                _merge_result(agg, res)
+
+                status = "❌" if res.get("error") else "✅"
+                print(
+                    f"{status} {res['symbol']}_{res['timeframe']} | "
+                    f"trades={len(res.get('trades') or [])}"
+                    + (f" | {res['error']}" if res.get("error") else "")
+                )
+
+                _submit_next()
+
+    print_aggregate_report(agg)
+
+    if stats_path:
+        export_stats_json(compute_trade_stats(r_values=agg["r_values"]), stats_path)
+        print(f"💾 Stats saved to {stats_path}")
+
+    print("\n✅ Batch backtest finished successfully\n")
+
+    return agg
+
+
+# =====================
+# Run directly
+# =====================
+if __name__ == "__main__":
+    run_batch_backtest(
+        data_dir=DATA_DIR,
+        limit=2000,
+        output_path=DEFAULT_OUTPUT,
+    )
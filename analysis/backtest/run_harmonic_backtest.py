@@ -3,6 +3,9 @@
 from collections import defaultdict
 
 from analysis.data.candles import get_historical_candles
+from analysis.data.intrabar_store import IntrabarStore
+from analysis.backtest.trade_stats import compute_trade_stats, print_trade_stats
+from analysis.backtest.monte_carlo import run_monte_carlo, print_monte_carlo
 from analysis.schools.harmonic_scanner import scan_harmonic_patterns
 from analysis.schools.harmonic_backtest import backtest_harmonic_patterns
 from analysis.schools.swing_engine import detect_swings
@@ -11,7 +14,10 @@ from analysis.schools.swing_engine import detect_swings
 def run_harmonic_backtest(
     symbol="BTCUSDT",
     timeframe="1h",
-    limit=2000  # ✅ اختبار قوي على 2000 شمعة
+    limit=2000,  # ✅ اختبار قوي على 2000 شمعة
+    intrabar=False,  # ✅ حسم الشموع الملتبسة (TP+SL) من شموع 1m
+    intrabar_timeframe="1m",
+    monte_carlo_sims=0,  # ✅ مثلاً 10000 لاختبار الـ Robustness
 ):
     print("\n🔍 Running Harmonic Backtest")
     print("=" * 60)
@@ -68,7 +74,19 @@ def run_harmonic_backtest(
     # =====================
     # 4) Backtest
     # =====================
-    results = backtest_harmonic_patterns(patterns, candles)
+    intrabar_store = None
+    if intrabar:
+        intrabar_store = IntrabarStore(symbol, timeframe=intrabar_timeframe)
+        if not intrabar_store.available() or "timestamp" not in candles[0]:
+            print(f"⚠️ Intrabar data not available ({intrabar_timeframe}) — SL-first fallback")
+            intrabar_store = None
+
+    results = backtest_harmonic_patterns(
+        patterns,
+        candles,
+        intrabar_store=intrabar_store,
+        timeframe=timeframe,
+    )
 
     if not results:
         print("❌ No backtest results")
@@ -107,8 +125,18 @@ def run_harmonic_backtest(
     print(f"Wins             : {wins}")
     print(f"Losses           : {losses}")
     print(f"Win rate         : {win_rate:.2f}%")
+    if intrabar_store is not None:
+        resolved = sum(1 for r in results if r.get("intrabar_resolved"))
+        print(f"Intrabar resolved: {resolved}")
     print("=" * 60)
 
+    print_trade_stats(compute_trade_stats(trades=closed_trades))
+
+    if monte_carlo_sims and closed_trades:
+        print_monte_carlo(
+            run_monte_carlo(trades=closed_trades, n_sims=monte_carlo_sims)
+        )
+
     # =====================
     # 8) Performance by pattern
     # =====================
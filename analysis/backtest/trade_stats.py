@@ -0,0 +1,225 @@
+# analysis/backtest/trade_stats.py
+"""
+Trade Statistics Engine
+=======================
+
+✅ يحوّل قائمة الصفقات إلى أعمدة (array('d')) مرة واحدة
+✅ Equity Curve (بالـ R) + Max Drawdown
+✅ Sharpe / Sortino (لكل صفقة)
+✅ Profit Factor + توزيع R-Multiples + Win/Loss Streaks
+✅ تصدير JSON / CSV
+✅ مناسب لملايين الصفقات: كل الحسابات تمر مرة واحدة على المصفوفات
+   (itertools.accumulate / sum / sorted) بدون dicts لكل صفقة
+"""
+
+import csv
+import json
+import math
+from array import array
+from itertools import accumulate
+
+
+# =====================
+# Trades → columns
+# =====================
+def trade_r_multiple(trade):
+    """
+    R-Multiple لصفقة واحدة من نتيجة backtest_harmonic_patterns:
+      WIN  → |tp - entry| / |entry - sl|
+      LOSS → -1
+    r_multiple (لو موجود) محسوب قبل تقريب الأسعار → بيتاخد زى ما هو.
+    None = risk صفر (مايتحسبش بالـ R) — بيتشال من الإحصائيات بدل ما يتحسب خسارة.
+    """
+    if "r_multiple" in trade:
+        return trade["r_multiple"]
+
+    entry = float(trade.get("entry") or 0.0)
+    tp = float(trade.get("tp") or 0.0)
+    sl = float(trade.get("sl") or 0.0)
+    risk = abs(entry - sl)
+
+    if trade.get("result") == "WIN":
+        return abs(tp - entry) / risk if risk > 0 else None
+    if trade.get("result") == "LOSS":
+        return -1.0
+    return 0.0
+
+
+def trades_to_r_array(trades):
+    """
+    الصفقات المغلقة فقط (WIN / LOSS) → array('d') من R-Multiples
+    (صفقات الـ risk الصفر بتتشال)
+    """
+    r_values = (
+        trade_r_multiple(t)
+        for t in trades
+        if t.get("result") in ("WIN", "LOSS")
+    )
+    return array("d", (r for r in r_values if r is not None))
+
+
+# =====================
+# Core stats
+# =====================
+def equity_curve(r_values):
+    return array("d", accumulate(r_values))
+
+
+def max_drawdown(curve):
+    """
+    أكبر هبوط من قمة سابقة على منحنى الـ Equity (بالـ R)
+    """
+    if not curve:
+        return 0.0
+    peaks = accumulate(curve, max)
+    return max(
+        (max(p, 0.0) - c for p, c in zip(peaks, curve)),
+        default=0.0,
+    )
+
+
+def _streaks(r_values):
+    best_win = best_loss = cur_win = cur_loss = 0
+    for r in r_values:
+        if r > 0:
+            cur_win += 1
+            cur_loss = 0
+            if cur_win > best_win:
+                best_win = cur_win
+        else:
+            cur_loss += 1
+            cur_win = 0
+            if cur_loss > best_loss:
+                best_loss = cur_loss
+    return best_win, best_loss
+
+
+def _r_distribution(r_values, buckets=(-1.0, 0.0, 1.0, 2.0, 3.0)):
+    """
+    توزيع R-Multiples على حدود ثابتة:
+    "<=-1" / "-1..0" / "0..1" / "1..2" / "2..3" / ">3"
+    """
+    labels = [f"<={buckets[0]:g}"]
+    labels += [f"{lo:g}..{hi:g}" for lo, hi in zip(buckets, buckets[1:])]
+    labels.append(f">{buckets[-1]:g}")
+    counts = [0] * len(labels)
+
+    for r in r_values:
+        i = 0
+        while i < len(buckets) and r > buckets[i]:
+            i += 1
+        counts[i] += 1
+
+    return dict(zip(labels, counts))
+
+
+def compute_trade_stats(trades=None, r_values=None):
+    """
+    المدخل: قائمة صفقات (dicts) أو مصفوفة R جاهزة.
+    المخرج: dict ثابت المفاتيح قابل للـ JSON.
+    """
+    if r_values is None:
+        r_values = trades_to_r_array(trades or [])
+
+    n = len(r_values)
+    if n == 0:
+        return {
+            "trades": 0,
+            "wins": 0,
+            "losses": 0,
+            "win_rate": 0.0,
+            "total_r": 0.0,
+            "avg_r": 0.0,
+            "profit_factor": 0.0,
+            "max_drawdown_r": 0.0,
+            "sharpe": 0.0,
+            "sortino": 0.0,
+            "max_win_streak": 0,
+            "max_loss_streak": 0,
+            "r_distribution": {},
+        }
+
+    gross_win = sum(r for r in r_values if r > 0)
+    gross_loss = -sum(r for r in r_values if r < 0)
+    wins = sum(1 for r in r_values if r > 0)
+    losses = n - wins
+
+    total = sum(r_values)
+    mean = total / n
+
+    var = sum((r - mean) ** 2 for r in r_values) / n
+    std = math.sqrt(var)
+
+    downside = sum(r * r for r in r_values if r < 0) / n
+    down_std = math.sqrt(downside)
+
+    curve = equity_curve(r_values)
+    best_win, best_loss = _streaks(r_values)
+
+    if gross_loss > 0:
+        profit_factor = gross_win / gross_loss
+    else:
+        profit_factor = float("inf") if gross_win > 0 else 0.0
+
+    return {
+        "trades": n,
+        "wins": wins,
+        "losses": losses,
+        "win_rate": round(wins / n * 100, 2),
+        "total_r": round(total, 4),
+        "avg_r": round(mean, 4),
+        "profit_factor": round(profit_factor, 4) if math.isfinite(profit_factor) else profit_factor,
+        "max_drawdown_r": round(max_drawdown(curve), 4),
+        "sharpe": round(mean / std, 4) if std > 0 else 0.0,
+        "sortino": round(mean / down_std, 4) if down_std > 0 else 0.0,
+        "max_win_streak": best_win,
+        "max_loss_streak": best_loss,
+        "r_distribution": _r_distribution(r_values),
+    }
+
+
+# =====================
+# Report / Export
+# =====================
+def print_trade_stats(stats):
+    print("\n📉 EQUITY / RISK STATS (R-Multiples)")
+    print("-" * 60)
+    print(f"Total R          : {stats['total_r']:+.2f}")
+    print(f"Avg R / trade    : {stats['avg_r']:+.3f}")
+    print(f"Profit factor    : {stats['profit_factor']}")
+    print(f"Max drawdown (R) : {stats['max_drawdown_r']:.2f}")
+    print(f"Sharpe / trade   : {stats['sharpe']:.3f}")
+    print(f"Sortino / trade  : {stats['sortino']:.3f}")
+    print(f"Max win streak   : {stats['max_win_streak']}")
+    print(f"Max loss streak  : {stats['max_loss_streak']}")
+    if stats.get("r_distribution"):
+        print("R distribution   : " + " | ".join(
+            f"{k}: {v}" for k, v in stats["r_distribution"].items()
+        ))
+
+
+def export_stats_json(stats, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(
+            {k: (str(v) if isinstance(v, float) and not math.isfinite(v) else v)
+             for k, v in stats.items()},
+            f,
+            ensure_ascii=False,
+            indent=2,
+        )
+
+
+def export_equity_csv(r_values, path):
+    """
+    CSV: trade_no, r_multiple, equity_r, drawdown_r
+    """
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["trade_no", "r_multiple", "equity_r", "drawdown_r"])
+        peak = 0.0
+        equity = 0.0
+        for i, r in enumerate(r_values, start=1):
+            equity += r
+            if equity > peak:
+                peak = equity
+            writer.writerow([i, round(r, 4), round(equity, 4), round(peak - equity, 4)])
@@ -5,13 +5,14 @@ import os
 def get_historical_candles(
     symbol: str,
     timeframe: str = "1h",
-    limit: int = 500
+    limit: int = 500,
+    data_dir: str = "data",
 ):
     """
     CSV ONLY – NO BINANCE – NO API
     """
 
-    csv_path = f"data/{symbol}_{timeframe}.csv"
+    csv_path = os.path.join(data_dir, f"{symbol}_{timeframe}.csv")
 
     if not os.path.exists(csv_path):
         print(f"❌ CSV file not found: {csv_path}")
@@ -21,13 +22,18 @@ def get_historical_candles(
 
     with open(csv_path, newline="") as f:
         reader = csv.DictReader(f)
+        has_ts = "timestamp" in (reader.fieldnames or [])
         for row in reader:
-            candles.append({
+            candle = {
                 "open": float(row["open"]),
                 "high": float(row["high"]),
                 "low": float(row["low"]),
                 "close": float(row["close"]),
-            })
+            }
+            # ⏱️ الوقت (ثوانى) لو موجود فى الملف — مطلوب لـ Intrabar Resolution
+            if has_ts:
+                candle["timestamp"] = int(float(row["timestamp"]))
+            candles.append(candle)
 
     if not candles:
         print("❌ CSV file is empty")
@@ -0,0 +1,141 @@
+# analysis/data/intrabar_store.py
+"""
+Intrabar Candle Store (Lower Timeframe Lookup)
+==============================================
+
+✅ قراءة شموع فريم صغير (1m افتراضياً) من data/{SYMBOL}_{TF}.csv
+✅ Sparse Time Index: (timestamp → byte offset) كل N سطر فقط
+✅ بحث bisect على الفهرس ثم seek وقراءة الجزء المطلوب فقط
+✅ لا يتم تحميل الملف كامل فى الذاكرة أبداً
+"""
+
+import bisect
+import os
+
+
+TF_SECONDS = {
+    "1m": 60,
+    "5m": 300,
+    "15m": 900,
+    "1h": 3600,
+    "4h": 14400,
+    "1d": 86400,
+}
+
+
+class IntrabarStore:
+    """
+    مخزن شموع الفريم الصغير مع فهرس زمنى متفرّق.
+    الملف لازم يكون مرتب زمنياً وفيه عمود timestamp (ثوانى)
+    مثل ما يكتبه download_candles.
+    """
+
+    def __init__(self, symbol, timeframe="1m", data_dir="data", index_step=512):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.csv_path = os.path.join(data_dir, f"{symbol}_{timeframe}.csv")
+        self.index_step = max(1, int(index_step))
+
+        self._columns = None
+        self._index_ts = []
+        self._index_offsets = []
+        self._indexed = False
+
+    # =====================
+    # Availability
+    # =====================
+    def available(self):
+        if not os.path.exists(self.csv_path):
+            return False
+        self._build_index()
+        return bool(self._index_ts)
+
+    # =====================
+    # Index
+    # =====================
+    def _build_index(self):
+        if self._indexed:
+            return
+        self._indexed = True
+
+        if not os.path.exists(self.csv_path):
+            return
+
+        with open(self.csv_path, "rb") as f:
+            header = f.readline().decode("utf-8").strip()
+            self._columns = [c.strip() for c in header.split(",")]
+
+            if "timestamp" not in self._columns:
+                self._columns = None
+                return
+
+            ts_col = self._columns.index("timestamp")
+            row = 0
+
+            while True:
+                offset = f.tell()
+                line = f.readline()
+                if not line:
+                    break
+                if row % self.index_step == 0:
+                    try:
+                        ts = int(float(line.split(b",")[ts_col]))
+                    except (ValueError, IndexError):
+                        row += 1
+                        continue
+                    self._index_ts.append(ts)
+                    self._index_offsets.append(offset)
+                row += 1
+
+    def _parse(self, line):
+        parts = line.decode("utf-8").strip().split(",")
+        row = dict(zip(self._columns, parts))
+        return {
+            "timestamp": int(float(row["timestamp"])),
+            "open": float(row["open"]),
+            "high": float(row["high"]),
+            "low": float(row["low"]),
+            "close": float(row["close"]),
+        }
+
+    # =====================
+    # Range lookup
+    # =====================
+    def get_range(self, start_ts, end_ts):
+        """
+        يرجّع الشموع حيث start_ts <= timestamp < end_ts
+        """
+        self._build_index()
+        if not self._index_ts or end_ts <= start_ts:
+            return []
+
+        pos = bisect.bisect_right(self._index_ts, start_ts) - 1
+        if pos < 0:
+            pos = 0
+
+        out = []
+        with open(self.csv_path, "rb") as f:
+            f.seek(self._index_offsets[pos])
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    c = self._parse(line)
+                except (ValueError, KeyError):
+                    continue
+                if c["timestamp"] < start_ts:
+                    continue
+                if c["timestamp"] >= end_ts:
+                    break
+                out.append(c)
+
+        return out
+
+    def get_bar(self, bar_ts, bar_timeframe):
+        """
+        شموع الفريم الصغير داخل شمعة واحدة من الفريم الأكبر
+        """
+        seconds = TF_SECONDS.get(bar_timeframe)
+        if not seconds:
+            return []
+        return self.get_range(bar_ts, bar_ts + seconds)
@@ -1,4 +1,36 @@
-def backtest_harmonic_patterns(patterns, candles):
+def _resolve_intrabar(store, bar, timeframe, direction, tp, sl):
+    """
+    لو نفس الشمعة لمست TP و SL:
+    نمشى على شموع الفريم الصغير بالترتيب ونشوف مين اتلمس الأول.
+    يرجّع "TP" / "SL" / None (لو مفيش بيانات أو شمعة 1m نفسها لمست الاتنين)
+    """
+    ts = bar.get("timestamp")
+    if store is None or ts is None:
+        return None
+
+    for m in store.get_bar(ts, timeframe):
+        if direction == "BUY":
+            sl_hit = m["low"] <= sl
+            tp_hit = m["high"] >= tp
+        else:
+            sl_hit = m["high"] >= sl
+            tp_hit = m["low"] <= tp
+
+        if sl_hit and tp_hit:
+            return None
+        if sl_hit:
+            return "SL"
+        if tp_hit:
+            return "TP"
+
+    return None
+
+
+def backtest_harmonic_patterns(patterns, candles, intrabar_store=None, timeframe="1h"):
+    """
+    intrabar_store (اختيارى): IntrabarStore لفريم أصغر (1m)
+    يُستخدم فقط للشموع اللى لمست TP و SL مع بعض بدل افتراض SL دائماً.
+    """
     results = []
 
     MAX_BARS = 50  # ⏱️ Timeout بعد 50 شمعة
@@ -32,6 +64,7 @@ def backtest_harmonic_patterns(patterns, candles):
         hit_tp = False
         hit_sl = False
         timed_out = False
+        intrabar_resolved = False
         candles_to_hit = None
 
         # =====================
@@ -47,23 +80,30 @@ def backtest_harmonic_patterns(patterns, candles):
             low = c["low"]
 
             if direction == "BUY":
-                if low <= sl:
-                    hit_sl = True
-                    candles_to_hit = i - d_index
-                    break
-                if high >= tp:
-                    hit_tp = True
-                    candles_to_hit = i - d_index
-                    break
+                sl_hit = low <= sl
+                tp_hit = high >= tp
             else:  # SELL
-                if high >= sl:
-                    hit_sl = True
-                    candles_to_hit = i - d_index
-                    break
-                if low <= tp:
-                    hit_tp = True
-                    candles_to_hit = i - d_index
-                    break
+                sl_hit = high >= sl
+                tp_hit = low <= tp
+
+            if sl_hit and tp_hit and intrabar_store is not None:
+                first = _resolve_intrabar(
+                    intrabar_store, c, timeframe, direction, tp, sl
+                )
+                if first is not None:
+                    intrabar_resolved = True
+                    sl_hit = first == "SL"
+                    tp_hit = first == "TP"
+
+            # SL أولاً (الافتراض المحافظ لو مفيش Intrabar)
+            if sl_hit:
+                hit_sl = True
+                candles_to_hit = i - d_index
+                break
+            if tp_hit:
+                hit_tp = True
+                candles_to_hit = i - d_index
+                break
 
         # =====================
         # Result
@@ -73,6 +113,13 @@ def backtest_harmonic_patterns(patterns, candles):
         else:
             result = "LOSS"  # SL أو Timeout
 
+        # R قبل التقريب — entry/tp/sl بتتقرب لـ 2 decimals (عملة سعرها صغير → risk = 0)
+        risk = abs(entry - sl)
+        if result == "WIN":
+            r_multiple = round(abs(tp - entry) / risk, 4) if risk > 0 else None
+        else:
+            r_multiple = -1.0
+
         results.append({
             "pattern": p["pattern"],
             "status": status,
@@ -81,8 +128,10 @@ def backtest_harmonic_patterns(patterns, candles):
             "tp": round(tp, 2),
             "sl": round(sl, 2),
             "result": result,
+            "r_multiple": r_multiple,
             "candles_to_hit": candles_to_hit,
             "timed_out": timed_out,
+            "intrabar_resolved": intrabar_resolved,
             "confidence": round(p.get("confidence", 0), 1),
         })
 
@@ -1,7 +1,42 @@
 # analysis/schools/market_structure/entry_model.py
 
+from bisect import bisect_right
 from typing import List, Dict
 
+from .range_index import build_high_low_index
+
+
+def _event_index(e: Dict) -> int:
+    # BOS / CHoCH بيرجعوا swing_index — نقبل index لو موجود
+    return e["index"] if "index" in e else e["swing_index"]
+
+
+def _index_events(events: List[Dict]) -> Dict[str, tuple]:
+    """
+    direction → (sorted indices, events) للبحث بـ bisect
+    """
+    by_dir: Dict[str, list] = {}
+    for pos, e in enumerate(events):
+        by_dir.setdefault(e["direction"], []).append((_event_index(e), pos, e))
+
+    out = {}
+    for direction, rows in by_dir.items():
+        rows.sort(key=lambda r: (r[0], r[1]))
+        out[direction] = ([r[0] for r in rows], [r[2] for r in rows])
+    return out
+
+
+def _first_after(index: Dict[str, tuple], direction: str, after: int):
+    """
+    أول event بنفس الاتجاه و index > after — O(log n)
+    """
+    row = index.get(direction)
+    if not row:
+        return None
+    keys, events = row
+    pos = bisect_right(keys, after)
+    return events[pos] if pos < len(events) else None
+
 
 def detect_entry_model(
     candles: List[Dict],
@@ -14,6 +49,9 @@ def detect_entry_model(
     """
     Detect High-Probability Entry Models
 
+    ✅ CHoCH / BOS matching بـ bisect على events مترتبة بالـ index
+    ✅ Stop Loss من Sparse Table (min low / max high) بدل slice كل مرة
+
     Returns:
     [
         {
@@ -29,6 +67,16 @@ def detect_entry_model(
 
     entries = []
 
+    if not sweeps:
+        return entries
+
+    # =====================
+    # Precomputed indexes (مرة واحدة)
+    # =====================
+    choch_index = _index_events(choch_events)
+    bos_index = _index_events(bos_events)
+    high_table, low_table = build_high_low_index(candles)
+
     for sweep in sweeps:
         sweep_idx = sweep["candle_index"]
         direction = sweep["direction"]
@@ -36,14 +84,7 @@ def detect_entry_model(
         # =====================
         # Match CHoCH after Sweep
         # =====================
-        choch_match = next(
-            (
-                c for c in choch_events
-                if c["direction"] == direction
-                and c["index"] > sweep_idx
-            ),
-            None
-        )
+        choch_match = _first_after(choch_index, direction, sweep_idx)
 
         if not choch_match:
             continue
@@ -51,35 +92,28 @@ def detect_entry_model(
         # =====================
         # Match BOS after CHoCH
         # =====================
-        bos_match = next(
-            (
-                b for b in bos_events
-                if b["direction"] == direction
-                and b["index"] > choch_match["index"]
-            ),
-            None
+        bos_match = _first_after(
+            bos_index, direction, _event_index(choch_match)
         )
 
         if not bos_match:
             continue
 
-        entry_idx = bos_match["index"]
+        entry_idx = _event_index(bos_match)
+        if entry_idx >= len(candles):
+            continue
         entry_candle = candles[entry_idx]
 
         # =====================
-        # Entry / SL / TP
+        # Entry / SL / TP (RMQ O(1))
         # =====================
         if direction == "bullish":
             entry_price = entry_candle["close"]
-            stop_loss = min(
-                c["low"] for c in candles[sweep_idx:entry_idx + 1]
-            )
+            stop_loss = low_table.query(sweep_idx, entry_idx)
             take_profit = entry_price + (entry_price - stop_loss) * rr
         else:
             entry_price = entry_candle["close"]
-            stop_loss = max(
-                c["high"] for c in candles[sweep_idx:entry_idx + 1]
-            )
+            stop_loss = high_table.query(sweep_idx, entry_idx)
             take_profit = entry_price - (stop_loss - entry_price) * rr
 
         entries.append({
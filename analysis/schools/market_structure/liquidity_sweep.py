@@ -1,16 +1,129 @@
 # analysis/schools/market_structure/liquidity_sweep.py
 
-from typing import List, Dict
+from operator import itemgetter
+from typing import Dict, Iterable, List, Sequence, Tuple, Union
+
+
+Candles = Union[List[Dict], Dict[str, Sequence[float]]]
+Swings = Union[List[Dict], Dict[str, Sequence]]
+
+
+def _tail_swings(swings: Swings, since_index: int, lookahead: int) -> Iterable[Tuple[int, float, str]]:
+    """
+    swings ممكن تكون list of dicts أو index جاهز:
+    {"index": [...], "price": [...], "type": [...]}
+
+    السوينجات مرتبة بالـ index → بنمشى من الآخر لحد since_index - lookahead بس
+    (كل tick بيلمس السوينجات الجديدة + اللى نافذتها ماكانتش كملت فى الـ call اللى فات)
+    """
+    if since_index > 0:
+        # سوينج idx >= since_index - lookahead كان بيتخطى (end > n) → لسه pending
+        since_index = max(0, since_index - lookahead)
+    if isinstance(swings, dict):
+        s_index, s_price, s_type = swings["index"], swings["price"], swings["type"]
+        if since_index <= 0:
+            return zip(s_index, s_price, s_type)
+        j = len(s_index)
+        while j > 0 and s_index[j - 1] >= since_index:
+            j -= 1
+        return zip(s_index[j:], s_price[j:], s_type[j:])
+
+    if since_index <= 0:
+        tail = swings
+    else:
+        j = len(swings)
+        while j > 0 and swings[j - 1]["index"] >= since_index:
+            j -= 1
+        tail = swings[j:]
+    return map(itemgetter("index", "price", "type"), tail)
+
+
+def _sweep(direction: str, price: float, idx: int, i: int) -> Dict:
+    return {
+        "type": "LiquiditySweep",
+        "direction": direction,
+        "sweep_price": price,
+        "swing_index": idx,
+        "candle_index": i,
+    }
+
+
+def _scan_rows(candles: List[Dict], tail, lookahead: int) -> List[Dict]:
+    """list of dicts — بنقرا lookahead شمعة بس بعد كل سوينج (مفيش نسخ أعمدة)."""
+    n = len(candles)
+    sweeps = []
+
+    for idx, price, kind in tail:
+        end = idx + lookahead + 1
+        if end > n:
+            continue
+
+        # =====================
+        # Bearish Liquidity Sweep (above highs)
+        # =====================
+        if kind == "high":
+            for i in range(idx + 1, end):
+                c = candles[i]
+                high = c["high"]
+                if high > price and c["close"] < price:
+                    sweeps.append(_sweep("bearish", high, idx, i))
+                    break
+
+        # =====================
+        # Bullish Liquidity Sweep (below lows)
+        # =====================
+        elif kind == "low":
+            for i in range(idx + 1, end):
+                c = candles[i]
+                low = c["low"]
+                if low < price and c["close"] > price:
+                    sweeps.append(_sweep("bullish", low, idx, i))
+                    break
+
+    return sweeps
+
+
+def _scan_columns(candles: Dict[str, Sequence[float]], tail, lookahead: int) -> List[Dict]:
+    """columns: {"high": [...], "low": [...], "close": [...]} — نفس الـ scan بالـ index."""
+    highs, lows, closes = candles["high"], candles["low"], candles["close"]
+    n = len(closes)
+    sweeps = []
+
+    for idx, price, kind in tail:
+        end = idx + lookahead + 1
+        if end > n:
+            continue
+
+        if kind == "high":
+            for i in range(idx + 1, end):
+                if highs[i] > price and closes[i] < price:
+                    sweeps.append(_sweep("bearish", highs[i], idx, i))
+                    break
+
+        elif kind == "low":
+            for i in range(idx + 1, end):
+                if lows[i] < price and closes[i] > price:
+                    sweeps.append(_sweep("bullish", lows[i], idx, i))
+                    break
+
+    return sweeps
 
 
 def detect_liquidity_sweep(
-    candles: List[Dict],
-    swings: List[Dict],
-    lookahead: int = 3
+    candles: Candles,
+    swings: Swings,
+    lookahead: int = 3,
+    since_index: int = 0,
 ) -> List[Dict]:
     """
     Detect Liquidity Sweeps
 
+    ✅ بيلمس lookahead شمعة بس بعد كل سوينج — مفيش نسخ لكل الشموع فى كل call
+    ✅ بيقبل candle columns مباشرة (بدون dicts) لتشغيله على كل الفريمات كل tick
+    ✅ since_index = عدد الشموع فى الـ call اللى فات → السوينجات الجديدة بس +
+       اللى نافذة الـ lookahead بتاعتها ماكانتش كملت (index >= since_index - lookahead)
+       — مفيش sweep بيتكرر ومفيش sweep بيضيع
+
     candle format:
     {
         "open": float,
@@ -19,12 +132,16 @@ def detect_liquidity_sweep(
         "close": float
     }
 
+    candle columns (اختيارى):
+    {"high": [...], "low": [...], "close": [...]}
+
     swing format:
     {
         "index": int,
         "price": float,
         "type": "high" | "low"
     }
+    أو swing index جاهز: {"index": [...], "price": [...], "type": [...]}
 
     Returns:
     [
@@ -38,44 +155,8 @@ def detect_liquidity_sweep(
     ]
     """
 
-    sweeps = []
-
-    for s in swings:
-        idx = s["index"]
-        price = s["price"]
-
-        if idx + lookahead >= len(candles):
-            continue
+    tail = _tail_swings(swings, since_index, lookahead)
 
-        for i in range(idx + 1, idx + lookahead + 1):
-            c = candles[i]
-
-            # =====================
-            # Bearish Liquidity Sweep (above highs)
-            # =====================
-            if s["type"] == "high":
-                if c["high"] > price and c["close"] < price:
-                    sweeps.append({
-                        "type": "LiquiditySweep",
-                        "direction": "bearish",
-                        "sweep_price": c["high"],
-                        "swing_index": idx,
-                        "candle_index": i,
-                    })
-                    break
-
-            # =====================
-            # Bullish Liquidity Sweep (below lows)
-            # =====================
-            elif s["type"] == "low":
-                if c["low"] < price and c["close"] > price:
-                    sweeps.append({
-                        "type": "LiquiditySweep",
-                        "direction": "bullish",
-                        "sweep_price": c["low"],
-                        "swing_index": idx,
-                        "candle_index": i,
-                    })
-                    break
-
-    return sweeps
+    if isinstance(candles, dict):
+        return _scan_columns(candles, tail, lookahead)
+    return _scan_rows(candles, tail, lookahead)
@@ -0,0 +1,60 @@
+# analysis/schools/market_structure/range_index.py
+
+"""
+RANGE INDEX (RMQ)
+=================
+
+• Sparse Table لأقل/أعلى قيمة فى أى مدى [lo, hi] بـ O(1)
+• البناء O(n log n) مرة واحدة على highs / lows
+• مستخدم فى entry_model (Stop Loss) وممكن للـ backtests
+"""
+
+from typing import Callable, List, Sequence
+
+
+class SparseTable:
+    """
+    Sparse Table لدالة idempotent (min / max).
+
+    table[k][i] = op(values[i : i + 2**k])
+    """
+
+    def __init__(self, values: Sequence[float], op: Callable = min):
+        self.op = op
+        self.n = len(values)
+
+        self.table: List[List[float]] = [list(values)]
+
+        k = 1
+        while (1 << k) <= self.n:
+            prev = self.table[k - 1]
+            half = 1 << (k - 1)
+            self.table.append([
+                op(prev[i], prev[i + half])
+                for i in range(self.n - (1 << k) + 1)
+            ])
+            k += 1
+
+    def query(self, lo: int, hi: int) -> float:
+        """
+        op(values[lo : hi + 1]) — الطرفين inclusive
+        """
+        if lo < 0:
+            lo = 0
+        if hi >= self.n:
+            hi = self.n - 1
+        if lo > hi:
+            raise ValueError("empty range")
+
+        k = (hi - lo + 1).bit_length() - 1
+        row = self.table[k]
+        return self.op(row[lo], row[hi - (1 << k) + 1])
+
+
+def build_high_low_index(candles) -> tuple:
+    """
+    يرجّع (max_high_table, min_low_table) لقائمة شموع
+    """
+    highs = [c["high"] for c in candles]
+    lows = [c["low"] for c in candles]
+    return SparseTable(highs, max), SparseTable(lows, min)
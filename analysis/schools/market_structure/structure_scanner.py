@@ -3,6 +3,7 @@ MARKET STRUCTURE – SCANNER
 ==========================
 
 • Uses structure_engine
+• BOS / CHoCH via structure_tracker
 • Prints market structure summary
 """
 
@@ -13,6 +14,7 @@ from .structure_engine import (
     classify_structure,
     detect_trend,
 )
+from .structure_tracker import MarketStructureTracker
 
 
 def scan_market_structure(candles: List[Dict]) -> Dict:
@@ -31,9 +33,16 @@ def scan_market_structure(candles: List[Dict]) -> Dict:
     labeled = classify_structure(swings)
     trend = detect_trend(labeled)
 
+    # BOS / CHoCH من نفس الـ state machine اللى بتشتغل Live
+    tracker = MarketStructureTracker()
+    tracker.feed(swings)
+
     return {
         "valid": True,
         "trend": trend,
         "last_structure": labeled[-4:],  # آخر هيكل واضح
         "total_swings": len(labeled),
+        "last_bos": tracker.last_bos,
+        "last_choch": tracker.last_choch,
+        "structure_bias": tracker.trend,
     }
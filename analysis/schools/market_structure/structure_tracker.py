@@ -0,0 +1,143 @@
+"""
+MARKET STRUCTURE – STREAMING TRACKER
+====================================
+
+• State machine تستقبل السوينجات واحدة واحدة (O(1) لكل swing)
+• تحتفظ بـ last_high / last_low / trend
+• تطلع BOS و CHoCH لحظة حدوثهم (نفس شكل detect_bos / detect_choch)
+• نفس الـ object يشتغل على Live ticks أو Replay تاريخى
+
+القواعد:
+• high أعلى من آخر high:
+    - trend = bearish  → CHoCH bullish (أول كسر ضد الاتجاه) + trend = bullish
+    - غير كده         → BOS bullish + trend = bullish
+• low أقل من آخر low:
+    - trend = bullish  → CHoCH bearish + trend = bearish
+    - غير كده         → BOS bearish + trend = bearish
+"""
+
+from typing import Dict, List, Optional
+
+
+class MarketStructureTracker:
+
+    def __init__(self, max_events: int = 200):
+        self.max_events = max_events
+        self.reset()
+
+    # =========================
+    # State
+    # =========================
+
+    def reset(self) -> None:
+        self.last_high: Optional[Dict] = None
+        self.last_low: Optional[Dict] = None
+        self.trend: Optional[str] = None   # "bullish" | "bearish" | None
+        self.last_label: Optional[str] = None
+        self.swings_seen = 0
+        self.events: List[Dict] = []
+        self.last_bos: Optional[Dict] = None
+        self.last_choch: Optional[Dict] = None
+
+    def _emit(self, kind: str, direction: str, swing: Dict) -> Dict:
+        event = {
+            "type": kind,
+            "direction": direction,
+            "break_price": swing["price"],
+            "swing_index": swing["index"],
+        }
+
+        if kind == "BOS":
+            self.last_bos = event
+        else:
+            self.last_choch = event
+
+        self.events.append(event)
+        if len(self.events) > self.max_events:
+            del self.events[: len(self.events) - self.max_events]
+
+        return event
+
+    # =========================
+    # Ingest
+    # =========================
+
+    def update(self, swing: Dict) -> List[Dict]:
+        """
+        swing format:
+        {
+            "index": int,
+            "price": float,
+            "type": "high" | "low"
+        }
+
+        يرجّع events اللى حصلت مع السوينج ده (غالباً 0 أو 1)
+        """
+        out: List[Dict] = []
+        self.swings_seen += 1
+
+        if swing["type"] == "high":
+            prev = self.last_high
+
+            if prev is None:
+                self.last_label = "H"
+            elif swing["price"] > prev["price"]:
+                self.last_label = "HH"
+                if self.trend == "bearish":
+                    out.append(self._emit("CHoCH", "bullish", swing))
+                else:
+                    out.append(self._emit("BOS", "bullish", swing))
+                self.trend = "bullish"
+            else:
+                self.last_label = "LH"
+
+            self.last_high = swing
+
+        elif swing["type"] == "low":
+            prev = self.last_low
+
+            if prev is None:
+                self.last_label = "L"
+            elif swing["price"] < prev["price"]:
+                self.last_label = "LL"
+                if self.trend == "bullish":
+                    out.append(self._emit("CHoCH", "bearish", swing))
+                else:
+                    out.append(self._emit("BOS", "bearish", swing))
+                self.trend = "bearish"
+            else:
+                self.last_label = "HL"
+
+            self.last_low = swing
+
+        return out
+
+    def feed(self, swings: List[Dict]) -> List[Dict]:
+        """
+        Replay لقائمة سوينجات — يرجّع كل الـ events بالترتيب
+        """
+        out: List[Dict] = []
+        for s in swings:
+            out.extend(self.update(s))
+        return out
+
+    # =========================
+    # Views
+    # =========================
+
+    def bos_events(self) -> List[Dict]:
+        return [e for e in self.events if e["type"] == "BOS"]
+
+    def choch_events(self) -> List[Dict]:
+        return [e for e in self.events if e["type"] == "CHoCH"]
+
+    def snapshot(self) -> Dict:
+        return {
+            "trend": self.trend,
+            "last_high": self.last_high,
+            "last_low": self.last_low,
+            "last_label": self.last_label,
+            "last_bos": self.last_bos,
+            "last_choch": self.last_choch,
+            "swings_seen": self.swings_seen,
+        }
@@ -3,6 +3,9 @@ from datetime import datetime
 
 import config
 from engine_schools import pick_school_report
+from engine_candle_patterns import detect_last_patterns
+from engine_pulse_ring import PulseRingDiffs, PulseRingStats, get_pulse_ring
+from engine_snapshot_graph import SnapshotGraph
 
 LAST_CONFIRMED_HARMONIC = {}
 
@@ -501,9 +504,25 @@ def _compute_volatility_regime(volatility_score: float, range_pct: float) -> str
     return "explosion"
 
 
+# Rolling stats للـ PULSE_HISTORY (بتتبنى تاني لو الـ ring اتغير)
+_PULSE_STATS: dict = {}
+
+
+def _get_pulse_stats(ring, window: int) -> dict:
+    if _PULSE_STATS.get("ring_id") != id(ring):
+        _PULSE_STATS.clear()
+        _PULSE_STATS["ring_id"] = id(ring)
+        _PULSE_STATS["change"] = PulseRingStats(ring, "change_pct", window)
+        _PULSE_STATS["vol"] = PulseRingStats(ring, "vol", window)
+        _PULSE_STATS["range"] = PulseRingStats(ring, "range_pct", window)
+        _PULSE_STATS["change_diffs"] = PulseRingDiffs(ring, "change_pct", window)
+    return _PULSE_STATS
+
+
 def update_market_pulse(metrics: dict) -> dict:
     """
     تحديث نبض السوق وتخزين آخر القراءات فى PULSE_HISTORY داخل config
+    (نفس الـ PulseRing بتاع engine_smart_pulse)
     مع حساب إحصائيات تاريخية (متوسط + انحراف معيارى + percentiles)
     لاستخدامها فى بناء قراءات ديناميكية أدق.
     """
@@ -514,105 +533,66 @@ def update_market_pulse(metrics: dict) -> dict:
 
     regime = _compute_volatility_regime(vol, range_pct)
 
-    # -------- تهيئة / استخدام تاريخ النبض --------
-    history = getattr(config, "PULSE_HISTORY", None)
-    if history is None:
-        from collections import deque
-        maxlen = getattr(config, "PULSE_HISTORY_MAXLEN", 120)
-        history = deque(maxlen=maxlen)
-        config.PULSE_HISTORY = history  # type: ignore[assignment]
+    # -------- تاريخ النبض (PulseRing مشترك) --------
+    ring = get_pulse_ring()
+    window = int(getattr(config, "PULSE_HISTORY_MAXLEN", 30))
 
-    prev_entry = history[-1] if len(history) > 0 else None
-    prev_regime = prev_entry.get("regime") if isinstance(prev_entry, dict) else None
+    prev_regime = ring.last("regime")
 
     now = time.time()
-    entry = {
-        "time": now,
-        "price": price,
-        "change_pct": change,
-        "volatility_score": vol,
-        "range_pct": range_pct,
-        "regime": regime,
-    }
-    history.append(entry)
-
-    hist_list = list(history)
-    n = len(hist_list)
-
-    def _mean(values: list[float]) -> float:
-        return sum(values) / len(values) if values else 0.0
+    ring.append(
+        now,
+        price=price,
+        change_pct=change,
+        range_pct=range_pct,
+        vol=vol,
+        regime=regime,
+    )
+    stats = _get_pulse_stats(ring, window)
+    s_change = stats["change"].sync()
+    s_vol = stats["vol"].sync()
+    s_range = stats["range"].sync()
+    diffs = stats["change_diffs"].sync()
 
-    def _std(values: list[float], m: float) -> float:
-        if not values:
-            return 0.0
-        var = sum((v - m) ** 2 for v in values) / max(1, len(values) - 1)
-        return var ** 0.5
+    n = min(len(ring), window)
 
     # -------- سرعة الحركة & التسارع مثل الإصدار القديم --------
-    if n >= 2:
-        diffs = [
-            abs(hist_list[i]["change_pct"] - hist_list[i - 1]["change_pct"])
-            for i in range(1, n)
-        ]
-        avg_diff = _mean(diffs)
-    else:
-        avg_diff = 0.0
+    # متوسط |Δchange| + النص الأقدم / الأحدث بمجاميع جارية (مفيش list للنافذة كل tick)
+    avg_diff = diffs.mean() if n >= 2 else 0.0
 
     if n >= 5:
-        mid = max(2, n // 2)
-        early_diffs = [
-            abs(hist_list[i]["change_pct"] - hist_list[i - 1]["change_pct"])
-            for i in range(1, mid)
-        ]
-        late_diffs = [
-            abs(hist_list[i]["change_pct"] - hist_list[i - 1]["change_pct"])
-            for i in range(mid, n)
-        ]
-        early_avg = _mean(early_diffs)
-        late_avg = _mean(late_diffs)
+        early_avg, late_avg = diffs.split_means()
         accel = late_avg - early_avg
     else:
         accel = 0.0
 
     # -------- ثقة الاتجاه من التاريخ القريب --------
     if n >= 3:
-        recent = hist_list[-6:] if n >= 6 else hist_list
-        same_sign_count = 0
-        total = len(recent)
-        for e in recent:
-            c = e["change_pct"]
-            if change > 0 and c > 0:
-                same_sign_count += 1
-            elif change < 0 and c < 0:
-                same_sign_count += 1
-        direction_conf = (same_sign_count / total) * 100.0 if total else 0.0
+        recent = ring.window("change_pct", min(6, n))
+        if change > 0:
+            same_sign_count = sum(1 for c in recent if c > 0)
+        elif change < 0:
+            same_sign_count = sum(1 for c in recent if c < 0)
+        else:
+            same_sign_count = 0
+        direction_conf = (same_sign_count / len(recent)) * 100.0
     else:
         direction_conf = 0.0
 
     # -------- baseline ديناميكى (متوسط + std + percentiles) --------
     if n >= 10:
-        changes = [float(e["change_pct"]) for e in hist_list]
-        vols = [float(e["volatility_score"]) for e in hist_list]
-        ranges = [float(e["range_pct"]) for e in hist_list]
-
-        mean_change = _mean(changes)
-        std_change = _std(changes, mean_change)
+        # RollingStats: Welford + sorted ring بدل sort / sum كامل كل tick
+        mean_change = s_change.mean
+        std_change = s_change.std()
 
-        mean_vol = _mean(vols)
-        std_vol = _std(vols, mean_vol)
+        mean_vol = s_vol.mean
+        std_vol = s_vol.std()
 
-        mean_range = _mean(ranges)
-        std_range = _std(ranges, mean_range)
+        mean_range = s_range.mean
+        std_range = s_range.std()
 
-        sorted_vols = sorted(vols)
-        rank = sum(1 for v in sorted_vols if v <= vol)
-        vol_percentile = (rank / len(sorted_vols)) * 100.0 if sorted_vols else 0.0
-
-        sorted_ranges = sorted(ranges)
-        rank_r = sum(1 for v in sorted_ranges if v <= range_pct)
-        range_percentile = (
-            (rank_r / len(sorted_ranges)) * 100.0 if sorted_ranges else 0.0
-        )
+        vol_percentile = s_vol.rank_pct(vol)
+        range_percentile = s_range.rank_pct(range_pct)
     else:
         mean_change = std_change = 0.0
         mean_vol = std_vol = 0.0
@@ -622,6 +602,14 @@ def update_market_pulse(metrics: dict) -> dict:
     speed_index = max(0.0, min(100.0, avg_diff * 8.0))
     accel_index = max(-100.0, min(100.0, accel * 10.0))
 
+    ring.set_last(
+        speed_index=speed_index,
+        accel_index=accel_index,
+        direction_confidence=direction_conf,
+        vol_percentile=vol_percentile,
+        range_percentile=range_percentile,
+    )
+
     pulse = {
         "time": now,
         "price": price,
@@ -1090,7 +1078,71 @@ def compute_adaptive_interval(metrics: dict, pulse: dict, risk: dict) -> float:
     return max(min_iv, min(max_iv, base_iv))
 
 
+def map_engine_snapshot(eng: dict) -> dict:
+    """
+    تحويل Snapshot الـ engine الجديد (engine_smart_snapshot) للهيكل القديم
+    المتوقع فى services.py (alert_level / zones / adaptive_interval / reason).
+    مستخدمة فى اللايف وفى الـ Replay Engine.
+    """
+    metrics = eng.get("metrics") or {}
+    risk = eng.get("risk") or {}
+    pulse = eng.get("pulse") or {}
+    events = eng.get("events") or {}
+    alert = eng.get("alert") or {}
+
+    # Mapping للهيكل القديم المتوقع في services.py
+    tb = alert.get("trend_bias")
+    if tb == "bull":
+        trend_bias = "up_strong"
+    elif tb == "bear":
+        trend_bias = "down_strong"
+    elif tb == "neutral":
+        trend_bias = "balanced"
+    else:
+        trend_bias = "balanced"
+
+    level = alert.get("level") or "low"
+
+    alert_level = {
+        "level": level,
+        "shock_score": float(alert.get("shock_score") or 0.0),
+        "trend_bias": trend_bias,
+        "reasons": alert.get("reasons") or [],
+        "boost": float(alert.get("boost") or 0.0),
+    }
+
+    zones = compute_potential_zones(metrics, pulse, risk)
+    interval = compute_adaptive_interval(metrics, pulse, risk)
+
+    reason_text = build_smart_alert_reason(
+        metrics,
+        risk,
+        pulse,
+        events,
+        alert_level,
+        zones,
+    )
+
+    return {
+        "metrics": metrics,
+        "risk": risk,
+        "pulse": pulse,
+        "events": events,
+        "alert_level": alert_level,
+        "zones": zones,
+        "adaptive_interval": interval,
+        "reason": reason_text,
+    }
+
+
 def compute_smart_market_snapshot() -> dict | None:
+    """
+    Snapshot موحد للـ SmartAlert — من الـ Snapshot DAG (مرة واحدة لكل tick).
+    """
+    return SNAPSHOT_GRAPH.get("smart")
+
+
+def _compute_smart_market_snapshot_uncached() -> dict | None:
     """
     Snapshot موحد للـ SmartAlert.
 
@@ -1107,55 +1159,7 @@ def compute_smart_market_snapshot() -> dict | None:
         eng = None
 
     if eng:
-        metrics = eng.get("metrics") or {}
-        risk = eng.get("risk") or {}
-        pulse = eng.get("pulse") or {}
-        events = eng.get("events") or {}
-        alert = eng.get("alert") or {}
-
-        # Mapping للهيكل القديم المتوقع في services.py
-        tb = alert.get("trend_bias")
-        if tb == "bull":
-            trend_bias = "up_strong"
-        elif tb == "bear":
-            trend_bias = "down_strong"
-        elif tb == "neutral":
-            trend_bias = "balanced"
-        else:
-            trend_bias = "balanced"
-
-        level = alert.get("level") or "low"
-
-        alert_level = {
-            "level": level,
-            "shock_score": float(alert.get("shock_score") or 0.0),
-            "trend_bias": trend_bias,
-            "reasons": alert.get("reasons") or [],
-            "boost": float(alert.get("boost") or 0.0),
-        }
-
-        zones = compute_potential_zones(metrics, pulse, risk)
-        interval = compute_adaptive_interval(metrics, pulse, risk)
-
-        reason_text = build_smart_alert_reason(
-            metrics,
-            risk,
-            pulse,
-            events,
-            alert_level,
-            zones,
-        )
-
-        return {
-            "metrics": metrics,
-            "risk": risk,
-            "pulse": pulse,
-            "events": events,
-            "alert_level": alert_level,
-            "zones": zones,
-            "adaptive_interval": interval,
-            "reason": reason_text,
-        }
+        return map_engine_snapshot(eng)
 
     # ---- Path B: Legacy fallback ----
     metrics = get_market_metrics_cached()
@@ -2038,13 +2042,19 @@ ETH يتحرك فى اتجاه جانبى مرتبط بدرجة كبيرة بح
 # ==============================
 
 def compute_hybrid_pro_core() -> dict | None:
+    """
+    نواة التحليل المؤسسى — من الـ Snapshot DAG (node: hybrid_core).
+    """
+    return SNAPSHOT_GRAPH.get("hybrid_core")
+
+
+def _compute_hybrid_pro_core_uncached(snapshot: dict | None) -> dict | None:
     """
     نواة التحليل المؤسسى الاحترافى:
       - دمج Smart Snapshot + Fusion AI + Pulse Engine + Zones
       - استخراج اتجاه واضح + أهداف هبوط/صعود + نسب احتمالات
       - إدماج نظام التحذير المبكر Early Warning داخل القرار
     """
-    snapshot = compute_smart_market_snapshot()
     if not snapshot:
         return None
 
@@ -2621,45 +2631,9 @@ def _detect_candle_patterns_simple(klines):
     """
     كشف مبسط لأشهر نماذج الشموع على آخر 3 شموع من الفريم.
     الهدف: رسالة واضحة فقط، مش تحليل احترافى كامل.
+    (نفس الـ labels — الحساب من engine_candle_patterns)
     """
-    patterns = []
-    if not klines or len(klines) < 3:
-        return patterns
-
-    last3 = klines[-3:]
-    o1, h1, l1, c1 = last3[0]["open"], last3[0]["high"], last3[0]["low"], last3[0]["close"]
-    o2, h2, l2, c2 = last3[1]["open"], last3[1]["high"], last3[1]["low"], last3[1]["close"]
-    o3, h3, l3, c3 = last3[2]["open"], last3[2]["high"], last3[2]["low"], last3[2]["close"]
-
-    # أحجام الأجساد والذيول
-    body2 = abs(c2 - o2)
-    range2 = h2 - l2
-    body3 = abs(c3 - o3)
-    range3 = h3 - l3
-
-    # Bullish Engulfing
-    if c2 < o2 and c3 > o3 and body3 > body2 * 1.1 and o3 <= c2 and c3 >= o2:
-        patterns.append("ابتلاع شرائى (Bullish Engulfing)")
-
-    # Bearish Engulfing
-    if c2 > o2 and c3 < o3 and body3 > body2 * 1.1 and o3 >= c2 and c3 <= o2:
-        patterns.append("ابتلاع بيعى (Bearish Engulfing)")
-
-    # Pin Bar صاعد
-    upper3 = h3 - max(c3, o3)
-    lower3 = min(c3, o3) - l3
-    if lower3 > body3 * 2 and upper3 < body3 and c3 > o3:
-        patterns.append("شمعة بن بار صاعدة (Bullish Pin Bar)")
-
-    # Pin Bar هابط
-    if upper3 > body3 * 2 and lower3 < body3 and c3 < o3:
-        patterns.append("شمعة بن بار هابطة (Bearish Pin Bar)")
-
-    # Inside Bar (شمعة داخلية)
-    if h3 < h2 and l3 > l2:
-        patterns.append("شمعة داخلية (Inside Bar)")
-
-    return patterns
+    return detect_last_patterns(klines, kind="simple")
 
 
 def _detect_ict_signals_basic(klines):
@@ -3211,58 +3185,10 @@ def detect_candle_patterns_for_tf(candles: list) -> list[str]:
       - Inside Bar
       - Marubozu
     نركّز على آخر 3–5 شموع للفريم.
+
+    الحساب من engine_candle_patterns (أعمدة + masks) بنفس الـ labels.
     """
-    patterns: list[str] = []
-    if len(candles) < 3:
-        return patterns
-
-    last = candles[-1]
-    prev = candles[-2]
-    prev2 = candles[-3]
-
-    rng = _candle_range(last) or 1e-6
-    body = _body_size(last)
-    upper_wick = last["high"] - max(last["open"], last["close"])
-    lower_wick = min(last["open"], last["close"]) - last["low"]
-
-    # Pin bar (ذيل طويل)
-    if upper_wick >= 2 * body and upper_wick >= 0.6 * rng:
-        patterns.append("شمعة Pin Bar علوية (رفض أسعار أعلى)")
-    if lower_wick >= 2 * body and lower_wick >= 0.6 * rng:
-        patterns.append("شمعة Pin Bar سفلية (رفض أسعار أدنى)")
-
-    # Engulfing
-    if _is_bull(last) and _is_bear(prev):
-        if last["close"] >= prev["open"] and last["open"] <= prev["close"]:
-            patterns.append("نموذج ابتلاع شرائى (Bullish Engulfing)")
-    if _is_bear(last) and _is_bull(prev):
-        if last["close"] <= prev["open"] and last["open"] >= prev["close"]:
-            patterns.append("نموذج ابتلاع بيعى (Bearish Engulfing)")
-
-    # Inside Bar
-    if last["high"] <= prev["high"] and last["low"] >= prev["low"]:
-        patterns.append("نموذج Inside Bar (تجميع حركة داخل شمعة سابقة)")
-
-    # Marubozu تقريبى
-    if body >= 0.8 * rng:
-        if _is_bull(last):
-            patterns.append("شمعة Marubozu صاعدة قوية (هيمنة مشترين)")
-        elif _is_bear(last):
-            patterns.append("شمعة Marubozu هابطة قوية (هيمنة بائعين)")
-
-    # استمرار/انعكاس بسيط من آخر 3 شموع
-    dir_sum = 0
-    for c in (last, prev, prev2):
-        if _is_bull(c):
-            dir_sum += 1
-        elif _is_bear(c):
-            dir_sum -= 1
-    if dir_sum >= 2:
-        patterns.append("سلوك شموع متتالية صاعدة (زخم قصير المدى لأعلى)")
-    elif dir_sum <= -2:
-        patterns.append("سلوك شموع متتالية هابطة (زخم قصير المدى لأسفل)")
-
-    return patterns
+    return detect_last_patterns(candles, kind="v14")
 
 
 def detect_candle_patterns_multi_tf(mtf: dict) -> dict:
@@ -3545,35 +3471,57 @@ def analyze_price_action_and_zones(mtf: dict, metrics: dict) -> dict:
 #   مؤشرات فنية أساسية (Pack)
 # ------------------------------
 
-def compute_indicator_pack(candles: list) -> dict:
+def compute_indicator_pack(candles: list, symbol: str | None = None, timeframe: str | None = None) -> dict:
     """
     حزمة مبسطة من المؤشرات الفنية:
-      - EMA20 / EMA50
+      - EMA20 / EMA50 (+ EMA200 / RSI / MACD / Bollinger)
       - ATR
       - Stoch-like overbought/oversold
+
+    لو symbol + timeframe موجودين → القيم من engine_indicators
+    (state تراكمى O(1) لكل شمعة جديدة بدل إعادة الحساب كل مرة).
     """
     closes = [c["close"] for c in candles]
     if len(closes) < 50:
         return {}
 
-    def ema(values, period):
-        k = 2 / (period + 1)
-        ema_val = values[0]
-        for v in values[1:]:
-            ema_val = v * k + ema_val * (1 - k)
-        return ema_val
+    extra = {}
+    if symbol and timeframe:
+        try:
+            from engine_indicators import get_indicator_state, get_indicator_values, update_indicators
 
-    ema20 = ema(closes[-60:], 20)
-    ema50 = ema(closes[-60:], 50)
+            # أول مرة: تاريخ أطول (EMA200 محتاج 200 شمعة على الأقل)
+            if get_indicator_state(symbol, timeframe).count == 0:
+                get_indicator_values(symbol, timeframe, limit=300)
 
-    trs = []
-    for i in range(1, len(candles)):
-        h = candles[i]["high"]
-        l = candles[i]["low"]
-        prev_close = candles[i - 1]["close"]
-        tr = max(h - l, abs(h - prev_close), abs(l - prev_close))
-        trs.append(tr)
-    atr14 = sum(trs[-14:]) / 14 if len(trs) >= 14 else 0.0
+            extra = update_indicators(symbol, timeframe, candles)
+        except Exception as e:
+            config.logger.exception("Indicator engine error: %s", e)
+            extra = {}
+
+    if extra.get("ema20") is not None and extra.get("ema50") is not None:
+        ema20 = extra["ema20"]
+        ema50 = extra["ema50"]
+        atr14 = extra.get("atr14") or 0.0
+    else:
+        def ema(values, period):
+            k = 2 / (period + 1)
+            ema_val = values[0]
+            for v in values[1:]:
+                ema_val = v * k + ema_val * (1 - k)
+            return ema_val
+
+        ema20 = ema(closes[-60:], 20)
+        ema50 = ema(closes[-60:], 50)
+
+        trs = []
+        for i in range(1, len(candles)):
+            h = candles[i]["high"]
+            l = candles[i]["low"]
+            prev_close = candles[i - 1]["close"]
+            tr = max(h - l, abs(h - prev_close), abs(l - prev_close))
+            trs.append(tr)
+        atr14 = sum(trs[-14:]) / 14 if len(trs) >= 14 else 0.0
 
     last_close = closes[-1]
     if last_close > ema20 > ema50:
@@ -3595,7 +3543,7 @@ def compute_indicator_pack(candles: list) -> dict:
     else:
         stoch_state = "قراءة متوسطة لمؤشر التذبذب، لا تشبع واضح حالياً."
 
-    return {
+    pack = {
         "ema20": round(ema20, 2),
         "ema50": round(ema50, 2),
         "atr14": round(atr14, 2),
@@ -3603,12 +3551,51 @@ def compute_indicator_pack(candles: list) -> dict:
         "stoch_state": stoch_state,
     }
 
+    for key in ("ema200", "rsi", "macd", "macd_signal", "macd_hist", "bb_lower", "bb_mid", "bb_upper", "bb_width_pct"):
+        if key in extra:
+            pack[key] = extra[key]
+
+    return pack
+
 
 # ------------------------------
 #   V14 Ultra Multi-School Snapshot
 # ------------------------------
 
 def compute_v14_ultra_snapshot() -> dict | None:
+    """
+    لقطة V14 — من الـ Snapshot DAG (node: v14).
+    """
+    return SNAPSHOT_GRAPH.get("v14")
+
+
+def _primary_tf(mtf: dict | None) -> tuple:
+    """الفريم الأساسى للتحليلات الـ basic: 1h ولو مش موجود 4h."""
+    if mtf and "1h" in mtf:
+        return "1h", mtf["1h"]
+    if mtf and "4h" in mtf:
+        return "4h", mtf["4h"]
+    return None, None
+
+
+def _node_indicator_pack(mtf: dict | None) -> dict:
+    tf, candles = _primary_tf(mtf)
+    if not tf:
+        return {}
+    return compute_indicator_pack(candles, symbol="BTCUSDT", timeframe=tf)
+
+
+def _build_v14_ultra_snapshot(
+    core: dict | None,
+    mtf: dict | None,
+    candle_patterns: dict,
+    liq_map: dict,
+    smc_ict: dict,
+    harmonic_text: str,
+    elliott_text: str,
+    indicator_pack: dict,
+    pa_sd_classical: dict,
+) -> dict | None:
     """
     لقطة متقدمة تجمع:
       - V11 Smart/Ultra/Hybrid core
@@ -3619,39 +3606,11 @@ def compute_v14_ultra_snapshot() -> dict | None:
       - Price Action + Supply/Demand + Classical
       - Indicator Pack
       - Liquidity Map
+    (كل جزء node مستقل فى الـ DAG)
     """
-    core = compute_hybrid_pro_core()
     if not core:
         return None
 
-    metrics = get_market_metrics_cached() or {}
-    mtf = get_btc_multi_timeframes()
-    candle_patterns = detect_candle_patterns_multi_tf(mtf) if mtf else {}
-    liq_map = build_liquidity_map(mtf) if mtf else {}
-    smc_ict = analyze_smc_and_ict(mtf, metrics) if mtf else {
-        "smc_view": "",
-        "ict_view": "",
-    }
-
-    harmonic_text = ""
-    elliott_text = ""
-    indicator_pack = {}
-
-    if mtf and "1h" in mtf:
-        harmonic_text = analyze_harmonic_basic(mtf["1h"])
-        elliott_text = analyze_elliott_basic(mtf["1h"])
-        indicator_pack = compute_indicator_pack(mtf["1h"])
-    elif mtf and "4h" in mtf:
-        harmonic_text = analyze_harmonic_basic(mtf["4h"])
-        elliott_text = analyze_elliott_basic(mtf["4h"])
-        indicator_pack = compute_indicator_pack(mtf["4h"])
-
-    pa_sd_classical = analyze_price_action_and_zones(mtf, metrics) if mtf else {
-        "price_action": "",
-        "supply_demand": "",
-        "classical": "",
-    }
-
     snapshot = {
         "core": core,
         "mtf": mtf,
@@ -4161,19 +4120,16 @@ def format_school_report(code: str, symbol: str = "BTCUSDT") -> str:
 
     # حالياً كل المدارس مبنية على BTCUSDT كمحرك رئيسى
     # يمكن لاحقاً توسيعها لرموز أخرى لو تم دعمها على مستوى المحرك نفسه.
-    metrics = get_market_metrics_cached()
+    metrics = SNAPSHOT_GRAPH.get("metrics")
     if not metrics:
         return (
             "⚠️ تعذّر توليد تحليل المدرسة حاليًا بسبب مشكلة فى جلب بيانات السوق.\n"
             "حاول مرة أخرى بعد دقائق قليلة."
         )
 
-    # نأخذ لقطة ذكية + لقطة V14 المتقدمة إن أمكن
-    snapshot = compute_smart_market_snapshot() or {}
-    v14 = compute_v14_ultra_snapshot()
-
-    risk = evaluate_risk_level(metrics["change_pct"], metrics["volatility_score"])
-    fusion = fusion_ai_brain(metrics, risk)
+    # نأخذ لقطة ذكية + لقطة V14 المتقدمة إن أمكن (Snapshot DAG → كل engine مرة واحدة)
+    snapshot, v14, risk, fusion = SNAPSHOT_GRAPH.get_many("smart", "v14", "risk", "fusion")
+    snapshot = snapshot or {}
     pulse = snapshot.get("pulse") or {}
     events = snapshot.get("events") or {}
     alert_level = snapshot.get("alert_level") or {}
@@ -4876,3 +4832,96 @@ def format_school_entry(symbol: str, school: str) -> str:
         return snapshot.get("all_text", "⚠️ تحليل ALL غير متاح")
 
     return "❌ مدرسة التحليل غير معروفة"
+
+
+# ==============================
+#   Snapshot DAG (memoized per market tick)
+# ==============================
+
+def _snapshot_tick():
+    """
+    الـ tick = وقت آخر تحديث لـ MARKET_METRICS_CACHE.
+    لو الجلب فشل (الكاش قديم) → bucket زمنى بنفس الـ TTL.
+    """
+    get_market_metrics_cached()
+    ttl = max(1.0, float(config.MARKET_TTL_SECONDS))
+    ts = float(config.MARKET_METRICS_CACHE.get("time") or 0.0)
+    if ts and time.time() - ts <= ttl:
+        return ts
+    return ("bucket", int(time.time() // ttl))
+
+
+SNAPSHOT_GRAPH = SnapshotGraph(_snapshot_tick)
+
+SNAPSHOT_GRAPH.add("metrics", lambda: get_market_metrics_cached())
+SNAPSHOT_GRAPH.add(
+    "risk",
+    lambda m: evaluate_risk_level(m["change_pct"], m["volatility_score"]) if m else None,
+    ("metrics",),
+)
+SNAPSHOT_GRAPH.add(
+    "fusion",
+    lambda m, r: fusion_ai_brain(m, r) if m else None,
+    ("metrics", "risk"),
+)
+
+# Smart snapshot (update_market_pulse بيحصل هنا بس → مرة واحدة لكل tick)
+SNAPSHOT_GRAPH.add("smart", lambda m: _compute_smart_market_snapshot_uncached(), ("metrics",))
+SNAPSHOT_GRAPH.add("pulse", lambda s: (s or {}).get("pulse"), ("smart",))
+SNAPSHOT_GRAPH.add("events", lambda s: (s or {}).get("events"), ("smart",))
+SNAPSHOT_GRAPH.add("alert", lambda s: (s or {}).get("alert_level"), ("smart",))
+SNAPSHOT_GRAPH.add("zones", lambda s: (s or {}).get("zones"), ("smart",))
+SNAPSHOT_GRAPH.add("hybrid_core", lambda s: _compute_hybrid_pro_core_uncached(s), ("smart",))
+
+# Multi-timeframe + مدارس الـ V14
+SNAPSHOT_GRAPH.add("mtf", lambda m: get_btc_multi_timeframes(), ("metrics",))
+SNAPSHOT_GRAPH.add(
+    "candle_patterns",
+    lambda mtf: detect_candle_patterns_multi_tf(mtf) if mtf else {},
+    ("mtf",),
+)
+SNAPSHOT_GRAPH.add(
+    "liquidity_map",
+    lambda mtf: build_liquidity_map(mtf) if mtf else {},
+    ("mtf",),
+)
+SNAPSHOT_GRAPH.add(
+    "smc_ict",
+    lambda mtf, m: analyze_smc_and_ict(mtf, m or {}) if mtf else {"smc_view": "", "ict_view": ""},
+    ("mtf", "metrics"),
+)
+SNAPSHOT_GRAPH.add(
+    "harmonic",
+    lambda mtf: analyze_harmonic_basic(_primary_tf(mtf)[1]) if _primary_tf(mtf)[0] else "",
+    ("mtf",),
+)
+SNAPSHOT_GRAPH.add(
+    "elliott",
+    lambda mtf: analyze_elliott_basic(_primary_tf(mtf)[1]) if _primary_tf(mtf)[0] else "",
+    ("mtf",),
+)
+SNAPSHOT_GRAPH.add("indicator_pack", _node_indicator_pack, ("mtf",))
+SNAPSHOT_GRAPH.add(
+    "pa_zones",
+    lambda mtf, m: analyze_price_action_and_zones(mtf, m or {}) if mtf else {
+        "price_action": "",
+        "supply_demand": "",
+        "classical": "",
+    },
+    ("mtf", "metrics"),
+)
+SNAPSHOT_GRAPH.add(
+    "v14",
+    _build_v14_ultra_snapshot,
+    (
+        "hybrid_core",
+        "mtf",
+        "candle_patterns",
+        "liquidity_map",
+        "smc_ict",
+        "harmonic",
+        "elliott",
+        "indicator_pack",
+        "pa_zones",
+    ),
+)
@@ -1,3 +1,6 @@
+import hashlib
+import json
+import threading
 import time
 from datetime import datetime
 
@@ -31,6 +34,10 @@ from analysis_engine import (
     format_school_entry,
 )
 import services
+from engine_job_queue import PriorityJobQueue
+from engine_alert_store import get_alert_store, parse_ts
+from engine_event_hub import EventHub
+from engine_shared_state import start_shared_state
 
 app = Flask(__name__)
 
@@ -540,6 +547,22 @@ def _get_school_report_cached(code: str, symbol: str = "BTCUSDT") -> str:
         return _build_school_report(code, symbol=symbol)
 
 
+# ==============================
+#   Pre-render للمدارس (نفس مفتاح get_school_cached_response)
+# ==============================
+def _register_school_prerender(symbol: str = "BTCUSDT"):
+    for row in SCHOOL_INLINE_KEYBOARD["inline_keyboard"]:
+        for btn in row:
+            code = btn["callback_data"].split("school_", 1)[1]
+            services.register_report(
+                f"school:{code}:{symbol}",
+                lambda code=code: _build_school_report(code, symbol=symbol),
+            )
+
+
+_register_school_prerender()
+
+
 # ==============================
 #   مسارات أساسية / Webhook
 # ==============================
@@ -549,11 +572,120 @@ def index():
     return "IN CRYPTO Ai bot is running.", 200
 
 
+# ==============================
+#   Webhook Job Queue (Async)
+# ==============================
+
+# أوامر نصها ثابت (مفيش حسابات) — خفيفة دايماً
+_STATIC_COMMANDS = {
+    "/start",
+    "/school",
+    "/add_admin",
+    "/remove_admin",
+}
+
+# أوامر خفيفة بس لو الـ Pre-render عنده نص جاهز — غير كده بتبنى snapshot → الطابور
+_PRERENDERED_COMMANDS = {
+    "/btc": "btc_analysis",
+    "/market": "market_report",
+    "/risk_test": "risk_test",
+}
+
+
+def _classify_update(update: dict) -> int:
+    """
+    أولوية الـ job (الأقل يتنفذ الأول):
+      0 = admin + خفيف | 1 = admin + تقيل | 2 = user + خفيف | 3 = user + تقيل
+    """
+    heavy = True
+    chat_id = None
+
+    if "callback_query" in update:
+        cq = update.get("callback_query") or {}
+        chat_id = (cq.get("from") or {}).get("id")
+        data = cq.get("data") or ""
+        if data.startswith("school_"):
+            code = data.split("school_", 1)[1]
+            heavy = services.get_prerendered(f"school:{code}:BTCUSDT") is None
+    else:
+        msg = update.get("message") or {}
+        chat_id = (msg.get("chat") or {}).get("id")
+        parts = (msg.get("text") or "").strip().lower().split()
+        cmd = parts[0] if parts else ""
+        if cmd in _PRERENDERED_COMMANDS:
+            heavy = services.get_prerendered(_PRERENDERED_COMMANDS[cmd]) is None
+        elif cmd in _STATIC_COMMANDS:
+            heavy = cmd == "/school" and len(parts) > 1
+
+    is_admin = chat_id == config.ADMIN_CHAT_ID or chat_id in getattr(config, "EXTRA_ADMINS", set())
+    return (0 if is_admin else 2) + (1 if heavy else 0)
+
+
+def _run_update_job(update: dict):
+    # jsonify داخل _process_update محتاج app context فى الـ worker thread
+    with app.app_context():
+        _process_update(update)
+
+
+WEBHOOK_QUEUE = PriorityJobQueue(
+    handler=_run_update_job,
+    workers=int(getattr(config, "WEBHOOK_WORKERS", 4)),
+    maxsize=int(getattr(config, "WEBHOOK_QUEUE_MAXSIZE", 200)),
+    name="webhook",
+)
+
+
+# عدّاد الـ fast path (رد جوه الـ webhook response)
+INLINE_REPLY_STATS = {"inline": 0, "fallback": 0}
+_INLINE_STATS_LOCK = threading.Lock()
+
+
+def _process_update_inline(update: dict):
+    """
+    تنفيذ sync مع الرد فى الـ webhook response نفسه:
+    رد برسالة واحدة → {"method": "sendMessage", ...} بدل HTTPS request تانى لـ Telegram.
+    رد مقسوم / أكتر من رسالة → config بيرجع للإرسال العادى تلقائياً.
+    """
+    if not getattr(config, "WEBHOOK_REPLY_INLINE", True):
+        return _process_update(update)
+
+    config.begin_reply_capture()
+    try:
+        resp = _process_update(update)
+    except Exception:
+        config.end_reply_capture(send=True)
+        raise
+
+    reply = config.end_reply_capture()
+    if reply is None:
+        with _INLINE_STATS_LOCK:
+            INLINE_REPLY_STATS["fallback"] += 1
+        return resp
+
+    with _INLINE_STATS_LOCK:
+        INLINE_REPLY_STATS["inline"] += 1
+    return jsonify(method="sendMessage", **reply)
+
+
 @app.route("/webhook", methods=["POST"])
 def webhook():
     update = request.get_json(force=True, silent=True) or {}
     config.LAST_WEBHOOK_TICK = time.time()
 
+    # Ack فورى + الـ job فى الطابور (لو الطابور مليان نشتغل sync زى الأول)
+    # الأوامر الخفيفة (أولوية زوجية: نص ثابت / Pre-render جاهز) بتتنفذ هنا والرد يرجع فى الـ response
+    if getattr(config, "WEBHOOK_ASYNC", True):
+        priority = _classify_update(update)
+        if priority % 2 == 0 and getattr(config, "WEBHOOK_REPLY_INLINE", True):
+            return _process_update_inline(update)
+        if WEBHOOK_QUEUE.submit(update, priority=priority):
+            return jsonify(ok=True)
+        config.logger.warning("Webhook queue full, processing update synchronously.")
+
+    return _process_update_inline(update)
+
+
+def _process_update(update: dict):
     # ⭐ Auto register من أول أى Update
     try:
         config.auto_register_from_update(update)
@@ -704,6 +836,7 @@ def webhook():
             return jsonify(ok=True)
 
         config.EXTRA_ADMINS.add(target_id)
+        config.share_fields("EXTRA_ADMINS")
         send_message(
             chat_id,
             f"✅ تم إضافة <code>{target_id}</code> كأدمن.",
@@ -740,6 +873,7 @@ def webhook():
             return jsonify(ok=True)
 
         config.EXTRA_ADMINS.remove(target_id)
+        config.share_fields("EXTRA_ADMINS")
         send_message(chat_id, f"✅ تم إزالة <code>{target_id}</code> من الأدمن.")
         return jsonify(ok=True)
 
@@ -1074,6 +1208,7 @@ def auto_alert():
             "reason": "no_condition",
             "sent": False,
         }
+        config.share_fields("LAST_AUTO_ALERT_INFO")
         return jsonify(ok=True, alert_sent=False, reason="no_condition"), 200
 
     if config.LAST_ALERT_REASON == reason:
@@ -1083,6 +1218,7 @@ def auto_alert():
             "reason": "duplicate_reason",
             "sent": False,
         }
+        config.share_fields("LAST_AUTO_ALERT_INFO")
         return jsonify(ok=True, alert_sent=False, reason="duplicate_reason"), 200
 
     text = format_ai_alert()
@@ -1094,6 +1230,7 @@ def auto_alert():
         "reason": reason,
         "sent": True,
     }
+    config.share_fields("LAST_ALERT_REASON", "LAST_AUTO_ALERT_INFO")
     config.logger.info("auto_alert: NEW alert sent! reason=%s", reason)
 
     add_alert_history(
@@ -1120,14 +1257,23 @@ def test_alert():
         return {"ok": False, "error": str(e)}
 
 
-@app.route("/dashboard_api", methods=["GET"])
-def dashboard_api():
-    if not check_admin_auth(request):
-        return jsonify(ok=False, error="unauthorized"), 401
+# ==============================
+#   Dashboard payload (مرة واحدة لكل market tick)
+# ==============================
+# - الـ JSON بيتبنى ويتعمله serialize مرة واحدة لكل tick (نفس tick بتاع الـ Snapshot DAG)
+# - ETag = hash للمحتوى → أى poll من غير تغيير بياخد 304 من غير body
+# - lock واحد: لو كذا tab طلبوا فى نفس اللحظة، واحد بس بيبنى والباقى بياخد نفس النتيجة
+# → تكلفة الـ dashboard ثابتة مهما كان عدد المشاهدين
+
+_DASHBOARD_CACHE: dict = {"tick": None, "body": None, "etag": None, "payload": None, "built_at": 0.0}
+_DASHBOARD_LOCK = threading.Lock()
+DASHBOARD_CACHE_STATS = {"builds": 0, "hits": 0, "not_modified": 0}
 
+
+def _build_dashboard_payload() -> dict | None:
     metrics = get_market_metrics_cached()
     if not metrics:
-        return jsonify(ok=False, error="metrics_failed"), 200
+        return None
 
     risk = evaluate_risk_level(metrics["change_pct"], metrics["volatility_score"])
 
@@ -1140,7 +1286,7 @@ def dashboard_api():
         config.logger.exception("dashboard_api: compute_hybrid_pro_core failed: %s", e)
         pro_core = None
 
-    return jsonify(
+    return dict(
         ok=True,
         price=metrics["price"],
         change_pct=metrics["change_pct"],
@@ -1162,6 +1308,219 @@ def dashboard_api():
         last_watchdog_tick=config.LAST_WATCHDOG_TICK,
         last_smart_alert_tick=config.LAST_SMART_ALERT_TICK,
         pro_alert_core=pro_core,
+        webhook_queue=WEBHOOK_QUEUE.stats(),
+        last_broadcast=getattr(config, "LAST_BROADCAST_REPORT", {}),
+        inline_replies=dict(INLINE_REPLY_STATS),
+        outbox=config.OUTBOX.stats() if config.OUTBOX is not None else None,
+        db=config.get_db().stats() if config.get_db() is not None else None,
+        shared_state=config.SHARED_STATE.stats() if config.SHARED_STATE is not None else None,
+    )
+
+
+def get_dashboard_payload():
+    """
+    (body bytes, etag) للـ tick الحالى — أو (None, None) لو الـ metrics فشلت.
+    """
+    from analysis_engine import _snapshot_tick
+
+    tick = _snapshot_tick()
+    cache = _DASHBOARD_CACHE
+    if cache["tick"] == tick and cache["body"] is not None:
+        DASHBOARD_CACHE_STATS["hits"] += 1
+        return cache["body"], cache["etag"]
+
+    with _DASHBOARD_LOCK:
+        if cache["tick"] == tick and cache["body"] is not None:
+            DASHBOARD_CACHE_STATS["hits"] += 1
+            return cache["body"], cache["etag"]
+
+        payload = _build_dashboard_payload()
+        if payload is None:
+            return None, None
+
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        etag = hashlib.sha1(body).hexdigest()
+        cache.update(tick=tick, body=body, etag=etag, payload=payload, built_at=time.time())
+        DASHBOARD_CACHE_STATS["builds"] += 1
+        return body, etag
+
+
+@app.route("/dashboard_api", methods=["GET"])
+def dashboard_api():
+    if not check_admin_auth(request):
+        return jsonify(ok=False, error="unauthorized"), 401
+
+    body, etag = get_dashboard_payload()
+    if body is None:
+        return jsonify(ok=False, error="metrics_failed"), 200
+
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "private, no-cache"}
+    if request.if_none_match.contains(etag):
+        DASHBOARD_CACHE_STATS["not_modified"] += 1
+        return Response(status=304, headers=headers)
+
+    return Response(body, mimetype="application/json", headers=headers)
+
+
+# ==============================
+#   Dashboard Live Stream (SSE)
+# ==============================
+# producer واحد (ثريد) → EventHub → كل الـ tabs المفتوحة
+#   snapshot : الـ keys اللى اتغيرت فى الـ dashboard payload
+#              (build كل DASHBOARD_STREAM_SNAPSHOT_SECONDS بس — نفس إيقاع الـ polling القديم)
+#   logs     : سطور اللوج الجديدة من LOG_BUFFER
+#   alerts   : التحذيرات الجديدة من ALERTS_HISTORY
+
+DASHBOARD_HUB = EventHub(
+    max_clients=int(getattr(config, "DASHBOARD_STREAM_MAX_CLIENTS", 2)),
+    queue_size=100,
+)
+_STREAM_PRODUCER_LOCK = threading.Lock()
+_STREAM_PRODUCER: threading.Thread | None = None
+
+
+def _new_items(buf, last, key=None):
+    """
+    العناصر اللى اتضافت للـ deque بعد last → (items, full).
+    key: مفتاح ثابت للمقارنة (ALERTS_HISTORY بيتبنى من نسخ جديدة فى الـ workers
+    اللى مش leader → identity مش نافع). من غير key → identity (سطور اللوج المتكررة).
+    full=True لو last مش موجود (أول مرة / الـ deque لف أو اتمسح) → الـ client يستبدل مش يضيف.
+    """
+    items = list(buf)
+    if last is None:
+        return items, True
+    for i in range(len(items) - 1, -1, -1):
+        if (key(items[i]) == last) if key else (items[i] is last):
+            return items[i + 1:], False
+    return items, True
+
+
+def _alert_key(alert):
+    if not isinstance(alert, dict):
+        return alert
+    return (alert.get("time"), alert.get("source"), alert.get("reason"), alert.get("price"))
+
+
+def _dashboard_stream_loop():
+    interval = float(getattr(config, "DASHBOARD_STREAM_INTERVAL_SECONDS", 1.0))
+    snapshot_every = float(getattr(config, "DASHBOARD_STREAM_SNAPSHOT_SECONDS", 10.0))
+    last_snapshot_at = 0.0
+    last_etag = None
+    last_payload: dict = {}
+    last_log = None
+    last_alert = None
+
+    while True:
+        try:
+            if not DASHBOARD_HUB.has_subscribers():
+                # مفيش حد بيتفرج → مفيش شغل (والمشترك الجاى هياخد الحالة من أول)
+                last_etag = None
+                last_snapshot_at = 0.0
+                time.sleep(interval)
+                continue
+
+            etag = payload = None
+            now = time.time()
+            if now - last_snapshot_at >= snapshot_every:
+                # الـ build (metrics + hybrid core) بإيقاع الـ polling القديم مش كل tick
+                last_snapshot_at = now
+                _, etag = get_dashboard_payload()
+                payload = _DASHBOARD_CACHE.get("payload")
+            if etag and etag != last_etag and isinstance(payload, dict):
+                full = last_etag is None
+                delta = payload if full else {
+                    k: v for k, v in payload.items() if last_payload.get(k) != v
+                }
+                DASHBOARD_HUB.publish(
+                    "snapshot",
+                    {"full": full, "data": delta},
+                    full_state={"full": True, "data": payload},
+                )
+                last_etag, last_payload = etag, payload
+
+            new_logs, full = _new_items(config.LOG_BUFFER, last_log)
+            if new_logs:
+                last_log = new_logs[-1]
+                DASHBOARD_HUB.publish(
+                    "logs",
+                    {"full": full, "lines": new_logs},
+                    full_state={"full": True, "lines": list(config.LOG_BUFFER)},
+                )
+
+            new_alerts, full = _new_items(config.ALERTS_HISTORY, last_alert, key=_alert_key)
+            if new_alerts:
+                last_alert = _alert_key(new_alerts[-1])
+                DASHBOARD_HUB.publish(
+                    "alerts",
+                    {"full": full, "alerts": new_alerts},
+                    full_state={"full": True, "alerts": list(config.ALERTS_HISTORY)},
+                )
+        except Exception as e:
+            config.logger.exception("Dashboard stream producer error: %s", e)
+        time.sleep(interval)
+
+
+def _ensure_stream_producer():
+    global _STREAM_PRODUCER
+    if _STREAM_PRODUCER is not None and _STREAM_PRODUCER.is_alive():
+        return
+    with _STREAM_PRODUCER_LOCK:
+        if _STREAM_PRODUCER is None or not _STREAM_PRODUCER.is_alive():
+            _STREAM_PRODUCER = threading.Thread(
+                target=_dashboard_stream_loop,
+                name="dashboard_stream",
+                daemon=True,
+            )
+            _STREAM_PRODUCER.start()
+
+
+@app.route("/admin/stream", methods=["GET"])
+def admin_stream():
+    if not check_admin_auth(request):
+        return Response("Unauthorized", status=401)
+
+    sub = DASHBOARD_HUB.subscribe()
+    if sub is None:
+        # كل stream ماسك thread من gunicorn → الباقى يرجع للـ polling
+        return Response("too many dashboard streams", status=503)
+    _ensure_stream_producer()
+
+    max_seconds = float(getattr(config, "DASHBOARD_STREAM_MAX_SECONDS", 300))
+
+    def _gen():
+        try:
+            # retry للـ EventSource — الحالة الكاملة الحالية اتحطت فى الـ queue وقت subscribe
+            yield b"retry: 3000\n\n"
+            deadline = time.time() + max_seconds
+            while time.time() < deadline:
+                frame = sub.get(timeout=15.0)
+                # comment = heartbeat (يمنع الـ proxy يقفل الاتصال)
+                yield frame if frame is not None else b": ping\n\n"
+        finally:
+            # قفل الـ tab أو انتهاء المدة → الـ thread يرجع لـ gunicorn
+            DASHBOARD_HUB.unsubscribe(sub)
+
+    return Response(
+        _gen(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/admin/queue_stats", methods=["GET"])
+def admin_queue_stats():
+    if not check_admin_auth(request):
+        return jsonify(ok=False, error="unauthorized"), 401
+
+    return jsonify(
+        ok=True,
+        webhook_queue=WEBHOOK_QUEUE.stats(),
+        inline_replies=dict(INLINE_REPLY_STATS),
+        outbox=config.OUTBOX.stats() if config.OUTBOX is not None else None,
+        db=config.get_db().stats() if config.get_db() is not None else None,
+        shared_state=config.SHARED_STATE.stats() if config.SHARED_STATE is not None else None,
+        dashboard_cache=dict(DASHBOARD_CACHE_STATS),
+        dashboard_stream=DASHBOARD_HUB.stats(),
     )
 
 
@@ -1189,10 +1548,43 @@ def admin_logs():
 
 @app.route("/admin/alerts_history", methods=["GET"])
 def admin_alerts_history():
+    """
+    Query params (كلها اختيارية):
+      since / until : epoch أو ISO (2024-01-31T12:00:00)
+      level / source: فلترة (مثلاً level=critical&source=smart_auto)
+      limit         : حجم الصفحة (افتراضى 100 — أقصى 1000)
+      before        : cursor للصفحة الأقدم (next_before من الرد اللى فات)
+      resolution    : raw (افتراضى) / hour / day → عدّادات من الـ rollups
+    """
     if not check_admin_auth(request):
         return jsonify(ok=False, error="unauthorized"), 401
 
-    return jsonify(ok=True, alerts=list(config.ALERTS_HISTORY))
+    store = get_alert_store()
+    if store is None:
+        return jsonify(ok=True, alerts=list(config.ALERTS_HISTORY), next_before=None)
+
+    args = request.args
+    since = parse_ts(args.get("since"))
+    until = parse_ts(args.get("until"))
+    level = args.get("level") or None
+    source = args.get("source") or None
+    try:
+        limit = int(args.get("limit", 100))
+        before = int(args["before"]) if args.get("before") else None
+    except ValueError:
+        return jsonify(ok=False, error="limit / before لازم يكونوا أرقام"), 400
+
+    try:
+        resolution = (args.get("resolution") or "raw").lower()
+        if resolution in ("hour", "day"):
+            data = store.rollup(since, until, level, source, resolution=resolution, limit=limit)
+        else:
+            data = store.query(since, until, level, source, limit=limit, before=before)
+    except Exception as e:
+        config.logger.exception("Error querying alert store: %s", e)
+        return jsonify(ok=True, alerts=list(config.ALERTS_HISTORY), next_before=None)
+
+    return jsonify(ok=True, **data)
 
 
 @app.route("/admin/clear_alerts", methods=["GET"])
@@ -1201,6 +1593,13 @@ def admin_clear_alerts():
         return jsonify(ok=False, error="unauthorized"), 401
 
     config.ALERTS_HISTORY.clear()
+    config.share_append("ALERTS_HISTORY", clear=True)
+    try:
+        store = get_alert_store()
+        if store is not None:
+            store.clear_events()
+    except Exception as e:
+        config.logger.exception("Error clearing alert store: %s", e)
     config.logger.info("Admin cleared alerts history from dashboard.")
     return jsonify(ok=True, message="تم مسح سجل التحذيرات.")
 
@@ -1347,6 +1746,17 @@ def set_webhook_on_startup():
 # WSGI/Gunicorn bootstrap (no deletion)
 # ------------------------------
 
+def start_background():
+    """
+    worker واحد (STATE_BACKEND=local) → الـ background threads تشتغل هنا على طول.
+    أكتر من worker → الـ shared state بيختار leader واحد هو اللى يشغّلها
+    والباقى بيقرا الحالة منه (engine_shared_state).
+    """
+    state = start_shared_state(on_leader=services.start_background_threads)
+    if state is None:
+        services.start_background_threads()
+
+
 def bootstrap_app_once():
     """Start background threads + webhook setup when running under gunicorn (import-time).
 
@@ -1379,7 +1789,7 @@ def bootstrap_app_once():
             config.logger.exception("Failed to set webhook on startup (WSGI): %s", e)
 
         try:
-            services.start_background_threads()
+            start_background()
         except Exception as e:
             config.logger.exception("Failed to start background threads (WSGI): %s", e)
 
@@ -1406,7 +1816,7 @@ if __name__ == "__main__":
         logging.exception("Failed to set webhook on startup: %s", e)
 
     try:
-        services.start_background_threads()
+        start_background()
     except Exception as e:
         logging.exception("Failed to start background threads: %s", e)
 
@@ -1,14 +1,13 @@
 import os
 import time
+import atexit
 import logging
+import threading
 import requests
 import json
 from datetime import datetime
 from collections import deque
 
-import psycopg2
-from psycopg2.extras import execute_values
-
 # ==============================
 #        الإعدادات العامة
 # ==============================
@@ -43,40 +42,73 @@ except Exception:
 KNOWN_CHATS_FILE = os.path.join(DATA_DIR, "known_chats.json")
 
 # ==============================
-#  إعداد PostgreSQL لحفظ الشاتات
+#  Database (engine_db) — PostgreSQL pool أو SQLite محلى
 # ==============================
 
 PG_URL = os.getenv("PG_URL")
-_PG_CONN = None
 
-def get_pg_conn():
+# postgres (افتراضى لو PG_URL موجود) / sqlite (تشغيل محلى وتجارب) / فاضى = ملفات بس
+DB_BACKEND = os.getenv("DB_BACKEND", "postgres" if PG_URL else "").strip().lower()
+DB_SQLITE_PATH = os.getenv("DB_SQLITE_PATH", os.path.join(DATA_DIR, "bot.sqlite3"))
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "8"))
+DB_HEALTHCHECK_IDLE_SECONDS = float(os.getenv("DB_HEALTHCHECK_IDLE_SECONDS", "30"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "5000"))
+
+_DB = None
+_DB_LOCK = threading.Lock()
+
+
+def get_db():
     """
-    إرجاع اتصال PostgreSQL واحد يُستخدم طوال عمر العملية.
-    لو PG_URL غير متضبط → نرجع None.
+    الـ Database المشتركة (thread-safe) — None لو مفيش backend متضبط.
+    لو الاتصال فشل وقت الإنشاء → None دلوقتى ونحاول تانى فى الاستدعاء الجاى.
     """
-    global _PG_CONN
-    if not PG_URL:
-        return None
-    if _PG_CONN is None:
-        _PG_CONN = psycopg2.connect(PG_URL)
-        _PG_CONN.autocommit = True
-    return _PG_CONN
+    global _DB
+    if _DB is not None or not DB_BACKEND:
+        return _DB
+    with _DB_LOCK:
+        if _DB is None:
+            from engine_db import create_database
+
+            try:
+                _DB = create_database(
+                    DB_BACKEND,
+                    pg_url=PG_URL,
+                    sqlite_path=DB_SQLITE_PATH,
+                    minconn=DB_POOL_MIN,
+                    maxconn=DB_POOL_MAX,
+                    healthcheck_idle=DB_HEALTHCHECK_IDLE_SECONDS,
+                    statement_timeout_ms=DB_STATEMENT_TIMEOUT_MS,
+                    logger=logger,
+                )
+                if _DB is not None:
+                    logger.info("Database ready (backend=%s).", _DB.backend)
+            except Exception as e:
+                logger.exception("Error creating database (%s): %s", DB_BACKEND, e)
+                return None
+    return _DB
+
+
+_KNOWN_CHATS_TABLE_READY = False
+
 
 def ensure_known_chats_table():
     """
-    إنشاء جدول known_chats لو مش موجود.
+    إنشاء جدول known_chats لو مش موجود (مرة واحدة لكل process).
     """
-    conn = get_pg_conn()
-    if not conn:
+    global _KNOWN_CHATS_TABLE_READY
+    db = get_db()
+    if not db or _KNOWN_CHATS_TABLE_READY:
         return
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS known_chats (
-                chat_id BIGINT PRIMARY KEY
-            )
-            """
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS known_chats (
+            chat_id BIGINT PRIMARY KEY
         )
+        """
+    )
+    _KNOWN_CHATS_TABLE_READY = True
 
 # ==============================
 #  حالة التحذيرات / الأسبوعى
@@ -85,6 +117,9 @@ def ensure_known_chats_table():
 # حالة آخر تحذير اتبعت تلقائى (النظام القديم /auto_alert)
 LAST_ALERT_REASON: str | None = None
 
+# أدمنز إضافيين (/add_admin) — مشتركين بين الـ workers (engine_shared_state)
+EXTRA_ADMINS: set = set()
+
 # آخر استدعاء لـ /auto_alert (للوحة المراقبة)
 LAST_AUTO_ALERT_INFO: dict = {
     "time": None,
@@ -153,6 +188,12 @@ logger.addHandler(_memory_handler)
 
 ALERTS_HISTORY = deque(maxlen=100)
 
+# Alert Store دائم (engine_alert_store) — على get_db() أو SQLite محلى لو مفيش DB
+ALERT_STORE_ENABLED = os.getenv("ALERT_STORE_ENABLED", "1") == "1"
+ALERT_STORE_DB = os.getenv("ALERT_STORE_DB", os.path.join(DATA_DIR, "alerts.sqlite3"))
+ALERT_STORE_RAW_RETENTION_DAYS = float(os.getenv("ALERT_STORE_RAW_RETENTION_DAYS", "180"))
+ALERT_STORE_ROLLUP_RETENTION_DAYS = float(os.getenv("ALERT_STORE_ROLLUP_RETENTION_DAYS", "3650"))
+
 def add_alert_history(
     source: str, reason: str, price: float | None = None, change: float | None = None
 ):
@@ -164,8 +205,14 @@ def add_alert_history(
         "change_pct": change,
     }
     ALERTS_HISTORY.append(entry)
+    share_append("ALERTS_HISTORY", entry)
     logger.info("Alert history added: %s", entry)
 
+    # التخزين الدائم (engine_alert_store) — الـ deque فوق hot cache بس
+    from engine_alert_store import record_alert
+
+    record_alert(source, reason, price=price, change_pct=change)
+
 # ==============================
 #   قائمة بالشاتات المعروفة (مع حفظ على ملف)
 # ==============================
@@ -174,108 +221,208 @@ def add_alert_history(
 KNOWN_CHAT_IDS: set[int] = set()
 KNOWN_CHAT_IDS.add(ADMIN_CHAT_ID)
 
+# ---------- Incremental persistence (journal + debounce) ----------
+# - register_known_chat بيضيف الـ id للـ set + قائمة dirty بس (O(1) مهما كان عدد الشاتات)
+# - بعد KNOWN_CHATS_DEBOUNCE_SECONDS: الـ ids الجديدة بتتضاف سطر سطر فى journal
+#   + INSERT ... ON CONFLICT DO NOTHING للـ Database (engine_db) فى batch واحد
+# - كل KNOWN_CHATS_COMPACT_EVERY سطر: compaction → known_chats.json كامل (atomic) + تفريغ الـ journal
+
+KNOWN_CHATS_JOURNAL = os.path.join(DATA_DIR, "known_chats.journal")
+KNOWN_CHATS_DEBOUNCE_SECONDS = float(os.getenv("KNOWN_CHATS_DEBOUNCE_SECONDS", "2"))
+KNOWN_CHATS_COMPACT_EVERY = int(os.getenv("KNOWN_CHATS_COMPACT_EVERY", "500"))
+
+_KNOWN_CHATS_DIRTY: list[int] = []
+_KNOWN_CHATS_DB_RETRY: list[int] = []      # ids اتكتبت فى الـ journal والـ DB insert فشل
+KNOWN_CHATS_DB_RETRY_SECONDS = 30.0
+_KNOWN_CHATS_LOCK = threading.Lock()      # الـ dirty list + الـ timer
+_KNOWN_CHATS_IO_LOCK = threading.Lock()   # flush واحد فى نفس الوقت
+_KNOWN_CHATS_TIMER = None
+_KNOWN_CHATS_JOURNAL_LINES = 0
+
+
+def _compact_known_chats():
+    """كتابة known_chats.json كامل (tmp + os.replace) وتفريغ الـ journal."""
+    global _KNOWN_CHATS_JOURNAL_LINES
+    data = sorted(int(cid) for cid in list(KNOWN_CHAT_IDS))
+    tmp = f"{KNOWN_CHATS_FILE}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, KNOWN_CHATS_FILE)
+    # الـ snapshot فيه كل حاجة → الـ journal مبقاش محتاجينه
+    with open(KNOWN_CHATS_JOURNAL, "w", encoding="utf-8"):
+        pass
+    _KNOWN_CHATS_JOURNAL_LINES = 0
+    logger.info("Compacted %d known chat ids into %s", len(data), KNOWN_CHATS_FILE)
+
+
 def _save_known_chats():
     """
-    حفظ KNOWN_CHAT_IDS فى:
-    1) ملف JSON داخل /data/known_chats.json
-    2) قاعدة بيانات PostgreSQL (لو PG_URL متضبط)
+    Flush للـ ids الجديدة بس:
+    1) append فى /data/known_chats.journal (+ compaction دورى لـ known_chats.json)
+    2) upsert batch فى الـ Database (PostgreSQL / SQLite — config.get_db)
     """
-    # 1) حفظ فى الملف المحلى
-    try:
-        data = sorted(int(cid) for cid in KNOWN_CHAT_IDS)
-        with open(KNOWN_CHATS_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False)
-        logger.info("Saved %d known chat ids to %s", len(KNOWN_CHAT_IDS), KNOWN_CHATS_FILE)
-    except Exception as e:
-        logger.exception("Error saving known chats to file: %s", e)
+    global _KNOWN_CHATS_DIRTY, _KNOWN_CHATS_DB_RETRY, _KNOWN_CHATS_TIMER, _KNOWN_CHATS_JOURNAL_LINES
+
+    with _KNOWN_CHATS_LOCK:
+        batch = _KNOWN_CHATS_DIRTY
+        _KNOWN_CHATS_DIRTY = []
+        retry = _KNOWN_CHATS_DB_RETRY
+        _KNOWN_CHATS_DB_RETRY = []
+        _KNOWN_CHATS_TIMER = None
+    if not batch and not retry:
+        return
 
-    # 2) حفظ فى PostgreSQL
-    try:
-        conn = get_pg_conn()
-        if not conn:
-            return
+    with _KNOWN_CHATS_IO_LOCK:
+        # 1) الملف المحلى
+        try:
+            if batch:
+                with open(KNOWN_CHATS_JOURNAL, "a", encoding="utf-8") as f:
+                    f.write("".join(f"{cid}\n" for cid in batch))
+                    f.flush()
+                    os.fsync(f.fileno())
+                _KNOWN_CHATS_JOURNAL_LINES += len(batch)
+                if _KNOWN_CHATS_JOURNAL_LINES >= KNOWN_CHATS_COMPACT_EVERY:
+                    _compact_known_chats()
+        except Exception as e:
+            logger.exception("Error saving known chats to file: %s", e)
+
+        # 2) Database (PostgreSQL / SQLite)
+        rows = retry + batch
+        try:
+            db = get_db()
+            if not db:
+                return
+
+            ensure_known_chats_table()
+            db.insert_many(
+                "INSERT INTO known_chats(chat_id) VALUES %s ON CONFLICT DO NOTHING",
+                [(cid,) for cid in rows],
+            )
+            logger.info("Saved %d new known chats to %s", len(rows), db.backend)
+        except Exception as e:
+            # الـ ids مش هتضيع: بترجع للطابور وتتعاد بعد KNOWN_CHATS_DB_RETRY_SECONDS
+            logger.exception("Error saving known chats to database (%d queued for retry): %s", len(rows), e)
+            with _KNOWN_CHATS_LOCK:
+                _KNOWN_CHATS_DB_RETRY = rows + _KNOWN_CHATS_DB_RETRY
+                _schedule_known_chats_save(KNOWN_CHATS_DB_RETRY_SECONDS)
+
+
+def _schedule_known_chats_save(delay: float = None):
+    """أول id جديد بيفتح نافذة debounce — أى ids تانية خلالها بتتكتب معاه فى نفس الـ flush."""
+    global _KNOWN_CHATS_TIMER
+    if _KNOWN_CHATS_TIMER is not None:
+        return
+    t = threading.Timer(KNOWN_CHATS_DEBOUNCE_SECONDS if delay is None else delay, _save_known_chats)
+    t.daemon = True
+    _KNOWN_CHATS_TIMER = t
+    t.start()
 
-        ensure_known_chats_table()
-        with conn.cursor() as cur:
-            # نمسح القديم ونكتب القائمة الحالية
-            cur.execute("TRUNCATE known_chats")
-            values = [(int(cid),) for cid in KNOWN_CHAT_IDS]
-            if values:
-                execute_values(
-                    cur,
-                    "INSERT INTO known_chats(chat_id) VALUES %s ON CONFLICT DO NOTHING",
-                    values,
-                )
-        logger.info("Saved known chats to PostgreSQL (%d rows)", len(KNOWN_CHAT_IDS))
-    except Exception as e:
-        logger.exception("Error saving known chats to PostgreSQL: %s", e)
 
 def _load_known_chats():
     """
     تحميل الشاتات المعروفة:
-    1) نحاول أولاً من PostgreSQL (لو PG_URL متضبط).
-    2) لو مفيش DB أو حصل خطأ → نرجع للملف المحلى known_chats.json.
+    1) من الـ Database (PostgreSQL / SQLite لو DB_BACKEND متضبط).
+    2) + الملف المحلى known_chats.json + الـ journal (دايماً)
+       → اللى ناقص من الـ DB بيتعمله upsert تانى.
     """
     global KNOWN_CHAT_IDS
 
-    loaded_from_db = False
+    db_ids = None
 
-    # أولاً: التحميل من PostgreSQL
+    # أولاً: التحميل من الـ Database (PostgreSQL / SQLite)
     try:
-        conn = get_pg_conn()
-        if conn:
+        db = get_db()
+        if db:
             ensure_known_chats_table()
-            with conn.cursor() as cur:
-                cur.execute("SELECT chat_id FROM known_chats")
-                rows = cur.fetchall()
+            rows = db.fetchall("SELECT chat_id FROM known_chats")
+            db_ids = set()
             for (cid,) in rows:
                 try:
-                    KNOWN_CHAT_IDS.add(int(cid))
+                    db_ids.add(int(cid))
                 except Exception:
                     continue
+            KNOWN_CHAT_IDS.update(db_ids)
             if rows:
-                loaded_from_db = True
                 logger.info(
-                    "Loaded %d known chat ids from PostgreSQL",
+                    "Loaded %d known chat ids from %s",
                     len(KNOWN_CHAT_IDS),
+                    db.backend,
                 )
     except Exception as e:
-        logger.exception("Error loading known chats from PostgreSQL: %s", e)
+        logger.exception("Error loading known chats from database: %s", e)
 
-    # ثانياً: لو ماقدرناش من الـ DB → نحاول من الملف المحلى
-    if not loaded_from_db:
-        try:
-            if os.path.exists(KNOWN_CHATS_FILE):
-                with open(KNOWN_CHATS_FILE, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                if isinstance(data, list):
-                    for cid in data:
-                        try:
-                            KNOWN_CHAT_IDS.add(int(cid))
-                        except Exception:
-                            continue
-                elif isinstance(data, dict):
-                    # لو اتخزن dict بالخطأ فى أى وقت، نجرب ناخد القيم
-                    for cid in data.values():
-                        try:
-                            KNOWN_CHAT_IDS.add(int(cid))
-                        except Exception:
-                            continue
-                logger.info(
-                    "Loaded %d known chat ids from %s",
-                    len(KNOWN_CHAT_IDS),
-                    KNOWN_CHATS_FILE,
-                )
-        except Exception as e:
-            logger.exception("Error loading known chats from file: %s", e)
+    # ثانياً: الملف المحلى (snapshot + journal) دايماً — حتى لو الـ DB رجّع صفوف:
+    # أى id فى الـ journal والـ DB insert بتاعه فشل قبل الريستارت بيرجع للـ DB هنا
+    try:
+        if os.path.exists(KNOWN_CHATS_FILE):
+            with open(KNOWN_CHATS_FILE, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, list):
+                for cid in data:
+                    try:
+                        KNOWN_CHAT_IDS.add(int(cid))
+                    except Exception:
+                        continue
+            elif isinstance(data, dict):
+                # لو اتخزن dict بالخطأ فى أى وقت، نجرب ناخد القيم
+                for cid in data.values():
+                    try:
+                        KNOWN_CHAT_IDS.add(int(cid))
+                    except Exception:
+                        continue
+            logger.info(
+                "Loaded %d known chat ids from %s",
+                len(KNOWN_CHAT_IDS),
+                KNOWN_CHATS_FILE,
+            )
+    except Exception as e:
+        logger.exception("Error loading known chats from file: %s", e)
+
+    _replay_known_chats_journal()
+
+    if db_ids is not None:
+        missing = sorted(KNOWN_CHAT_IDS - db_ids)
+        if missing:
+            logger.info("Re-syncing %d known chat ids missing from the database.", len(missing))
+            with _KNOWN_CHATS_LOCK:
+                _KNOWN_CHATS_DB_RETRY.extend(missing)
+                _schedule_known_chats_save()
 
     # نتأكد دايمًا إن الـ ADMIN_CHAT_ID موجود
     KNOWN_CHAT_IDS.add(ADMIN_CHAT_ID)
 
+def _replay_known_chats_journal():
+    """الـ ids اللى اتضافت بعد آخر compaction."""
+    global _KNOWN_CHATS_JOURNAL_LINES
+    try:
+        if not os.path.exists(KNOWN_CHATS_JOURNAL):
+            return
+        n = 0
+        with open(KNOWN_CHATS_JOURNAL, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    KNOWN_CHAT_IDS.add(int(line))
+                    n += 1
+                except Exception:
+                    continue  # سطر ناقص (crash فى نص الكتابة)
+        _KNOWN_CHATS_JOURNAL_LINES = n
+        if n:
+            logger.info("Replayed %d known chat ids from %s", n, KNOWN_CHATS_JOURNAL)
+    except Exception as e:
+        logger.exception("Error replaying known chats journal: %s", e)
+
+def _persist_known_chat(chat_id: int):
+    with _KNOWN_CHATS_LOCK:
+        _KNOWN_CHATS_DIRTY.append(chat_id)
+        _schedule_known_chats_save()
+
 def register_known_chat(chat_id: int):
     """
-    تسجيل أى chat_id جديد فى KNOWN_CHAT_IDS + حفظه فوراً على الملف.
+    تسجيل أى chat_id جديد فى KNOWN_CHAT_IDS + جدولة حفظه (debounce).
     - لو الشات مسجل قبل كده → مفيش أى حفظ إضافى (مافيش Spam على الـ I/O).
+    - التكلفة O(1) مهما كان عدد الشاتات — الكتابة نفسها فى ثريد الـ Timer.
     """
     try:
         chat_id = int(chat_id)
@@ -284,7 +431,12 @@ def register_known_chat(chat_id: int):
     try:
         if chat_id not in KNOWN_CHAT_IDS:
             KNOWN_CHAT_IDS.add(chat_id)
-            _save_known_chats()
+            state = SHARED_STATE
+            if state is not None:
+                # باقى الـ workers يشوفوه — والـ leader بس هو اللى بيكتبه على الملف / الـ DB
+                state.on_new_chat(chat_id)
+            if state is None or state.is_leader:
+                _persist_known_chat(chat_id)
             logger.info(
                 "Registered new chat_id=%s (total_known=%d)",
                 chat_id,
@@ -316,6 +468,9 @@ try:
 except Exception as e:
     logger.exception("Failed to load known chats on startup: %s", e)
 
+# أى ids فى نافذة الـ debounce وقت الإيقاف الطبيعى → تتكتب قبل الخروج
+atexit.register(_save_known_chats)
+
 # ==============================
 #   HTTP Session موحدة
 # ==============================
@@ -343,7 +498,10 @@ MARKET_TTL_SECONDS = 4  # ثوانى
 # ------------------------------
 #   Pulse History (Smart Engine)
 # ------------------------------
-PULSE_HISTORY = deque(maxlen=30)
+# PulseRing واحد مشترك (engine_pulse_ring.get_pulse_ring بتنشئه أول مرة)
+PULSE_HISTORY = None
+PULSE_RING_CAPACITY = 60     # عدد القراءات المحفوظة فى الـ ring
+PULSE_HISTORY_MAXLEN = 30    # نافذة الـ legacy pulse (analysis_engine)
 
 # ==============================
 #   Real-Time Cache (نصوص جاهزة)
@@ -361,6 +519,16 @@ REALTIME_CACHE: dict = {
 }
 REALTIME_TTL_SECONDS = 8  # ثوانى
 
+# Pre-render للتقارير (engine_prerender)
+PRERENDER_ENABLED = os.getenv("PRERENDER_ENABLED", "1") == "1"
+PRERENDER_INTERVAL_SECONDS = float(os.getenv("PRERENDER_INTERVAL_SECONDS", "5"))
+PRERENDER_MIN_INTERVAL_SECONDS = float(os.getenv("PRERENDER_MIN_INTERVAL_SECONDS", "5"))
+# النص الجاهز بيتقدم لحد REALTIME_TTL_SECONDS بس (نفس عمر الكاش العادى)
+PRERENDER_MAX_AGE_SECONDS = float(os.getenv("PRERENDER_MAX_AGE_SECONDS", str(REALTIME_TTL_SECONDS)))
+# تقرير محدش طلبه من PRERENDER_IDLE_SECONDS → بيقف يتبنى لحد ما حد يطلبه تانى
+PRERENDER_IDLE_SECONDS = float(os.getenv("PRERENDER_IDLE_SECONDS", "600"))
+PRERENDER_DEMAND: dict = {}  # key → آخر وقت اتطلب فيه (get_prerendered)
+
 # ==============================
 #   Watchdog / Health Indicators
 # ==============================
@@ -372,6 +540,72 @@ LAST_WEBHOOK_TICK: float = 0.0
 LAST_SMART_ALERT_TICK: float = 0.0
 LAST_KEEP_ALIVE_TICK: float = 0.0
 LAST_KEEP_ALIVE_OK: float = 0.0
+LAST_PRERENDER_TICK: float = 0.0
+
+# Webhook Async Queue (bot.WEBHOOK_QUEUE)
+WEBHOOK_ASYNC = os.getenv("WEBHOOK_ASYNC", "1") == "1"
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+WEBHOOK_QUEUE_MAXSIZE = int(os.getenv("WEBHOOK_QUEUE_MAXSIZE", "200"))
+# الأوامر الخفيفة تتنفذ جوه الـ webhook والرد يرجع فى الـ response نفسه
+WEBHOOK_REPLY_INLINE = os.getenv("WEBHOOK_REPLY_INLINE", "1") == "1"
+
+# Dashboard Live Stream (SSE — /admin/stream)
+# كل stream ماسك thread من gunicorn (--threads 8) → الحد صغير والباقى يرجع للـ polling
+DASHBOARD_STREAM_MAX_CLIENTS = int(os.getenv("DASHBOARD_STREAM_MAX_CLIENTS", "2"))
+DASHBOARD_STREAM_INTERVAL_SECONDS = float(os.getenv("DASHBOARD_STREAM_INTERVAL_SECONDS", "1"))
+DASHBOARD_STREAM_MAX_SECONDS = float(os.getenv("DASHBOARD_STREAM_MAX_SECONDS", "300"))  # بعدها الـ browser يعمل reconnect
+# بناء الـ snapshot (metrics + hybrid core) — نفس إيقاع الـ polling القديم (10s)، الـ logs/alerts كل ثانية
+DASHBOARD_STREAM_SNAPSHOT_SECONDS = float(os.getenv("DASHBOARD_STREAM_SNAPSHOT_SECONDS", "10"))
+
+# Broadcast Engine (engine_broadcast) — حدود Telegram
+BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", "16"))
+BROADCAST_GLOBAL_RATE = float(os.getenv("BROADCAST_GLOBAL_RATE", "30"))  # msg/s
+BROADCAST_MAX_RETRIES = int(os.getenv("BROADCAST_MAX_RETRIES", "3"))
+BROADCAST_API_BASE = os.getenv("BROADCAST_API_BASE")  # فاضى = TELEGRAM_API (أو fake server للتجربة)
+LAST_BROADCAST_REPORT: dict = {}
+
+# Persistent Outbound Queue (engine_outbox) — SQLite محلى، at-least-once
+OUTBOX_ENABLED = os.getenv("OUTBOX_ENABLED", "1") == "1"
+OUTBOX_DB = os.getenv("OUTBOX_DB", os.path.join(DATA_DIR, "outbox.sqlite3"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "64"))
+OUTBOX_FLUSH_MS = float(os.getenv("OUTBOX_FLUSH_MS", "20"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_RETENTION_SECONDS = float(os.getenv("OUTBOX_RETENTION_SECONDS", "86400"))
+OUTBOX = None  # engine_outbox.Outbox (بيتعمل فى start_background_threads)
+
+# Shared State (engine_shared_state) — أكتر من gunicorn worker (WEB_CONCURRENCY > 1)
+# local  = الحالة جوه الـ process (worker واحد — السلوك القديم)
+# sqlite = KV مشترك (على /dev/shm لو موجود) + leader واحد للـ background threads
+STATE_BACKEND = os.getenv("STATE_BACKEND", "sqlite" if int(os.getenv("WEB_CONCURRENCY", "1")) > 1 else "local")
+STATE_DB = os.getenv(
+    "STATE_DB",
+    "/dev/shm/incrypto_state.sqlite3" if os.path.isdir("/dev/shm") else os.path.join(DATA_DIR, "state.sqlite3"),
+)
+STATE_SYNC_INTERVAL_SECONDS = float(os.getenv("STATE_SYNC_INTERVAL_SECONDS", "1"))
+STATE_LEASE_TTL_SECONDS = float(os.getenv("STATE_LEASE_TTL_SECONDS", "15"))
+SHARED_STATE = None  # engine_shared_state.SharedState
+
+
+def share_fields(*names: str) -> None:
+    """حالة اتغيرت فى request handler (EXTRA_ADMINS / LAST_ALERT_REASON ...) → باقى الـ workers."""
+    state = SHARED_STATE
+    if state is None:
+        return
+    try:
+        state.set_fields(*names)
+    except Exception as e:
+        logger.exception("Shared state: failed to share %s: %s", names, e)
+
+
+def share_append(name: str, item=None, clear: bool = False) -> None:
+    """إضافة على deque مشترك (ALERTS_HISTORY) أو مسحه → باقى الـ workers."""
+    state = SHARED_STATE
+    if state is None:
+        return
+    try:
+        state.append(name, item, clear=clear)
+    except Exception as e:
+        logger.exception("Shared state: failed to append to %s: %s", name, e)
 
 API_STATUS: dict = {
     "binance_ok": True,
@@ -413,6 +647,77 @@ DEFAULT_RESPONSE_TTL: float = 10.0  # ثوانى
 #  Telegram Helpers (+ Silent Alert)
 # ==============================
 
+def _post_send_message(payload: dict, label: str = "sendMessage"):
+    """
+    الإرسال الفعلى: Outbox لو شغال (enqueue ميكروثوانى والتسليم مضمون من ثريد الـ outbox)
+    غير كده (مقفول / مابدأش / الثريد وقف) POST مباشر — مفيش رسالة بتتحط فى deque محدش بيفضّيه.
+    """
+    box = OUTBOX
+    if box is not None and box.is_running():
+        box.enqueue(payload)
+        return
+
+    r = HTTP_SESSION.post(f"{TELEGRAM_API}/sendMessage", json=payload, timeout=10)
+    if r.status_code != 200:
+        logger.warning(
+            "Telegram %s error: %s - %s",
+            label,
+            r.status_code,
+            r.text,
+        )
+
+
+# ==============================
+#  Reply-in-webhook-response (Fast Path)
+# ==============================
+# Telegram بيسمح إن الـ response بتاع الـ webhook يبقى هو نفسه method call
+# {"method": "sendMessage", ...} → رد واحد قصير = مفيش HTTPS request تانى.
+# - أول sendMessage (رسالة واحدة ≤ TELEGRAM_MAX_CHARS) بيتمسك بدل ما يتبعت
+# - لو الـ handler بعت رسالة تانية (رد مقسوم / أكتر من رسالة) → الممسوكة
+#   بتتبعت عادى الأول (نفس الترتيب) والباقى كله بالمسار العادى
+
+_REPLY_CAPTURE = threading.local()
+
+
+def begin_reply_capture():
+    _REPLY_CAPTURE.slot = {"payload": None, "closed": False}
+
+
+def end_reply_capture(send: bool = False):
+    """
+    ترجع الـ payload الممسوك (أو None) وتقفل الـ capture.
+    send=True → تبعته بالمسار العادى (مثلاً لو الـ handler وقع).
+    """
+    slot = getattr(_REPLY_CAPTURE, "slot", None)
+    _REPLY_CAPTURE.slot = None
+    payload = slot["payload"] if slot else None
+    if payload is not None and send:
+        try:
+            _post_send_message(payload)
+        except Exception as e:
+            logger.exception("Exception while sending captured reply: %s", e)
+        return None
+    return payload
+
+
+def _capture_reply(payload: dict) -> bool:
+    slot = getattr(_REPLY_CAPTURE, "slot", None)
+    if slot is None or slot["closed"]:
+        return False
+
+    if slot["payload"] is None and len(payload.get("text") or "") <= TELEGRAM_MAX_CHARS:
+        slot["payload"] = payload
+        return True
+
+    # رسالة تانية → نرجع للمسار العادى مع الحفاظ على الترتيب
+    slot["closed"] = True
+    prev = slot["payload"]
+    slot["payload"] = None
+    if prev is not None:
+        _post_send_message(prev)
+    return False
+
+
 def send_message(
     chat_id: int,
     text: str,
@@ -421,7 +726,6 @@ def send_message(
 ):
     """إرسال رسالة عادية مع خيار الإشعار الصامت."""
     try:
-        url = f"{TELEGRAM_API}/sendMessage"
         payload: dict = {
             "chat_id": chat_id,
             "text": text,
@@ -430,13 +734,11 @@ def send_message(
         if silent:
             payload["disable_notification"] = True
 
-        r = HTTP_SESSION.post(url, json=payload, timeout=10)
-        if r.status_code != 200:
-            logger.warning(
-                "Telegram sendMessage error: %s - %s",
-                r.status_code,
-                r.text,
-            )
+        # جوه الـ webhook → أول رد بيرجع فى الـ response نفسه (من غير request تانى)
+        if _capture_reply(payload):
+            return
+
+        _post_send_message(payload, "sendMessage")
     except Exception as e:
         logger.exception("Exception while sending message: %s", e)
 
@@ -450,7 +752,6 @@ def send_message_with_keyboard(
 ):
     """إرسال رسالة مع كيبورد إنلاين."""
     try:
-        url = f"{TELEGRAM_API}/sendMessage"
         payload: dict = {
             "chat_id": chat_id,
             "text": text,
@@ -460,13 +761,10 @@ def send_message_with_keyboard(
         if silent:
             payload["disable_notification"] = True
 
-        r = HTTP_SESSION.post(url, json=payload, timeout=10)
-        if r.status_code != 200:
-            logger.warning(
-                "Telegram sendMessage_with_keyboard error: %s - %s",
-                r.status_code,
-                r.text,
-            )
+        if _capture_reply(payload):
+            return
+
+        _post_send_message(payload, "sendMessage_with_keyboard")
     except Exception as e:
         logger.exception("Exception while sending message with keyboard: %s", e)
 
@@ -595,6 +893,13 @@ THREADS_STARTED = False
 # ملف السناك شوت (اختيارى)
 SNAPSHOT_FILE = os.getenv("SNAPSHOT_FILE")  # لو فاضى هيتجهل
 
+# Warm-start checkpoint (JSON + zlib) — pulse / indicators / cooldowns
+# ملف منفصل عن SNAPSHOT_FILE (الـ legacy JSON بيفضل زى ما هو للـ builds القديمة)
+CHECKPOINT_FILE = os.getenv("CHECKPOINT_FILE", os.path.join(DATA_DIR, "warm_start.ckpt"))
+CHECKPOINT_INTERVAL_SECONDS = float(os.getenv("CHECKPOINT_INTERVAL_SECONDS", "60"))
+CHECKPOINT_MAX_AGE_SECONDS = float(os.getenv("CHECKPOINT_MAX_AGE_SECONDS", "3600"))
+CHECKPOINT_TO_PG = os.getenv("CHECKPOINT_TO_PG", "1") == "1"  # نسخة فى الـ DB لو get_db() متاحة
+
 # توكن البوت (نفس TELEGRAM_TOKEN أو متغير منفصل لو حبيت)
 BOT_TOKEN = os.getenv("BOT_TOKEN") or TELEGRAM_TOKEN
 
@@ -0,0 +1,340 @@
+"""
+engine_alert_store.py
+
+✅ Alert History Store (Durable Time-Series):
+- كل تحذير (smart_auto / auto / force / broadcast_ultra ...) بيتسجل append-only
+  فى جدول alert_events مع index على الوقت (ts) و (source, ts) و (level, ts)
+- Downsampling: عدّاد لكل ساعة (alert_rollup_hourly) بيتحدث مع كل insert
+  → إحصائيات سنين بتتقرا من صفوف قليلة (resolution=hour / day)
+- Retention:
+    * الأحداث الخام: ALERT_STORE_RAW_RETENTION_DAYS
+    * الـ rollups:   ALERT_STORE_ROLLUP_RETENTION_DAYS
+- Query: since / until / level / source + keyset pagination (before=id)
+  → تكلفة القراية ثابتة مهما كان حجم الجدول
+- الـ backend: config.get_db() (PostgreSQL / SQLite) — ولو مفيش، SQLite محلى (ALERT_STORE_DB)
+- ALERTS_HISTORY / ALERT_HISTORY (deques) فضلوا زى ما هم كـ hot cache
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import config
+
+
+def _iso(ts: float) -> str:
+    return datetime.utcfromtimestamp(ts).isoformat(timespec="seconds")
+
+
+def parse_ts(value: Any) -> Optional[float]:
+    """epoch (ثوانى) أو ISO (2024-01-31 / 2024-01-31T12:00:00) → epoch UTC."""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+class AlertStore:
+    def __init__(
+        self,
+        db,
+        raw_retention_days: float = 180.0,
+        rollup_retention_days: float = 3650.0,
+    ) -> None:
+        self.db = db
+        self.raw_retention_s = float(raw_retention_days) * 86400.0
+        self.rollup_retention_s = float(rollup_retention_days) * 86400.0
+        self._ready = False
+        self._ready_lock = threading.Lock()
+        self._last_maintenance = 0.0
+        self._max = "GREATEST" if db.backend == "postgres" else "MAX"
+        self._min = "LEAST" if db.backend == "postgres" else "MIN"
+
+    # ---------- Schema ----------
+    def ensure_schema(self) -> None:
+        if self._ready:
+            return
+        with self._ready_lock:
+            if self._ready:
+                return
+            pk = "BIGSERIAL PRIMARY KEY" if self.db.backend == "postgres" else "INTEGER PRIMARY KEY AUTOINCREMENT"
+            self.db.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS alert_events (
+                    id {pk},
+                    ts DOUBLE PRECISION NOT NULL,
+                    source TEXT NOT NULL,
+                    level TEXT,
+                    reason TEXT,
+                    price DOUBLE PRECISION,
+                    change_pct DOUBLE PRECISION,
+                    shock_score DOUBLE PRECISION,
+                    immediate SMALLINT NOT NULL DEFAULT 0,
+                    extra TEXT
+                )
+                """
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS idx_alert_events_ts ON alert_events (ts)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS idx_alert_events_source_ts ON alert_events (source, ts)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS idx_alert_events_level_ts ON alert_events (level, ts)")
+            self.db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS alert_rollup_hourly (
+                    bucket BIGINT NOT NULL,
+                    source TEXT NOT NULL,
+                    level TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    min_price DOUBLE PRECISION,
+                    max_price DOUBLE PRECISION,
+                    max_shock DOUBLE PRECISION,
+                    PRIMARY KEY (bucket, source, level)
+                )
+                """
+            )
+            self._ready = True
+
+    # ---------- Write ----------
+    def append(
+        self,
+        source: str,
+        reason: Optional[str] = None,
+        level: Optional[str] = None,
+        price: Optional[float] = None,
+        change_pct: Optional[float] = None,
+        shock_score: Optional[float] = None,
+        immediate: bool = False,
+        extra: Optional[Dict[str, Any]] = None,
+        ts: Optional[float] = None,
+    ) -> None:
+        self.ensure_schema()
+        ts = float(ts if ts is not None else time.time())
+        level_key = str(level) if level else ""
+        price = float(price) if price is not None else None
+        shock = float(shock_score) if shock_score is not None else None
+
+        with self.db.connection():
+            self.db.execute(
+                """
+                INSERT INTO alert_events
+                    (ts, source, level, reason, price, change_pct, shock_score, immediate, extra)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """,
+                (
+                    ts,
+                    source,
+                    level_key or None,
+                    reason,
+                    price,
+                    float(change_pct) if change_pct is not None else None,
+                    shock,
+                    1 if immediate else 0,
+                    json.dumps(extra, ensure_ascii=False) if extra else None,
+                ),
+            )
+            # MIN/MAX بتاعة SQLite بترجع NULL لو أى argument NULL (LEAST/GREATEST بيتجاهلوه)
+            # → COALESCE على القيمتين: تحذير من غير سعر مايمسحش min/max الساعة
+            self.db.execute(
+                f"""
+                INSERT INTO alert_rollup_hourly
+                    (bucket, source, level, count, min_price, max_price, max_shock)
+                VALUES (%s, %s, %s, 1, %s, %s, %s)
+                ON CONFLICT (bucket, source, level) DO UPDATE SET
+                    count = alert_rollup_hourly.count + 1,
+                    min_price = COALESCE({self._min}(alert_rollup_hourly.min_price, EXCLUDED.min_price), alert_rollup_hourly.min_price, EXCLUDED.min_price),
+                    max_price = COALESCE({self._max}(alert_rollup_hourly.max_price, EXCLUDED.max_price), alert_rollup_hourly.max_price, EXCLUDED.max_price),
+                    max_shock = COALESCE({self._max}(alert_rollup_hourly.max_shock, EXCLUDED.max_shock), alert_rollup_hourly.max_shock, EXCLUDED.max_shock)
+                """,
+                (int(ts // 3600), source, level_key, price, price, shock),
+            )
+
+        self.maybe_maintain()
+
+    # ---------- Read ----------
+    def query(
+        self,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        level: Optional[str] = None,
+        source: Optional[str] = None,
+        limit: int = 100,
+        before: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        الأحدث الأول بالـ index + keyset (before=id) → نرجّع الصفحة بترتيب زمنى.
+        """
+        self.ensure_schema()
+        limit = max(1, min(int(limit), 1000))
+        where, params = self._filters(since, until, level, source)
+        if before is not None:
+            where.append("id < %s")
+            params.append(int(before))
+
+        sql = (
+            "SELECT id, ts, source, level, reason, price, change_pct, shock_score, immediate "
+            "FROM alert_events"
+            + (" WHERE " + " AND ".join(where) if where else "")
+            + " ORDER BY ts DESC, id DESC LIMIT %s"
+        )
+        rows = self.db.fetchall(sql, tuple(params) + (limit + 1,))
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        items = [
+            {
+                "id": r[0],
+                "ts": r[1],
+                "time": _iso(r[1]),
+                "source": r[2],
+                "level": r[3],
+                "reason": r[4],
+                "price": r[5],
+                "change_pct": r[6],
+                "shock_score": r[7],
+                "immediate": bool(r[8]),
+            }
+            for r in rows
+        ]
+        items.reverse()
+        return {
+            "alerts": items,
+            "count": len(items),
+            "next_before": rows[-1][0] if has_more and rows else None,
+        }
+
+    def rollup(
+        self,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        level: Optional[str] = None,
+        source: Optional[str] = None,
+        resolution: str = "hour",
+        limit: int = 500,
+    ) -> Dict[str, Any]:
+        """عدد التحذيرات لكل ساعة/يوم من الـ rollups (من غير ما نلمس الأحداث الخام)."""
+        self.ensure_schema()
+        limit = max(1, min(int(limit), 5000))
+        step = 24 if resolution == "day" else 1
+        where: List[str] = []
+        params: List[Any] = []
+        if since is not None:
+            where.append("bucket >= %s")
+            params.append(int(since // 3600))
+        if until is not None:
+            where.append("bucket <= %s")
+            params.append(int(until // 3600))
+        if level:
+            where.append("level = %s")
+            params.append(level)
+        if source:
+            where.append("source = %s")
+            params.append(source)
+
+        bucket_expr = f"(bucket / {step}) * {step}" if step > 1 else "bucket"
+        sql = (
+            f"SELECT {bucket_expr} AS b, SUM(count), MIN(min_price), MAX(max_price), MAX(max_shock) "
+            "FROM alert_rollup_hourly"
+            + (" WHERE " + " AND ".join(where) if where else "")
+            + " GROUP BY b ORDER BY b DESC LIMIT %s"
+        )
+        rows = self.db.fetchall(sql, tuple(params) + (limit,))
+        series = [
+            {
+                "time": _iso(int(r[0]) * 3600),
+                "count": int(r[1] or 0),
+                "min_price": r[2],
+                "max_price": r[3],
+                "max_shock": r[4],
+            }
+            for r in reversed(rows)
+        ]
+        return {"resolution": "day" if step > 1 else "hour", "series": series}
+
+    @staticmethod
+    def _filters(since, until, level, source):
+        where: List[str] = []
+        params: List[Any] = []
+        if since is not None:
+            where.append("ts >= %s")
+            params.append(float(since))
+        if until is not None:
+            where.append("ts <= %s")
+            params.append(float(until))
+        if level:
+            where.append("level = %s")
+            params.append(level)
+        if source:
+            where.append("source = %s")
+            params.append(source)
+        return where, params
+
+    # ---------- Retention ----------
+    def maybe_maintain(self, force: bool = False) -> None:
+        now = time.time()
+        if not force and now - self._last_maintenance < 3600:
+            return
+        self._last_maintenance = now
+        self.db.execute("DELETE FROM alert_events WHERE ts < %s", (now - self.raw_retention_s,))
+        self.db.execute(
+            "DELETE FROM alert_rollup_hourly WHERE bucket < %s",
+            (int((now - self.rollup_retention_s) // 3600),),
+        )
+
+    def clear_events(self) -> None:
+        """مسح الأحداث الخام بس — الـ rollups (الإحصائيات التاريخية) بتفضل."""
+        self.ensure_schema()
+        self.db.execute("DELETE FROM alert_events")
+
+
+# ==============================
+#   Shared instance (config)
+# ==============================
+
+_STORE: Optional[AlertStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_alert_store() -> Optional[AlertStore]:
+    global _STORE
+    if _STORE is not None:
+        return _STORE
+    if not getattr(config, "ALERT_STORE_ENABLED", True):
+        return None
+    with _STORE_LOCK:
+        if _STORE is None:
+            db = config.get_db()
+            if db is None:
+                path = getattr(config, "ALERT_STORE_DB", None)
+                if not path:
+                    return None
+                from engine_db import SQLiteDatabase
+
+                db = SQLiteDatabase(path, logger=config.logger)
+            _STORE = AlertStore(
+                db,
+                raw_retention_days=float(getattr(config, "ALERT_STORE_RAW_RETENTION_DAYS", 180)),
+                rollup_retention_days=float(getattr(config, "ALERT_STORE_ROLLUP_RETENTION_DAYS", 3650)),
+            )
+    return _STORE
+
+
+def record_alert(source: str, reason: Optional[str] = None, **fields: Any) -> None:
+    """نقطة الكتابة الوحيدة — أى خطأ بيتسجل فى اللوج ومش بيوقف التحذير نفسه."""
+    try:
+        store = get_alert_store()
+        if store is not None:
+            store.append(source, reason, **fields)
+    except Exception as e:
+        config.logger.exception("Error recording alert in store: %s", e)
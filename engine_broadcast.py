@@ -0,0 +1,289 @@
+"""
+engine_broadcast.py
+
+✅ Broadcast Engine (Parallel + Rate-Limited):
+- Worker pool محدود (ThreadPoolExecutor) بدل loop blocking رسالة رسالة
+- Token buckets:
+    * Global   ~30 msg/s (حد Telegram للبوت)
+    * Per-chat  1 msg/s للشات الخاص — 20 msg/min للجروبات/القنوات (chat_id سالب)
+- 429 → نحترم parameters.retry_after (ونوقف الـ global bucket نفس المدة)
+- أخطاء مؤقتة (5xx / network) → retry مع backoff
+- أخطاء نهائية (403 blocked / 400 chat not found) → من غير retry
+- تقرير لكل broadcast: sent / failed / retries / rate_limited / duration / throughput
+
+الـ api_base قابل للتغيير → ينفع يتجرب على fake Telegram server محلى:
+    python engine_broadcast.py --fake 2000
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# ==============================
+#   Token Bucket
+# ==============================
+
+class TokenBucket:
+    """
+    Bucket بنظام الحجز: كل acquire بياخد token (ممكن الرصيد يبقى سالب)
+    وبينام المدة اللازمة برا الـ lock → العدالة بين الـ threads بترتيب الحجز.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.ts = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.ts) * self.rate)
+            self.ts = now
+            self.tokens -= 1.0
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.blocked_until - now)
+
+    def acquire(self) -> float:
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def pause(self, seconds: float) -> None:
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + float(seconds))
+
+
+# ==============================
+#   Engine
+# ==============================
+
+class BroadcastEngine:
+    def __init__(
+        self,
+        api_base: str,
+        workers: int = 16,
+        global_rate: float = 30.0,
+        private_rate: float = 1.0,
+        group_rate: float = 20.0 / 60.0,
+        max_retries: int = 3,
+        timeout: float = 10.0,
+        logger=None,
+    ) -> None:
+        self.api_base = api_base.rstrip("/")
+        self.workers = max(1, int(workers))
+        # capacity صغيرة → pacing منتظم بدل burst أول ثانية
+        self.global_bucket = TokenBucket(global_rate, capacity=1.0)
+        self.private_rate = float(private_rate)
+        self.group_rate = float(group_rate)
+        self.max_retries = int(max_retries)
+        self.timeout = float(timeout)
+        self.logger = logger
+
+        self._chat_buckets: Dict[Any, TokenBucket] = {}
+        self._chat_lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _chat_bucket(self, chat_id: Any) -> TokenBucket:
+        with self._chat_lock:
+            b = self._chat_buckets.get(chat_id)
+            if b is None:
+                is_group = isinstance(chat_id, int) and chat_id < 0
+                b = TokenBucket(self.group_rate if is_group else self.private_rate, capacity=1.0)
+                self._chat_buckets[chat_id] = b
+            return b
+
+    # ---------- Single message ----------
+    def send_one(self, payload: Dict[str, Any], stats: Dict[str, Any]) -> bool:
+        return self.deliver(payload, stats) == 200
+
+    def deliver(self, payload: Dict[str, Any], stats: Dict[str, Any]) -> Optional[int]:
+        """
+        نفس send_one لكن بترجع آخر status (200 = اتبعت، None = network error)
+        → الـ outbox بتفرّق بين فشل مؤقت (نعيد بعدين) ونهائى.
+        """
+        chat_id = payload.get("chat_id")
+        url = f"{self.api_base}/sendMessage"
+        attempt = 0
+
+        while True:
+            self._chat_bucket(chat_id).acquire()
+            self.global_bucket.acquire()
+
+            status = None
+            retry_after = None
+            try:
+                r = self.session.post(url, json=payload, timeout=self.timeout)
+                status = r.status_code
+                if status == 200:
+                    return status
+                if status == 429:
+                    try:
+                        retry_after = float((r.json().get("parameters") or {}).get("retry_after") or 1)
+                    except Exception:
+                        retry_after = 1.0
+            except Exception as e:
+                if self.logger:
+                    self.logger.debug("Broadcast network error for %s: %s", chat_id, e)
+
+            if status == 429:
+                # مش بيتحسب من max_retries — Telegram بيقول امتى نرجع
+                with stats["lock"]:
+                    stats["rate_limited"] += 1
+                self.global_bucket.pause(retry_after)
+                self._chat_bucket(chat_id).pause(retry_after)
+                continue
+
+            transient = status is None or status >= 500
+            if not transient or attempt >= self.max_retries:
+                if self.logger:
+                    self.logger.warning("Broadcast to %s failed (status=%s).", chat_id, status)
+                with stats["lock"]:
+                    if len(stats["failures"]) < 20:
+                        stats["failures"].append({"chat_id": chat_id, "status": status})
+                return status
+
+            attempt += 1
+            with stats["lock"]:
+                stats["retries"] += 1
+            time.sleep(min(8.0, 0.5 * (2 ** (attempt - 1))))
+
+    # ---------- Broadcast ----------
+    @staticmethod
+    def new_stats() -> Dict[str, Any]:
+        return {
+            "lock": threading.Lock(),
+            "retries": 0,
+            "rate_limited": 0,
+            "failures": [],
+        }
+
+    def broadcast(self, payloads: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        payloads = list(payloads)
+        stats = self.new_stats()
+        started = time.time()
+        last_delivery = [started]
+
+        def _job(p: Dict[str, Any]) -> bool:
+            ok = self.send_one(p, stats)
+            if ok:
+                with stats["lock"]:
+                    last_delivery[0] = max(last_delivery[0], time.time())
+            return ok
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="broadcast") as pool:
+            results: List[bool] = list(pool.map(_job, payloads))
+
+        duration = time.time() - started
+        sent = sum(1 for ok in results if ok)
+        return {
+            "total": len(payloads),
+            "sent": sent,
+            "failed": len(payloads) - sent,
+            "retries": stats["retries"],
+            "rate_limited": stats["rate_limited"],
+            "started_at": started,
+            "duration_s": round(duration, 3),
+            "last_delivery_s": round(last_delivery[0] - started, 3),
+            "throughput_msg_s": round(sent / duration, 2) if duration > 0 else 0.0,
+            "failures": stats["failures"],
+        }
+
+
+# ==============================
+#   Shared instance (config)
+# ==============================
+
+_ENGINE: Optional[BroadcastEngine] = None
+_ENGINE_LOCK = threading.Lock()
+
+
+def get_broadcast_engine() -> BroadcastEngine:
+    global _ENGINE
+    if _ENGINE is None:
+        with _ENGINE_LOCK:
+            if _ENGINE is None:
+                import config
+
+                _ENGINE = BroadcastEngine(
+                    api_base=getattr(config, "BROADCAST_API_BASE", None) or config.TELEGRAM_API,
+                    workers=int(getattr(config, "BROADCAST_WORKERS", 16)),
+                    global_rate=float(getattr(config, "BROADCAST_GLOBAL_RATE", 30.0)),
+                    max_retries=int(getattr(config, "BROADCAST_MAX_RETRIES", 3)),
+                    logger=config.logger,
+                )
+    return _ENGINE
+
+
+# ==============================
+#   Fake Telegram server (تجربة محلية)
+# ==============================
+
+def _run_fake_server(rate_limit_every: int = 0):
+    import json
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    counter = {"n": 0}
+    lock = threading.Lock()
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            self.rfile.read(length)
+            with lock:
+                counter["n"] += 1
+                n = counter["n"]
+            time.sleep(0.05)  # latency تقريبية لـ Telegram
+            if rate_limit_every and n % rate_limit_every == 0:
+                body = {"ok": False, "error_code": 429, "parameters": {"retry_after": 1}}
+                code = 429
+            else:
+                body = {"ok": True, "result": {}}
+                code = 200
+            data = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, counter
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Broadcast engine against a local fake Telegram server")
+    parser.add_argument("--fake", type=int, default=300, help="number of chats")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--rate", type=float, default=30.0)
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="return 429 every N requests")
+    args = parser.parse_args()
+
+    server, counter = _run_fake_server(args.rate_limit_every)
+    base = f"http://127.0.0.1:{server.server_address[1]}/botFAKE"
+    engine = BroadcastEngine(base, workers=args.workers, global_rate=args.rate)
+    report = engine.broadcast({"chat_id": 1000 + i, "text": "test"} for i in range(args.fake))
+    report["server_requests"] = counter["n"]
+    print(json.dumps(report, indent=2))
+    server.shutdown()
@@ -0,0 +1,210 @@
+"""
+engine_candle_patterns.py
+
+✅ Candle Pattern Kernel:
+- أعمدة body / range / wicks / direction بتتحسب مرة واحدة للسلسلة كلها
+- كل نموذج = mask (list[bool]) على طول السلسلة
+- نفس الـ labels بالظبط بتاعة:
+    * analysis_engine.detect_candle_patterns_for_tf   (V14)
+    * analysis_engine._detect_candle_patterns_simple  (V12)
+- ينفع لآخر شمعة (Live) أو لمسح تاريخ بأى طول (Backtest)
+
+mask[i] = True يعنى النموذج متحقق لو الشمعة i هى "آخر شمعة".
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Sequence, Tuple
+
+
+# ==============================
+#   Columns
+# ==============================
+
+def candle_columns(candles: Sequence[Dict[str, Any]]) -> Dict[str, List]:
+    o = [float(c["open"]) for c in candles]
+    h = [float(c["high"]) for c in candles]
+    l = [float(c["low"]) for c in candles]
+    cl = [float(c["close"]) for c in candles]
+
+    body = [abs(c - op) for op, c in zip(o, cl)]
+    rng = [hi - lo for hi, lo in zip(h, l)]
+    upper = [hi - (op if op > c else c) for hi, op, c in zip(h, o, cl)]
+    lower = [(op if op < c else c) - lo for lo, op, c in zip(l, o, cl)]
+    bull = [c > op for op, c in zip(o, cl)]
+    bear = [c < op for op, c in zip(o, cl)]
+
+    return {
+        "open": o,
+        "high": h,
+        "low": l,
+        "close": cl,
+        "body": body,
+        "range": rng,
+        "upper": upper,
+        "lower": lower,
+        "bull": bull,
+        "bear": bear,
+    }
+
+
+def _shift(values: List, k: int, fill) -> List:
+    """values[i - k] عند i (و fill لأول k عنصر)"""
+    if k <= 0:
+        return list(values)
+    return [fill] * min(k, len(values)) + values[: max(0, len(values) - k)]
+
+
+# ==============================
+#   V14 masks (detect_candle_patterns_for_tf)
+# ==============================
+
+V14_LABELS = (
+    "شمعة Pin Bar علوية (رفض أسعار أعلى)",
+    "شمعة Pin Bar سفلية (رفض أسعار أدنى)",
+    "نموذج ابتلاع شرائى (Bullish Engulfing)",
+    "نموذج ابتلاع بيعى (Bearish Engulfing)",
+    "نموذج Inside Bar (تجميع حركة داخل شمعة سابقة)",
+    "شمعة Marubozu صاعدة قوية (هيمنة مشترين)",
+    "شمعة Marubozu هابطة قوية (هيمنة بائعين)",
+    "سلوك شموع متتالية صاعدة (زخم قصير المدى لأعلى)",
+    "سلوك شموع متتالية هابطة (زخم قصير المدى لأسفل)",
+)
+
+
+def v14_pattern_masks(cols: Dict[str, List]) -> List[Tuple[str, List[bool]]]:
+    n = len(cols["close"])
+    o, h, l, c = cols["open"], cols["high"], cols["low"], cols["close"]
+    body, upper, lower = cols["body"], cols["upper"], cols["lower"]
+    bull, bear = cols["bull"], cols["bear"]
+
+    rng = [r or 1e-6 for r in cols["range"]]
+    valid = [i >= 2 for i in range(n)]
+
+    p_o = _shift(o, 1, 0.0)
+    p_h = _shift(h, 1, 0.0)
+    p_l = _shift(l, 1, 0.0)
+    p_c = _shift(c, 1, 0.0)
+    p_bull = _shift(bull, 1, False)
+    p_bear = _shift(bear, 1, False)
+
+    dir_ = [(1 if b else -1 if s else 0) for b, s in zip(bull, bear)]
+    dir_sum = [a + b + d for a, b, d in zip(dir_, _shift(dir_, 1, 0), _shift(dir_, 2, 0))]
+
+    pin_up = [v and uw >= 2 * bd and uw >= 0.6 * r for v, uw, bd, r in zip(valid, upper, body, rng)]
+    pin_dn = [v and lw >= 2 * bd and lw >= 0.6 * r for v, lw, bd, r in zip(valid, lower, body, rng)]
+
+    eng_bull = [
+        v and b and pb and cc >= po and oo <= pc
+        for v, b, pb, cc, oo, po, pc in zip(valid, bull, p_bear, c, o, p_o, p_c)
+    ]
+    eng_bear = [
+        v and s and pbl and cc <= po and oo >= pc
+        for v, s, pbl, cc, oo, po, pc in zip(valid, bear, p_bull, c, o, p_o, p_c)
+    ]
+
+    inside = [v and hh <= ph and ll >= pl for v, hh, ll, ph, pl in zip(valid, h, l, p_h, p_l)]
+
+    marubozu = [v and bd >= 0.8 * r for v, bd, r in zip(valid, body, rng)]
+    maru_bull = [m and b for m, b in zip(marubozu, bull)]
+    maru_bear = [m and (not b) and s for m, b, s in zip(marubozu, bull, bear)]
+
+    streak_up = [v and d >= 2 for v, d in zip(valid, dir_sum)]
+    streak_dn = [v and d <= -2 for v, d in zip(valid, dir_sum)]
+
+    masks = (pin_up, pin_dn, eng_bull, eng_bear, inside, maru_bull, maru_bear, streak_up, streak_dn)
+    return list(zip(V14_LABELS, masks))
+
+
+# ==============================
+#   Simple masks (_detect_candle_patterns_simple)
+# ==============================
+
+SIMPLE_LABELS = (
+    "ابتلاع شرائى (Bullish Engulfing)",
+    "ابتلاع بيعى (Bearish Engulfing)",
+    "شمعة بن بار صاعدة (Bullish Pin Bar)",
+    "شمعة بن بار هابطة (Bearish Pin Bar)",
+    "شمعة داخلية (Inside Bar)",
+)
+
+
+def simple_pattern_masks(cols: Dict[str, List]) -> List[Tuple[str, List[bool]]]:
+    n = len(cols["close"])
+    o, h, l, c = cols["open"], cols["high"], cols["low"], cols["close"]
+    body, upper, lower = cols["body"], cols["upper"], cols["lower"]
+
+    valid = [i >= 2 for i in range(n)]
+
+    p_o = _shift(o, 1, 0.0)
+    p_h = _shift(h, 1, 0.0)
+    p_l = _shift(l, 1, 0.0)
+    p_c = _shift(c, 1, 0.0)
+    p_body = _shift(body, 1, 0.0)
+
+    eng_bull = [
+        v and pc < po and cc > oo and bd > pb * 1.1 and oo <= pc and cc >= po
+        for v, pc, po, cc, oo, bd, pb in zip(valid, p_c, p_o, c, o, body, p_body)
+    ]
+    eng_bear = [
+        v and pc > po and cc < oo and bd > pb * 1.1 and oo >= pc and cc <= po
+        for v, pc, po, cc, oo, bd, pb in zip(valid, p_c, p_o, c, o, body, p_body)
+    ]
+
+    pin_bull = [
+        v and lw > bd * 2 and uw < bd and cc > oo
+        for v, lw, uw, bd, cc, oo in zip(valid, lower, upper, body, c, o)
+    ]
+    pin_bear = [
+        v and uw > bd * 2 and lw < bd and cc < oo
+        for v, lw, uw, bd, cc, oo in zip(valid, lower, upper, body, c, o)
+    ]
+
+    inside = [v and hh < ph and ll > pl for v, hh, ll, ph, pl in zip(valid, h, l, p_h, p_l)]
+
+    masks = (eng_bull, eng_bear, pin_bull, pin_bear, inside)
+    return list(zip(SIMPLE_LABELS, masks))
+
+
+# ==============================
+#   Public API
+# ==============================
+
+_KINDS = {
+    "v14": v14_pattern_masks,
+    "simple": simple_pattern_masks,
+}
+
+
+def pattern_masks(candles: Sequence[Dict[str, Any]], kind: str = "v14") -> List[Tuple[str, List[bool]]]:
+    return _KINDS[kind](candle_columns(candles))
+
+
+def patterns_at(masks: List[Tuple[str, List[bool]]], index: int) -> List[str]:
+    return [label for label, m in masks if m[index]]
+
+
+def detect_last_patterns(candles: Sequence[Dict[str, Any]], kind: str = "v14") -> List[str]:
+    """
+    Labels لآخر شمعة — بنحسب على آخر 3 شموع بس (كل اللى النماذج محتاجاه).
+    """
+    if not candles or len(candles) < 3:
+        return []
+    tail = list(candles[-3:])
+    return patterns_at(pattern_masks(tail, kind), len(tail) - 1)
+
+
+def scan_candle_patterns(candles: Sequence[Dict[str, Any]], kind: str = "v14") -> List[Tuple[int, List[str]]]:
+    """
+    مسح تاريخ كامل: [(index, [labels...]), ...] للشموع اللى فيها نموذج واحد على الأقل.
+    """
+    masks = pattern_masks(candles, kind)
+    n = len(candles)
+    hits = [False] * n
+    for _, m in masks:
+        hits = [a or b for a, b in zip(hits, m)]
+    return [(i, patterns_at(masks, i)) for i in range(n) if hits[i]]
+
+
+def count_candle_patterns(candles: Sequence[Dict[str, Any]], kind: str = "v14") -> Dict[str, int]:
+    return {label: sum(m) for label, m in pattern_masks(candles, kind)}
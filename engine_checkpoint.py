@@ -0,0 +1,240 @@
+"""
+engine_checkpoint.py
+
+✅ Warm-start Checkpoint (JSON مضغوط):
+- PulseRing (pulse history + percentiles بتتبنى منه تلقائياً)
+- Indicator states (engine_indicators) → مفيش fetch لـ 300 شمعة بعد الريستارت
+- LAST_HARMONIC_ALERT (cooldowns) + LAST_SMART_ALERT_TS / LAST_CRITICAL_ALERT_TS
+- MARKET_METRICS_CACHE
+
+- الصيغة: JSON + zlib — أرقام و lists و dicts بس (مفيش pickle: الـ blob بيتقرا من
+  جدول DB مشترك، وpickle.loads عليه = تنفيذ كود لأى حد يقدر يكتب فى الجدول)
+- ملف خاص بيه (CHECKPOINT_FILE) — مش بيكتب فوق SNAPSHOT_FILE القديم (JSON legacy)
+- الكتابة atomic: ملف مؤقت + os.replace (مفيش checkpoint نصه مكتوب)
+- نسخة اختيارية فى الـ Database (config.get_db — PostgreSQL bytea / SQLite) علشان تعيش بعد الـ redeploy
+- الاستعادة بتتجاهل أى checkpoint أقدم من CHECKPOINT_MAX_AGE_SECONDS
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import config
+
+
+CHECKPOINT_VERSION = 2
+# v1 (pickle) كان "ICKP" — أى blob قديم بيتجاهل من غير ما يتفك
+_MAGIC = b"ICKJ"
+
+
+def checkpoint_path() -> Optional[str]:
+    return getattr(config, "CHECKPOINT_FILE", None) or None
+
+
+# ==============================
+#   Build / Apply
+# ==============================
+
+def build_checkpoint() -> Dict[str, Any]:
+    import analysis_engine
+    from engine_indicators import export_indicator_states
+    from engine_pulse_ring import get_pulse_ring
+
+    return {
+        "version": CHECKPOINT_VERSION,
+        "saved_at": time.time(),
+        "market_metrics_cache": dict(config.MARKET_METRICS_CACHE),
+        "pulse_ring": get_pulse_ring().to_dict(),
+        "indicators": export_indicator_states(),
+        "harmonic_alerts": {
+            key: {**val, "time": val["time"].isoformat()}
+            for key, val in analysis_engine.LAST_HARMONIC_ALERT.items()
+            if isinstance(val, dict) and isinstance(val.get("time"), datetime)
+        },
+        "last_smart_alert_ts": getattr(config, "LAST_SMART_ALERT_TS", 0.0) or 0.0,
+        "last_critical_alert_ts": getattr(config, "LAST_CRITICAL_ALERT_TS", 0.0) or 0.0,
+    }
+
+
+def apply_checkpoint(data: Dict[str, Any]) -> bool:
+    import analysis_engine
+    from engine_indicators import import_indicator_states
+    from engine_pulse_ring import PulseRing, get_pulse_ring
+
+    if not isinstance(data, dict) or data.get("version") != CHECKPOINT_VERSION:
+        config.logger.info("Checkpoint version mismatch, ignored.")
+        return False
+
+    age = time.time() - float(data.get("saved_at") or 0.0)
+    max_age = float(getattr(config, "CHECKPOINT_MAX_AGE_SECONDS", 3600))
+    if age > max_age:
+        config.logger.info("Checkpoint too old (%.0fs), ignored.", age)
+        return False
+
+    config.MARKET_METRICS_CACHE.update(data.get("market_metrics_cache") or {})
+
+    ring = data.get("pulse_ring")
+    if isinstance(ring, dict) and len(get_pulse_ring()) == 0:
+        config.PULSE_HISTORY = PulseRing.from_dict(ring)  # type: ignore[assignment]
+
+    n_ind = import_indicator_states(data.get("indicators") or [])
+
+    for key, val in (data.get("harmonic_alerts") or {}).items():
+        try:
+            val = {**val, "time": datetime.fromisoformat(val["time"])}
+        except (KeyError, TypeError, ValueError):
+            continue
+        analysis_engine.LAST_HARMONIC_ALERT.setdefault(key, val)
+
+    for attr, key in (
+        ("LAST_SMART_ALERT_TS", "last_smart_alert_ts"),
+        ("LAST_CRITICAL_ALERT_TS", "last_critical_alert_ts"),
+    ):
+        cur = getattr(config, attr, 0.0) or 0.0
+        setattr(config, attr, max(cur, float(data.get(key) or 0.0)))
+
+    config.logger.info(
+        "Checkpoint restored (age=%.0fs, pulse=%d, indicators=%d, harmonic=%d).",
+        age,
+        len(get_pulse_ring()),
+        n_ind,
+        len(analysis_engine.LAST_HARMONIC_ALERT),
+    )
+    return True
+
+
+# ==============================
+#   Encode / Decode
+# ==============================
+
+def encode_checkpoint(data: Dict[str, Any]) -> bytes:
+    raw = json.dumps(data, ensure_ascii=False, separators=(",", ":"), allow_nan=True)
+    return _MAGIC + zlib.compress(raw.encode("utf-8"), 6)
+
+
+def decode_checkpoint(blob: bytes) -> Optional[Dict[str, Any]]:
+    if not blob or not blob.startswith(_MAGIC):
+        return None
+    data = json.loads(zlib.decompress(blob[len(_MAGIC):]).decode("utf-8"))
+    return data if isinstance(data, dict) else None
+
+
+# ==============================
+#   Storage (file + DB اختيارى)
+# ==============================
+
+def _write_file(path: str, blob: bytes) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _pg_enabled() -> bool:
+    return bool(getattr(config, "CHECKPOINT_TO_PG", True)) and config.get_db() is not None
+
+
+def _ensure_pg_table(db) -> None:
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS bot_checkpoint (
+            name TEXT PRIMARY KEY,
+            saved_at DOUBLE PRECISION NOT NULL,
+            data BYTEA NOT NULL
+        )
+        """
+    )
+
+
+def _write_pg(blob: bytes, saved_at: float) -> None:
+    db = config.get_db()
+    if not db:
+        return
+    _ensure_pg_table(db)
+    db.execute(
+        """
+        INSERT INTO bot_checkpoint (name, saved_at, data) VALUES ('warm_start', %s, %s)
+        ON CONFLICT (name) DO UPDATE SET saved_at = EXCLUDED.saved_at, data = EXCLUDED.data
+        """,
+        (saved_at, blob),
+    )
+
+
+def _read_pg() -> Optional[bytes]:
+    db = config.get_db()
+    if not db:
+        return None
+    _ensure_pg_table(db)
+    row = db.fetchone("SELECT data FROM bot_checkpoint WHERE name = 'warm_start'")
+    return bytes(row[0]) if row else None
+
+
+def save_checkpoint() -> bool:
+    path = checkpoint_path()
+    if not path and not _pg_enabled():
+        return False
+    try:
+        data = build_checkpoint()
+        blob = encode_checkpoint(data)
+        if path:
+            _write_file(path, blob)
+        if _pg_enabled():
+            try:
+                _write_pg(blob, data["saved_at"])
+            except Exception as e:
+                config.logger.exception("Checkpoint DB write failed: %s", e)
+        config.logger.debug("Checkpoint saved (%d bytes).", len(blob))
+        return True
+    except Exception as e:
+        config.logger.exception("Error saving checkpoint: %s", e)
+        return False
+
+
+def load_checkpoint() -> bool:
+    """
+    الأحدث بين الملف والـ DB هو اللى بيتطبق.
+    """
+    candidates = []
+
+    path = checkpoint_path()
+    if path and os.path.exists(path):
+        try:
+            with open(path, "rb") as f:
+                data = decode_checkpoint(f.read())
+            if data:
+                candidates.append(data)
+        except Exception as e:
+            config.logger.exception("Error reading checkpoint file %s: %s", path, e)
+
+    if _pg_enabled():
+        try:
+            data = decode_checkpoint(_read_pg() or b"")
+            if data:
+                candidates.append(data)
+        except Exception as e:
+            config.logger.exception("Error reading checkpoint from DB: %s", e)
+
+    if not candidates:
+        return False
+
+    best = max(candidates, key=lambda d: float(d.get("saved_at") or 0.0))
+    try:
+        return apply_checkpoint(best)
+    except Exception as e:
+        config.logger.exception("Error applying checkpoint: %s", e)
+        return False
+
+
+def checkpoint_loop() -> None:
+    interval = float(getattr(config, "CHECKPOINT_INTERVAL_SECONDS", 60))
+    config.logger.info("Checkpoint loop started (every %.0fs).", interval)
+    while True:
+        time.sleep(interval)
+        save_checkpoint()
@@ -0,0 +1,372 @@
+"""
+engine_db.py
+
+✅ Database Access Layer (Pooled + Thread-safe):
+- PostgresDatabase: ThreadedConnectionPool — كل thread بياخد connection خاص بيه (checkout)
+  ويرجعه بعد الـ statement (أو بعد الـ with db.connection() لو nested)
+- Health check: أى connection فاضى أكتر من healthcheck_idle ثانية بيتعمله SELECT 1 قبل الاستخدام
+- Reconnect تلقائى: OperationalError / InterfaceError → الـ connection بيترمى والـ statement
+  بيتعاد مرة واحدة على connection جديد
+- SQLiteDatabase: نفس الـ interface بالظبط (للتشغيل المحلى / التجارب)
+  * placeholders بنفس أسلوب psycopg2 (%s) وبتتحول لـ ? تلقائياً
+  * insert_many بيفهم "VALUES %s" زى execute_values
+- Metrics لكل statement: count / avg_ms / max_ms / errors + checkouts / reconnects
+
+الاستخدام (من config):
+    db = config.get_db()          # None لو مفيش DB متضبطة
+    db.execute("CREATE TABLE IF NOT EXISTS ...")
+    rows = db.fetchall("SELECT chat_id FROM known_chats")
+    db.insert_many("INSERT INTO known_chats(chat_id) VALUES %s ON CONFLICT DO NOTHING", [(1,), (2,)])
+"""
+
+from __future__ import annotations
+
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+
+def _statement_label(sql: str) -> str:
+    return " ".join(sql.split())[:80]
+
+
+# ==============================
+#   Base (metrics + retry)
+# ==============================
+
+class _BaseDatabase:
+    backend = "base"
+    _reconnect_errors: tuple = ()
+
+    def __init__(self, logger=None) -> None:
+        self.logger = logger
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._statements: Dict[str, Dict[str, float]] = {}
+        self.checkouts = 0
+        self.reconnects = 0
+        self.errors = 0
+
+    # ---------- Connection (يتعمل override) ----------
+    def _acquire(self):
+        raise NotImplementedError
+
+    def _release(self, conn, broken: bool = False) -> None:
+        raise NotImplementedError
+
+    def _exec(self, conn, sql: str, params: Any, mode: str):
+        raise NotImplementedError
+
+    @contextmanager
+    def connection(self):
+        """
+        Checkout لكل thread — nested calls فى نفس الـ thread بتاخد نفس الـ connection.
+        """
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            self._local.depth += 1
+            try:
+                yield held
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn = self._acquire()
+        self._local.conn = conn
+        self._local.depth = 1
+        broken = False
+        with self._stats_lock:
+            self.checkouts += 1
+        try:
+            yield conn
+        except self._reconnect_errors:
+            broken = True
+            raise
+        finally:
+            self._local.conn = None
+            self._local.depth = 0
+            self._release(conn, broken=broken)
+
+    # ---------- Statements ----------
+    def _record(self, sql: str, ms: float, ok: bool) -> None:
+        label = _statement_label(sql)
+        with self._stats_lock:
+            st = self._statements.get(label)
+            if st is None:
+                st = {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "errors": 0}
+                self._statements[label] = st
+            st["count"] += 1
+            st["total_ms"] += ms
+            if ms > st["max_ms"]:
+                st["max_ms"] = ms
+            if not ok:
+                st["errors"] += 1
+                self.errors += 1
+
+    def _run(self, sql: str, params: Any, mode: str):
+        nested = getattr(self._local, "conn", None) is not None
+        for attempt in (0, 1):
+            started = time.perf_counter()
+            try:
+                with self.connection() as conn:
+                    result = self._exec(conn, sql, params, mode)
+                self._record(sql, (time.perf_counter() - started) * 1000.0, True)
+                return result
+            except self._reconnect_errors as e:
+                self._record(sql, (time.perf_counter() - started) * 1000.0, False)
+                # جوه connection() خارجى مينفعش نبدّل الـ connection من تحت الـ caller
+                if attempt or nested:
+                    raise
+                with self._stats_lock:
+                    self.reconnects += 1
+                if self.logger:
+                    self.logger.warning("DB connection lost (%s), reconnecting.", e)
+            except Exception:
+                self._record(sql, (time.perf_counter() - started) * 1000.0, False)
+                raise
+
+    def execute(self, sql: str, params: Sequence[Any] = ()) -> None:
+        self._run(sql, params, "none")
+
+    def fetchall(self, sql: str, params: Sequence[Any] = ()) -> List[tuple]:
+        return self._run(sql, params, "all")
+
+    def fetchone(self, sql: str, params: Sequence[Any] = ()) -> Optional[tuple]:
+        return self._run(sql, params, "one")
+
+    def insert_many(self, sql: str, rows: Iterable[Sequence[Any]]) -> None:
+        """sql فيه "VALUES %s" (نفس أسلوب psycopg2.extras.execute_values)."""
+        rows = [tuple(r) for r in rows]
+        if rows:
+            self._run(sql, rows, "values")
+
+    # ---------- Metrics ----------
+    def _pool_stats(self) -> Dict[str, Any]:
+        return {}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            statements = {
+                label: {
+                    "count": int(st["count"]),
+                    "avg_ms": round(st["total_ms"] / st["count"], 2) if st["count"] else 0.0,
+                    "max_ms": round(st["max_ms"], 2),
+                    "errors": int(st["errors"]),
+                }
+                for label, st in self._statements.items()
+            }
+            out = {
+                "backend": self.backend,
+                "checkouts": self.checkouts,
+                "reconnects": self.reconnects,
+                "errors": self.errors,
+                "statements": statements,
+            }
+        out.update(self._pool_stats())
+        return out
+
+
+# ==============================
+#   PostgreSQL
+# ==============================
+
+class PostgresDatabase(_BaseDatabase):
+    backend = "postgres"
+
+    def __init__(
+        self,
+        dsn: str,
+        minconn: int = 1,
+        maxconn: int = 8,
+        healthcheck_idle: float = 30.0,
+        statement_timeout_ms: int = 0,
+        checkout_timeout: float = 10.0,
+        logger=None,
+    ) -> None:
+        import psycopg2
+        from psycopg2 import pool as pg_pool
+
+        super().__init__(logger)
+        self._psycopg2 = psycopg2
+        self._reconnect_errors = (psycopg2.OperationalError, psycopg2.InterfaceError)
+        self.minconn = max(1, int(minconn))
+        self.maxconn = max(self.minconn, int(maxconn))
+        self.healthcheck_idle = float(healthcheck_idle)
+        self.checkout_timeout = float(checkout_timeout)
+
+        kwargs: Dict[str, Any] = {}
+        if statement_timeout_ms:
+            kwargs["options"] = f"-c statement_timeout={int(statement_timeout_ms)}"
+        self._pool = pg_pool.ThreadedConnectionPool(self.minconn, self.maxconn, dsn, **kwargs)
+        self._last_used: Dict[int, float] = {}
+        self._in_use = 0
+
+    def _healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        if time.time() - self._last_used.get(id(conn), 0.0) < self.healthcheck_idle:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except Exception:
+            return False
+
+    def _acquire(self):
+        deadline = time.time() + self.checkout_timeout
+        while True:
+            try:
+                conn = self._pool.getconn()
+            except self._psycopg2.pool.PoolError:
+                # الـ pool مليان → نستنى connection يرجع
+                if time.time() >= deadline:
+                    raise
+                time.sleep(0.05)
+                continue
+
+            try:
+                # autocommit قبل الـ SELECT 1 → الـ probe مايفتحش transaction
+                # (set_session جوه transaction = ProgrammingError)
+                if not conn.closed and not conn.autocommit:
+                    conn.autocommit = True
+                healthy = self._healthy(conn)
+            except Exception:
+                healthy = False
+
+            if not healthy:
+                with self._stats_lock:
+                    self.reconnects += 1
+                self._last_used.pop(id(conn), None)
+                try:
+                    self._pool.putconn(conn, close=True)
+                except Exception:
+                    pass
+                continue
+
+            with self._stats_lock:
+                self._in_use += 1
+            return conn
+
+    def _release(self, conn, broken: bool = False) -> None:
+        with self._stats_lock:
+            self._in_use -= 1
+        if broken or conn.closed:
+            self._last_used.pop(id(conn), None)
+            try:
+                self._pool.putconn(conn, close=True)
+            except Exception:
+                pass
+            return
+        self._last_used[id(conn)] = time.time()
+        self._pool.putconn(conn)
+
+    def _exec(self, conn, sql: str, params: Any, mode: str):
+        with conn.cursor() as cur:
+            if mode == "values":
+                from psycopg2.extras import execute_values
+
+                execute_values(cur, sql, params)
+                return None
+            cur.execute(sql, params or None)
+            if mode == "all":
+                return cur.fetchall()
+            if mode == "one":
+                return cur.fetchone()
+            return None
+
+    def _pool_stats(self) -> Dict[str, Any]:
+        return {"pool_min": self.minconn, "pool_max": self.maxconn, "in_use": self._in_use}
+
+
+# ==============================
+#   SQLite (محلى — نفس الـ interface)
+# ==============================
+
+_VALUES_RE = re.compile(r"VALUES\s+%s", re.IGNORECASE)
+
+
+class SQLiteDatabase(_BaseDatabase):
+    backend = "sqlite"
+    # ملف محلى — مفيش connection بيقع، فمفيش reconnect
+
+    def __init__(self, path: str, logger=None) -> None:
+        super().__init__(logger)
+        self.path = path
+        self._conns = threading.local()
+        self._sql_cache: Dict[tuple, str] = {}
+
+    def _acquire(self):
+        conn = getattr(self._conns, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._conns.conn = conn
+        return conn
+
+    def _release(self, conn, broken: bool = False) -> None:
+        # connection واحد ثابت لكل thread (sqlite3 مربوط بالـ thread اللى فتحه)
+        if broken:
+            try:
+                conn.close()
+            except Exception:
+                pass
+            self._conns.conn = None
+
+    def _translate(self, sql: str, ncols: int = 0) -> str:
+        key = (sql, ncols)
+        out = self._sql_cache.get(key)
+        if out is None:
+            out = sql
+            if ncols:
+                out = _VALUES_RE.sub("VALUES (" + ", ".join("?" * ncols) + ")", out, count=1)
+            out = out.replace("%s", "?")
+            self._sql_cache[key] = out
+        return out
+
+    def _exec(self, conn, sql: str, params: Any, mode: str):
+        if mode == "values":
+            conn.executemany(self._translate(sql, len(params[0])), params)
+            return None
+        cur = conn.execute(self._translate(sql), tuple(params or ()))
+        if mode == "all":
+            return cur.fetchall()
+        if mode == "one":
+            return cur.fetchone()
+        return None
+
+    def _pool_stats(self) -> Dict[str, Any]:
+        return {"path": self.path}
+
+
+# ==============================
+#   Factory
+# ==============================
+
+def create_database(
+    backend: str,
+    pg_url: Optional[str] = None,
+    sqlite_path: Optional[str] = None,
+    minconn: int = 1,
+    maxconn: int = 8,
+    healthcheck_idle: float = 30.0,
+    statement_timeout_ms: int = 0,
+    logger=None,
+) -> Optional[_BaseDatabase]:
+    backend = (backend or "").strip().lower()
+    if backend in ("postgres", "postgresql", "pg") and pg_url:
+        return PostgresDatabase(
+            pg_url,
+            minconn=minconn,
+            maxconn=maxconn,
+            healthcheck_idle=healthcheck_idle,
+            statement_timeout_ms=statement_timeout_ms,
+            logger=logger,
+        )
+    if backend == "sqlite" and sqlite_path:
+        return SQLiteDatabase(sqlite_path, logger=logger)
+    return None
@@ -0,0 +1,125 @@
+"""
+engine_event_hub.py
+
+✅ Event Hub (Server-Sent Events fan-out):
+- producer واحد بيعمل publish → الـ event بيتعمل serialize مرة واحدة (frame bytes)
+  وبيتوزع على كل المشتركين → تكلفة الـ producer ثابتة مهما كان عدد المشاهدين
+- كل مشترك ليه queue محدود — لو بطيء والـ queue اتملت، بنرمى القديم
+  ويستلم الحالة الكاملة (full frames) تانى بدل الـ deltas
+- آخر حالة كاملة لكل نوع (snapshot / logs / alerts) محفوظة → أى مشترك جديد بياخدها فوراً
+  (جوه subscribe نفسها — atomic مع الـ publish)
+- حد أقصى للمشتركين (كل stream ماسك thread من gunicorn --threads)
+"""
+
+from __future__ import annotations
+
+import itertools
+import json
+import queue
+import threading
+from typing import Any, Dict, List, Optional
+
+
+def sse_frame(event: str, data: Any, event_id: Optional[int] = None) -> bytes:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    lines.extend(f"data: {part}" for part in payload.split("\n"))
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
+class Subscriber:
+    def __init__(self, maxsize: int) -> None:
+        self.q: queue.Queue = queue.Queue(maxsize=max(1, int(maxsize)))
+
+    def get(self, timeout: float) -> Optional[bytes]:
+        try:
+            return self.q.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventHub:
+    def __init__(self, max_clients: int = 2, queue_size: int = 100) -> None:
+        self.max_clients = max(1, int(max_clients))
+        self.queue_size = int(queue_size)
+        self._subs: List[Subscriber] = []
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+        self._state: Dict[str, bytes] = {}
+
+        self.published = 0
+        self.dropped = 0
+        self.rejected = 0
+
+    # ---------- Subscribers ----------
+    def subscribe(self) -> Optional[Subscriber]:
+        """
+        الحالة الكاملة بتتحط فى الـ queue تحت نفس الـ lock بتاع publish
+        → أى delta بعدها بيوصل مرة واحدة، ومفيش delta قبلها بيتعاد فوق الحالة الكاملة.
+        """
+        with self._lock:
+            if len(self._subs) >= self.max_clients:
+                self.rejected += 1
+                return None
+            sub = Subscriber(max(self.queue_size, len(self._state) + 1))
+            for frame in self._state.values():
+                sub.q.put_nowait(frame)
+            self._subs.append(sub)
+            return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        with self._lock:
+            if sub in self._subs:
+                self._subs.remove(sub)
+
+    def has_subscribers(self) -> bool:
+        return bool(self._subs)
+
+    def initial_frames(self) -> List[bytes]:
+        with self._lock:
+            return list(self._state.values())
+
+    # ---------- Publish ----------
+    def publish(self, event: str, data: Any, full_state: Optional[Any] = None) -> None:
+        """
+        data       : الـ delta اللى بيتبعت للمشتركين الحاليين
+        full_state : (اختيارى) الحالة الكاملة للنوع ده — للمشتركين الجداد وللـ resync
+        """
+        frame = sse_frame(event, data, next(self._seq))
+        with self._lock:
+            if full_state is not None:
+                self._state[event] = sse_frame(event, full_state)
+            subs = list(self._subs)
+        self.published += 1
+
+        for sub in subs:
+            try:
+                sub.q.put_nowait(frame)
+            except queue.Full:
+                # مشترك بطيء → نفضّى الـ queue ونبعتله الحالة الكاملة بدل الـ deltas
+                self.dropped += 1
+                try:
+                    while True:
+                        sub.q.get_nowait()
+                except queue.Empty:
+                    pass
+                for f in self.initial_frames():
+                    try:
+                        sub.q.put_nowait(f)
+                    except queue.Full:
+                        break
+
+    # ---------- Metrics ----------
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "subscribers": len(self._subs),
+                "max_clients": self.max_clients,
+                "published": self.published,
+                "dropped": self.dropped,
+                "rejected": self.rejected,
+                "queued": [s.q.qsize() for s in self._subs],
+            }
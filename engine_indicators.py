@@ -0,0 +1,414 @@
+"""
+engine_indicators.py
+
+✅ Incremental Indicator Engine لكل (symbol, timeframe):
+- EMA20 / EMA50 / EMA200
+- ATR14 (Wilder)
+- RSI14 (Wilder)
+- MACD (12, 26, 9) + signal + histogram
+- Bollinger Bands (20, 2σ) بمجموع ومجموع مربعات متحرك
+
+- كل شمعة مقفولة = تحديث O(1) للـ state
+- أول مرة: batch init على التاريخ كله في pass واحد
+- القيم متاحة للـ snapshot (compute_indicator_pack) ولمدارس التحليل في services.py
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+import config
+
+
+TF_SECONDS = {
+    "1m": 60,
+    "5m": 300,
+    "15m": 900,
+    "1h": 3600,
+    "4h": 14400,
+    "1d": 86400,
+}
+
+
+# ==============================
+#   Building blocks (O(1) update)
+# ==============================
+
+def _slots_to_dict(obj) -> Dict[str, Any]:
+    return {name: getattr(obj, name) for name in obj.__slots__}
+
+
+def _slots_from_dict(obj, data: Dict[str, Any]):
+    for name in obj.__slots__:
+        if name in data:
+            setattr(obj, name, data[name])
+    return obj
+
+
+class _EMA:
+    """EMA بيتبذر بـ SMA لأول period قيمة."""
+
+    __slots__ = ("period", "k", "value", "_seed_sum", "_seed_n")
+
+    def __init__(self, period: int) -> None:
+        self.period = int(period)
+        self.k = 2.0 / (self.period + 1)
+        self.value: Optional[float] = None
+        self._seed_sum = 0.0
+        self._seed_n = 0
+
+    def update(self, x: float) -> Optional[float]:
+        if self.value is None:
+            self._seed_sum += x
+            self._seed_n += 1
+            if self._seed_n >= self.period:
+                self.value = self._seed_sum / self._seed_n
+            return self.value
+        self.value = x * self.k + self.value * (1.0 - self.k)
+        return self.value
+
+
+class _Wilder:
+    """Wilder smoothing (RMA) — مستخدم في ATR و RSI."""
+
+    __slots__ = ("period", "value", "_seed_sum", "_seed_n")
+
+    def __init__(self, period: int) -> None:
+        self.period = int(period)
+        self.value: Optional[float] = None
+        self._seed_sum = 0.0
+        self._seed_n = 0
+
+    def update(self, x: float) -> Optional[float]:
+        if self.value is None:
+            self._seed_sum += x
+            self._seed_n += 1
+            if self._seed_n >= self.period:
+                self.value = self._seed_sum / self._seed_n
+            return self.value
+        self.value = (self.value * (self.period - 1) + x) / self.period
+        return self.value
+
+
+class _RollingBand:
+    """Bollinger: mean/std على آخر period قيمة بمجموع + مجموع مربعات."""
+
+    __slots__ = ("period", "mult", "_win", "_sum", "_sumsq")
+
+    def __init__(self, period: int = 20, mult: float = 2.0) -> None:
+        self.period = int(period)
+        self.mult = float(mult)
+        self._win: deque = deque()
+        self._sum = 0.0
+        self._sumsq = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"period": self.period, "mult": self.mult, "win": list(self._win)}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "_RollingBand":
+        band = cls(int(data["period"]), float(data["mult"]))
+        for x in data.get("win") or ():
+            band.update(float(x))
+        return band
+
+    def update(self, x: float) -> Optional[Tuple[float, float, float]]:
+        self._win.append(x)
+        self._sum += x
+        self._sumsq += x * x
+        if len(self._win) > self.period:
+            old = self._win.popleft()
+            self._sum -= old
+            self._sumsq -= old * old
+
+        n = len(self._win)
+        if n < self.period:
+            return None
+
+        mean = self._sum / n
+        var = max(0.0, self._sumsq / n - mean * mean)
+        std = math.sqrt(var)
+        return mean - self.mult * std, mean, mean + self.mult * std
+
+
+# ==============================
+#   Per (symbol, timeframe) state
+# ==============================
+
+class IndicatorState:
+    def __init__(self, symbol: str, timeframe: str) -> None:
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.ema20 = _EMA(20)
+        self.ema50 = _EMA(50)
+        self.ema200 = _EMA(200)
+
+        self.atr14 = _Wilder(14)
+        self.rsi_gain = _Wilder(14)
+        self.rsi_loss = _Wilder(14)
+
+        self.macd_fast = _EMA(12)
+        self.macd_slow = _EMA(26)
+        self.macd_sig = _EMA(9)
+        self.macd_line: Optional[float] = None
+
+        self.bands = _RollingBand(20, 2.0)
+        self.bb: Optional[Tuple[float, float, float]] = None
+
+        self.prev_close: Optional[float] = None
+        self.last_close: Optional[float] = None
+        self.last_open_time: Optional[int] = None
+        self.count = 0
+
+    # ---------- Checkpoint (JSON — أرقام و lists بس) ----------
+    _EMA_FIELDS = ("ema20", "ema50", "ema200", "macd_fast", "macd_slow", "macd_sig")
+    _WILDER_FIELDS = ("atr14", "rsi_gain", "rsi_loss")
+    _SCALAR_FIELDS = ("macd_line", "prev_close", "last_close", "last_open_time", "count")
+
+    def to_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"symbol": self.symbol, "timeframe": self.timeframe}
+        for name in self._EMA_FIELDS + self._WILDER_FIELDS:
+            out[name] = _slots_to_dict(getattr(self, name))
+        for name in self._SCALAR_FIELDS:
+            out[name] = getattr(self, name)
+        out["bands"] = self.bands.to_dict()
+        out["bb"] = list(self.bb) if self.bb is not None else None
+        return out
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "IndicatorState":
+        st = cls(str(data["symbol"]), str(data["timeframe"]))
+        for name in cls._EMA_FIELDS + cls._WILDER_FIELDS:
+            _slots_from_dict(getattr(st, name), data.get(name) or {})
+        for name in cls._SCALAR_FIELDS:
+            if name in data:
+                setattr(st, name, data[name])
+        st.bands = _RollingBand.from_dict(data.get("bands") or {"period": 20, "mult": 2.0})
+        st.bb = tuple(data["bb"]) if data.get("bb") else None
+        return st
+
+    # ---------- O(1) update ----------
+    def update(self, candle: Dict[str, Any]) -> None:
+        close = float(candle["close"])
+        high = float(candle["high"])
+        low = float(candle["low"])
+
+        self.ema20.update(close)
+        self.ema50.update(close)
+        self.ema200.update(close)
+
+        if self.prev_close is not None:
+            tr = max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+            self.atr14.update(tr)
+
+            diff = close - self.prev_close
+            self.rsi_gain.update(diff if diff > 0 else 0.0)
+            self.rsi_loss.update(-diff if diff < 0 else 0.0)
+
+        fast = self.macd_fast.update(close)
+        slow = self.macd_slow.update(close)
+        if fast is not None and slow is not None:
+            self.macd_line = fast - slow
+            self.macd_sig.update(self.macd_line)
+
+        self.bb = self.bands.update(close)
+
+        self.prev_close = close
+        self.last_close = close
+        ot = candle.get("open_time", candle.get("timestamp"))
+        if ot is not None:
+            self.last_open_time = int(ot)
+        self.count += 1
+
+    # ---------- Batch init ----------
+    def init_from_history(self, candles: List[Dict[str, Any]]) -> None:
+        """
+        Pass واحد على التاريخ (نفس معادلات update بالظبط).
+        """
+        update = self.update
+        for c in candles:
+            update(c)
+
+    # ---------- Values ----------
+    def values(self) -> Dict[str, Any]:
+        rsi = None
+        if self.rsi_gain.value is not None and self.rsi_loss.value is not None:
+            if self.rsi_loss.value == 0:
+                rsi = 100.0
+            else:
+                rs = self.rsi_gain.value / self.rsi_loss.value
+                rsi = 100.0 - 100.0 / (1.0 + rs)
+
+        macd_signal_line = self.macd_sig.value
+        macd_hist = None
+        macd_signal = "neutral"
+        if self.macd_line is not None and macd_signal_line is not None:
+            macd_hist = self.macd_line - macd_signal_line
+            if macd_hist > 0:
+                macd_signal = "bullish"
+            elif macd_hist < 0:
+                macd_signal = "bearish"
+
+        def _r(v: Optional[float], nd: int = 2) -> Optional[float]:
+            return round(v, nd) if v is not None else None
+
+        bb_lower = bb_mid = bb_upper = None
+        bb_width = None
+        if self.bb is not None:
+            bb_lower, bb_mid, bb_upper = self.bb
+            if bb_mid:
+                bb_width = (bb_upper - bb_lower) / bb_mid * 100.0
+
+        return {
+            "symbol": self.symbol,
+            "timeframe": self.timeframe,
+            "candles": self.count,
+            "last_close": _r(self.last_close),
+            "last_open_time": self.last_open_time,
+            "ema20": _r(self.ema20.value),
+            "ema50": _r(self.ema50.value),
+            "ema200": _r(self.ema200.value),
+            "atr14": _r(self.atr14.value),
+            "rsi": _r(rsi, 1),
+            "macd": _r(self.macd_line, 4),
+            "macd_signal_line": _r(macd_signal_line, 4),
+            "macd_hist": _r(macd_hist, 4),
+            "macd_signal": macd_signal,
+            "bb_lower": _r(bb_lower),
+            "bb_mid": _r(bb_mid),
+            "bb_upper": _r(bb_upper),
+            "bb_width_pct": _r(bb_width),
+        }
+
+
+# ==============================
+#   Registry
+# ==============================
+
+_STATES: Dict[Tuple[str, str], IndicatorState] = {}
+_STATES_LOCK = threading.Lock()
+
+
+def get_indicator_state(symbol: str, timeframe: str) -> IndicatorState:
+    key = ((symbol or "BTCUSDT").upper(), timeframe)
+    with _STATES_LOCK:
+        st = _STATES.get(key)
+        if st is None:
+            st = IndicatorState(key[0], timeframe)
+            _STATES[key] = st
+        return st
+
+
+def export_indicator_states() -> List[Dict[str, Any]]:
+    with _STATES_LOCK:
+        states = [st for st in _STATES.values() if st.count]
+    out = []
+    for st in states:
+        with st.lock:
+            out.append(st.to_dict())
+    return out
+
+
+def import_indicator_states(states: List[Dict[str, Any]]) -> int:
+    """
+    Warm-start من checkpoint: state جاهزة → update_indicators يكمل بآخر كام شمعة بس
+    (ولو فى فجوة أكبر من فريم، بيعيد البناء لوحده).
+    """
+    n = 0
+    for data in states or ():
+        try:
+            st = IndicatorState.from_dict(data)
+        except (KeyError, TypeError, ValueError):
+            continue
+        key = (st.symbol, st.timeframe)
+        with _STATES_LOCK:
+            if key not in _STATES:
+                _STATES[key] = st
+                n += 1
+    return n
+
+
+def _closed_only(candles: List[Dict[str, Any]], timeframe: str, now: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    آخر شمعة من Binance غالباً لسه مفتوحة → نستبعدها من الـ state.
+    """
+    tf_sec = TF_SECONDS.get(timeframe)
+    if not candles or not tf_sec:
+        return candles
+    now = time.time() if now is None else now
+    out = candles
+    last = candles[-1]
+    ot = last.get("open_time", last.get("timestamp"))
+    if ot is not None and int(ot) + tf_sec > now:
+        out = candles[:-1]
+    return out
+
+
+def update_indicators(
+    symbol: str,
+    timeframe: str,
+    candles: List[Dict[str, Any]],
+) -> Dict[str, Any]:
+    """
+    يدخّل الشموع المقفولة الجديدة فقط في الـ state.
+    - state فاضي → batch init على كل التاريخ
+    - غير كده → update O(1) لكل شمعة أحدث من last_open_time
+    """
+    st = get_indicator_state(symbol, timeframe)
+    closed = _closed_only(candles or [], timeframe)
+
+    tf_sec = TF_SECONDS.get(timeframe, 0)
+
+    with st.lock:
+        # فجوة بين آخر شمعة فى الـ state وأول شمعة جديدة → نعيد البناء
+        if st.count and st.last_open_time is not None and closed and tf_sec:
+            first_ot = closed[0].get("open_time", closed[0].get("timestamp"))
+            if first_ot is not None and int(first_ot) > st.last_open_time + tf_sec:
+                st.reset()
+
+        if st.count == 0:
+            st.init_from_history(closed)
+        elif st.last_open_time is not None:
+            for c in closed:
+                ot = c.get("open_time", c.get("timestamp"))
+                if ot is not None and int(ot) > st.last_open_time:
+                    st.update(c)
+        return st.values()
+
+
+def get_indicator_values(
+    symbol: str = "BTCUSDT",
+    timeframe: str = "1h",
+    candles: Optional[List[Dict[str, Any]]] = None,
+    limit: int = 300,
+) -> Dict[str, Any]:
+    """
+    واجهة عامة: لو candles مش موجودة نجيب klines من Binance
+    (أول مرة limit كامل، بعد كده آخر كام شمعة بس).
+    """
+    try:
+        if candles is None:
+            from analysis_engine import _fetch_binance_klines
+
+            st = get_indicator_state(symbol, timeframe)
+            tf_sec = TF_SECONDS.get(timeframe, 3600)
+            fresh = (
+                st.count > 0
+                and st.last_open_time is not None
+                and time.time() - st.last_open_time <= tf_sec * 4
+            )
+            need = 5 if fresh else limit
+            candles = _fetch_binance_klines((symbol or "BTCUSDT").upper(), timeframe, limit=need)
+
+        return update_indicators(symbol, timeframe, candles or [])
+    except Exception as e:
+        config.logger.exception("Error in get_indicator_values %s@%s: %s", symbol, timeframe, e)
+        return {}
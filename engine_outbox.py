@@ -0,0 +1,382 @@
+"""
+engine_outbox.py
+
+✅ Persistent Outbound Queue (SQLite — crash-safe delivery):
+- كل رسالة خارجة (ردود / تحذيرات / تقرير أسبوعى) بتتحط فى outbox بدل ما تتبعت fire-and-forget
+- enqueue = append فى deque + Event (ميكروثوانى) — مفيش I/O فى مسار الـ webhook
+- ثريد واحد بيعمل flush للـ deque فى SQLite بـ commit واحد لكل دفعة (batched commits)
+- نفس الثريد بيسحب الرسايل المستحقة (priority ثم الأقدم) ويبعتها عن طريق BroadcastEngine
+  (worker pool + token buckets + retry_after)
+- At-least-once: الصف بيتعلم sent بس بعد 200 من Telegram
+  → ريستارت/ديبلوى فى نص broadcast = الباقى بيكمل أول ما البوت يقوم
+- dedupe_key (UNIQUE) → نفس التحذير مش بيتبعت لنفس الشات مرتين بعد الريستارت
+- فشل مؤقت (5xx / network) → backoff وإعادة لحد OUTBOX_MAX_ATTEMPTS
+  فشل نهائى (403 blocked / 400) → failed على طول
+- الصفوف المبعوتة بتتمسح بعد OUTBOX_RETENTION_SECONDS
+
+ملحوظة: اللى لسه فى الـ deque (آخر OUTBOX_FLUSH_MS) بيتكتب فى atexit عند الإيقاف الطبيعى.
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import config
+
+
+PRIORITY_REPLY = 1
+PRIORITY_ALERT = 3
+PRIORITY_BULK = 5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    dedupe_key TEXT UNIQUE,
+    chat_id TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 5,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    next_attempt_at REAL NOT NULL,
+    sent_at REAL,
+    last_status INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, priority, next_attempt_at, id);
+"""
+
+
+def _connect(path: str, check_same_thread: bool = True) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=10.0, isolation_level=None, check_same_thread=check_same_thread)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+class Outbox:
+    def __init__(
+        self,
+        path: str,
+        engine=None,
+        batch_size: int = 64,
+        flush_ms: float = 20.0,
+        max_attempts: int = 8,
+        retention_seconds: float = 86400.0,
+    ) -> None:
+        self.path = path
+        self.engine = engine
+        self.batch_size = max(1, int(batch_size))
+        self.flush_s = max(0.0, float(flush_ms)) / 1000.0
+        self.max_attempts = max(1, int(max_attempts))
+        self.retention_seconds = float(retention_seconds)
+
+        self._pending: deque = deque()
+        self._wake = threading.Event()
+        self._recent_keys: "OrderedDict[str, None]" = OrderedDict()  # اتكتبت فى SQLite
+        self._queued_keys: set = set()  # لسه فى الـ deque
+        self._keys_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._last_purge = 0.0
+
+        self.enqueued = 0
+        self.deduped = 0
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.rate_limited = 0
+        self.depth = 0
+        self.recovered = 0
+        self.last_batch: Dict[str, Any] = {}
+
+    # ---------- Enqueue (hot path) ----------
+    def enqueue(
+        self,
+        payload: Dict[str, Any],
+        dedupe_key: Optional[str] = None,
+        priority: int = PRIORITY_REPLY,
+    ) -> bool:
+        """
+        بترجع False لو الـ dedupe_key اتشاف قبل كده فى نفس الـ process.
+        (الـ UNIQUE فى SQLite بيغطى اللى اتبعت قبل الريستارت.)
+        """
+        if dedupe_key is not None:
+            with self._keys_lock:
+                if dedupe_key in self._recent_keys or dedupe_key in self._queued_keys:
+                    self.deduped += 1
+                    return False
+                self._queued_keys.add(dedupe_key)
+
+        self._pending.append((dedupe_key, payload, int(priority), time.time()))
+        self.enqueued += 1
+        self._wake.set()
+        return True
+
+    # ---------- Worker ----------
+    def start(self) -> None:
+        """
+        الـ DB بيتفتح هنا (synchronous) — لو الملف مش قابل للفتح الـ exception
+        بيطلع للـ caller بدل ما الثريد يموت فى صمت والرسايل تتكوم فى الـ deque.
+        """
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            # الـ connection بيتسلم لثريد الـ outbox وهو بس اللى بيستخدمه
+            conn = _connect(self.path, check_same_thread=False)
+            try:
+                self.recovered = self._count_pending(conn)
+            except Exception:
+                conn.close()
+                raise
+            if self.engine is None:
+                from engine_broadcast import get_broadcast_engine
+
+                self.engine = get_broadcast_engine()
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.engine.workers,
+                thread_name_prefix="outbox_send",
+            )
+            self._thread = threading.Thread(target=self._run, args=(conn,), name="outbox", daemon=True)
+            self._thread.start()
+            atexit.register(self.flush_now)
+        config.logger.info(
+            "Outbox started (%s, %d pending recovered).", self.path, self.recovered
+        )
+
+    def is_running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def _run(self, conn: sqlite3.Connection) -> None:
+        while True:
+            try:
+                self._wake.wait(timeout=1.0)
+                self._wake.clear()
+                if self.flush_s and self._pending:
+                    # linger صغير → الـ broadcast كله يدخل فى commit واحد
+                    time.sleep(self.flush_s)
+                self._flush(conn)
+                while self._deliver_batch(conn):
+                    # رسايل جديدة (ردود) بتدخل بين الدفعات
+                    self._flush(conn)
+                self._maybe_purge(conn)
+                self.depth = self._count_pending(conn)
+            except Exception as e:
+                config.logger.exception("Outbox loop error: %s", e)
+                time.sleep(1.0)
+
+    def _flush(self, conn: sqlite3.Connection) -> int:
+        items = []
+        while self._pending:
+            try:
+                items.append(self._pending.popleft())
+            except IndexError:
+                break
+        if not items:
+            return 0
+        rows = [
+            (key, str(payload.get("chat_id")), json.dumps(payload, ensure_ascii=False), priority, ts, ts)
+            for key, payload, priority, ts in items
+        ]
+        try:
+            conn.execute("BEGIN")
+            before = conn.total_changes
+            conn.executemany(
+                """
+                INSERT OR IGNORE INTO outbox
+                    (dedupe_key, chat_id, payload, priority, created_at, next_attempt_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+            inserted = conn.total_changes - before
+            conn.execute("COMMIT")
+        except Exception:
+            try:
+                conn.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+            # الدفعة بترجع لأول الـ deque بنفس الترتيب (database locked ...) → flush الجاى يعيدها
+            self._pending.extendleft(reversed(items))
+            raise
+        with self._keys_lock:
+            for key, _payload, _priority, _ts in items:
+                if key is None:
+                    continue
+                self._queued_keys.discard(key)
+                self._recent_keys[key] = None
+            while len(self._recent_keys) > 5000:
+                self._recent_keys.popitem(last=False)
+        if inserted < len(rows):
+            self.deduped += len(rows) - inserted
+        return inserted
+
+    def flush_now(self) -> None:
+        """flush من أى thread (atexit) — connection منفصلة."""
+        if not self._pending:
+            return
+        try:
+            conn = _connect(self.path)
+            try:
+                self._flush(conn)
+            finally:
+                conn.close()
+        except Exception as e:
+            config.logger.exception("Outbox flush on exit failed: %s", e)
+
+    def _count_pending(self, conn: sqlite3.Connection) -> int:
+        row = conn.execute("SELECT COUNT(*) FROM outbox WHERE status = 'pending'").fetchone()
+        return int(row[0]) if row else 0
+
+    def _deliver_batch(self, conn: sqlite3.Connection) -> bool:
+        now = time.time()
+        rows: List[Tuple[int, str, int]] = conn.execute(
+            """
+            SELECT id, payload, attempts FROM outbox
+            WHERE status = 'pending' AND next_attempt_at <= ?
+            ORDER BY priority, id
+            LIMIT ?
+            """,
+            (now, self.batch_size),
+        ).fetchall()
+        if not rows:
+            return False
+
+        stats = self.engine.new_stats()
+        started = time.time()
+
+        def _job(row) -> Optional[int]:
+            try:
+                return self.engine.deliver(json.loads(row[1]), stats)
+            except Exception as e:
+                config.logger.exception("Outbox delivery error for id=%s: %s", row[0], e)
+                return None
+
+        statuses = list(self._pool.map(_job, rows))  # type: ignore[union-attr]
+
+        done_at = time.time()
+        sent_rows, retry_rows, failed_rows = [], [], []
+        for (row_id, _, attempts), status in zip(rows, statuses):
+            if status == 200:
+                sent_rows.append((done_at, row_id))
+                continue
+            attempts += 1
+            transient = status is None or status >= 500
+            if transient and attempts < self.max_attempts:
+                delay = min(600.0, 5.0 * (2 ** (attempts - 1)))
+                retry_rows.append((attempts, done_at + delay, status, row_id))
+            else:
+                failed_rows.append((attempts, status, row_id))
+
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(
+                "UPDATE outbox SET status = 'sent', sent_at = ?, last_status = 200 WHERE id = ?",
+                sent_rows,
+            )
+            conn.executemany(
+                "UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_status = ? WHERE id = ?",
+                retry_rows,
+            )
+            conn.executemany(
+                "UPDATE outbox SET status = 'failed', attempts = ?, last_status = ? WHERE id = ?",
+                failed_rows,
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        self.sent += len(sent_rows)
+        self.failed += len(failed_rows)
+        self.retried += len(retry_rows) + stats["retries"]
+        self.rate_limited += stats["rate_limited"]
+        duration = done_at - started
+        self.last_batch = {
+            "size": len(rows),
+            "sent": len(sent_rows),
+            "rescheduled": len(retry_rows),
+            "failed": len(failed_rows),
+            "duration_s": round(duration, 3),
+            "throughput_msg_s": round(len(sent_rows) / duration, 2) if duration > 0 else 0.0,
+            "at": done_at,
+        }
+        return True
+
+    def _maybe_purge(self, conn: sqlite3.Connection) -> None:
+        now = time.time()
+        if now - self._last_purge < 600:
+            return
+        self._last_purge = now
+        conn.execute(
+            "DELETE FROM outbox WHERE status IN ('sent', 'failed') AND created_at < ?",
+            (now - self.retention_seconds,),
+        )
+
+    # ---------- Metrics ----------
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "running": self.is_running(),
+            "buffered": len(self._pending),
+            "pending": self.depth,
+            "recovered_on_start": self.recovered,
+            "enqueued": self.enqueued,
+            "deduped": self.deduped,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "rate_limited": self.rate_limited,
+            "last_batch": dict(self.last_batch),
+        }
+
+
+# ==============================
+#   Shared instance (config)
+# ==============================
+
+_OUTBOX_LOCK = threading.Lock()
+
+
+def get_outbox() -> Optional[Outbox]:
+    """
+    الـ outbox الشغال بس — None لو مقفول / مابدأش / الثريد وقف
+    (أو worker مش leader) → الـ caller بيبعت مباشرة.
+    مش بتعمل instance جديد أبداً (ده شغل start_outbox).
+    """
+    box = config.OUTBOX
+    if box is None or not box.is_running():
+        return None
+    return box
+
+
+def start_outbox() -> Optional[Outbox]:
+    """
+    بيفتح الـ DB ويشغّل الثريد — config.OUTBOX بيتضبط بس بعد ما الثريد اشتغل.
+    أى فشل (مثلاً OUTBOX_DB مش قابل للفتح) بيطلع exception و config.OUTBOX بيفضل None.
+    """
+    if not getattr(config, "OUTBOX_ENABLED", True) or not getattr(config, "OUTBOX_DB", None):
+        return None
+    with _OUTBOX_LOCK:
+        if config.OUTBOX is not None and config.OUTBOX.is_running():
+            return config.OUTBOX
+        box = Outbox(
+            config.OUTBOX_DB,
+            batch_size=int(getattr(config, "OUTBOX_BATCH_SIZE", 64)),
+            flush_ms=float(getattr(config, "OUTBOX_FLUSH_MS", 20)),
+            max_attempts=int(getattr(config, "OUTBOX_MAX_ATTEMPTS", 8)),
+            retention_seconds=float(getattr(config, "OUTBOX_RETENTION_SECONDS", 86400)),
+        )
+        box.start()
+        config.OUTBOX = box
+    return box
@@ -0,0 +1,125 @@
+"""
+engine_prerender.py
+
+✅ Background Pre-render للتقارير:
+- كل تقرير (market / risk / btc / alert / weekly / المدارس) بيتسجل بـ key + builder
+- ثريد خلفى بيعيد بناء النصوص من آخر snapshot:
+    * بس لما الـ tick يتغير (نفس tick بتاع الـ Snapshot DAG)
+    * وبحد أدنى min_interval لكل تقرير (التقارير التقيلة زى weekly)
+    * وبس للتقارير اللى حد طلبها خلال PRERENDER_IDLE_SECONDS (config.PRERENDER_DEMAND)
+      → مفيش DAG evaluation ولا sampling زيادة للـ pulse لتقارير محدش بيفتحها
+- النص الجاهز بيتحط فى config.REALTIME_CACHE[key]
+  وصالح لحد PRERENDER_MAX_AGE_SECONDS (قريب من REALTIME_TTL_SECONDS — مش أسعار قديمة)
+- الـ webhook بيقرا dict بس (get_prerendered) — ولو النص قديم/مش موجود
+  بيرجع للمسار العادى (get_cached_response / get_school_cached_response)
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+import config
+
+
+_REPORTS: Dict[str, Dict[str, Any]] = {}
+_REPORTS_LOCK = threading.Lock()
+
+
+def register_report(key: str, builder: Callable[[], str], min_interval: Optional[float] = None) -> None:
+    """
+    key: نفس مفتاح الكاش اللى بيستخدمه الـ handler (مثلاً "market_report" أو "school:ict:BTCUSDT")
+    """
+    if min_interval is None:
+        min_interval = float(getattr(config, "PRERENDER_MIN_INTERVAL_SECONDS", 15))
+    with _REPORTS_LOCK:
+        _REPORTS[key] = {"builder": builder, "min_interval": float(min_interval)}
+
+
+def _meta() -> Dict[str, Dict[str, Any]]:
+    meta = config.REALTIME_CACHE.get("prerender")
+    if not isinstance(meta, dict):
+        meta = {}
+        config.REALTIME_CACHE["prerender"] = meta
+    return meta
+
+
+def get_prerendered(key: str, max_age: Optional[float] = None) -> Optional[str]:
+    """
+    قراءة O(1) للنص الجاهز — None لو مش متسجل أو أقدم من max_age.
+    """
+    config.PRERENDER_DEMAND[key] = time.time()
+    info = config.REALTIME_CACHE.get("prerender", {}).get(key)
+    if not info:
+        return None
+    if max_age is None:
+        max_age = float(getattr(config, "PRERENDER_MAX_AGE_SECONDS", 8))
+    if time.time() - info["built_at"] > max_age:
+        return None
+    text = config.REALTIME_CACHE.get(key)
+    return text if isinstance(text, str) and text else None
+
+
+def prerender_tick(force: bool = False) -> int:
+    """
+    يعيد بناء التقارير اللى الـ tick بتاعها اتغير. يرجّع عدد التقارير اللى اتبنت.
+    """
+    from analysis_engine import _snapshot_tick
+
+    now = time.time()
+    idle = float(getattr(config, "PRERENDER_IDLE_SECONDS", 600))
+    demand = config.PRERENDER_DEMAND
+
+    with _REPORTS_LOCK:
+        reports = [
+            (key, spec) for key, spec in _REPORTS.items()
+            if force or now - demand.get(key, 0.0) <= idle
+        ]
+    if not reports:
+        return 0
+
+    tick = _snapshot_tick()
+    meta = _meta()
+    built = 0
+
+    for key, spec in reports:
+        info = meta.get(key) or {}
+        now = time.time()
+        if not force:
+            if info.get("tick") == tick:
+                continue
+            if now - info.get("built_at", 0.0) < spec["min_interval"]:
+                continue
+        try:
+            text = spec["builder"]()
+        except Exception as e:
+            config.logger.exception("Prerender failed for %s: %s", key, e)
+            continue
+        if not isinstance(text, str) or not text:
+            continue
+
+        config.REALTIME_CACHE[key] = text
+        meta[key] = {
+            "tick": tick,
+            "built_at": time.time(),
+            "build_ms": round((time.time() - now) * 1000.0, 1),
+        }
+        built += 1
+
+    if built:
+        config.REALTIME_CACHE["last_update"] = datetime.utcnow().isoformat(timespec="seconds")
+    return built
+
+
+def prerender_loop() -> None:
+    interval = float(getattr(config, "PRERENDER_INTERVAL_SECONDS", 5))
+    config.logger.info("Prerender loop started (every %.0fs, %d reports).", interval, len(_REPORTS))
+    while True:
+        try:
+            config.LAST_PRERENDER_TICK = time.time()
+            prerender_tick()
+        except Exception as e:
+            config.logger.exception("Error in prerender loop: %s", e)
+        time.sleep(interval)
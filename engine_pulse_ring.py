@@ -0,0 +1,257 @@
+"""
+engine_pulse_ring.py
+
+✅ Pulse History Ring Buffer (واحد للكل):
+- أعمدة array('d') محجوزة مسبقاً (time / price / change / range / vol / ...)
+- عمود regime منفصل (strings)
+- append = كتابة slot + زيادة العداد فى الآخر؛ الـ writers (smart pulse + legacy
+  analysis_engine) بيتسلسلوا بـ lock، والقراية من غير lock:
+  فيه slot زيادة (capacity + 1) → الـ slot اللى الـ append الجاى بيكتبه عمره ما بيبقى
+  جوه النافذة المقروءة (آخر capacity قراءة)
+- قراءة نوافذ كاملة لعمود واحد: window("change_pct", k) → list (الأقدم → الأحدث)
+- PulseRingStats / PulseRingDiffs: إحصائيات جارية لعمود (بتلحق أى writer عند sync())
+- مشترك بين:
+    * engine_smart_pulse.update_market_pulse
+    * analysis_engine.update_market_pulse (legacy)
+
+الـ ring متخزن فى config.PULSE_HISTORY (get_pulse_ring بتنشئه أول مرة).
+"""
+
+from __future__ import annotations
+
+import threading
+from array import array
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+import config
+from engine_rolling_stats import RollingStats
+
+
+FLOAT_FIELDS = (
+    "t",
+    "price",
+    "change_pct",
+    "range_pct",
+    "vol",
+    "speed_index",
+    "accel_index",
+    "direction_confidence",
+    "vol_percentile",
+    "range_percentile",
+)
+
+
+class PulseRing:
+    def __init__(self, capacity: int = 60) -> None:
+        self.capacity = max(2, int(capacity))
+        # slot زيادة = اللى الـ append الجاى هيكتب فيه (برا أى window)
+        self._slots = self.capacity + 1
+        self._cols: Dict[str, array] = {
+            f: array("d", bytes(8 * self._slots)) for f in FLOAT_FIELDS
+        }
+        self._regime: List[Optional[str]] = [None] * self._slots
+        # إجمالى الـ appends (monotonic) — الـ slot = total % _slots
+        self._total = 0
+        self._write_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return min(self._total, self.capacity)
+
+    @property
+    def total(self) -> int:
+        return self._total
+
+    # ---------- Write (serialized) ----------
+    def append(
+        self,
+        t: float,
+        price: float = 0.0,
+        change_pct: float = 0.0,
+        range_pct: float = 0.0,
+        vol: float = 0.0,
+        regime: Optional[str] = None,
+    ) -> None:
+        with self._write_lock:
+            slot = self._total % self._slots
+            cols = self._cols
+            cols["t"][slot] = t
+            cols["price"][slot] = price
+            cols["change_pct"][slot] = change_pct
+            cols["range_pct"][slot] = range_pct
+            cols["vol"][slot] = vol
+            for f in FLOAT_FIELDS[5:]:
+                cols[f][slot] = 0.0
+            self._regime[slot] = regime
+            # publish آخر حاجة → القارئ مش هيشوف slot نصه مكتوب
+            self._total += 1
+
+    def set_last(self, **fields: Any) -> None:
+        """تحديث الحقول المحسوبة لآخر قراءة (speed / accel / regime ...)."""
+        with self._write_lock:
+            if not self._total:
+                return
+            slot = (self._total - 1) % self._slots
+            for f, v in fields.items():
+                if f == "regime":
+                    self._regime[slot] = v
+                elif f in self._cols:
+                    self._cols[f][slot] = float(v)
+
+    # ---------- Read ----------
+    def last(self, field: str, back: int = 1, default: Any = None) -> Any:
+        """back=1 → آخر قراءة، back=2 → اللى قبلها ..."""
+        total = self._total
+        if back < 1 or back > min(total, self.capacity):
+            return default
+        slot = (total - back) % self._slots
+        if field == "regime":
+            return self._regime[slot]
+        return self._cols[field][slot]
+
+    def window(self, field: str, k: Optional[int] = None) -> List[Any]:
+        """آخر k قيمة من عمود (الأقدم → الأحدث) — slicing بدل loop على dicts."""
+        total = self._total
+        n = min(total, self.capacity)
+        k = n if k is None else max(0, min(int(k), n))
+        if not k:
+            return []
+        col = self._regime if field == "regime" else self._cols[field]
+        end = total % self._slots
+        start = end - k
+        if start >= 0:
+            return list(col[start:end])
+        return list(col[start:]) + list(col[:end])
+
+    def rows(self, k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Snapshot كـ dicts (debug / dashboard / checkpoint)."""
+        cols = {f: self.window(f, k) for f in FLOAT_FIELDS}
+        cols["regime"] = self.window("regime", k)
+        n = len(cols["t"])
+        return [{f: cols[f][i] for f in cols} for i in range(n)]
+
+
+    # ---------- Checkpoint / shared state (JSON) ----------
+    def to_dict(self) -> Dict[str, Any]:
+        return {"capacity": self.capacity, "rows": self.rows()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PulseRing":
+        ring = cls(int(data.get("capacity") or 60))
+        for row in data.get("rows") or ():
+            ring.append(
+                float(row.get("t") or 0.0),
+                price=float(row.get("price") or 0.0),
+                change_pct=float(row.get("change_pct") or 0.0),
+                range_pct=float(row.get("range_pct") or 0.0),
+                vol=float(row.get("vol") or 0.0),
+                regime=row.get("regime"),
+            )
+            ring.set_last(**{f: float(row.get(f) or 0.0) for f in FLOAT_FIELDS[5:]})
+        return ring
+
+
+class PulseRingStats:
+    """
+    RollingStats لعمود من الـ ring — أى writer يكتب فى الـ ring
+    والـ stats بتلحق القيم الجديدة عند sync().
+    """
+
+    def __init__(self, ring: PulseRing, field: str, window: int) -> None:
+        self.ring = ring
+        self.field = field
+        self.stats = RollingStats(window)
+        self.seen = 0
+
+    def sync(self) -> RollingStats:
+        total = self.ring.total
+        if total > self.seen:
+            k = min(total - self.seen, len(self.ring), self.stats.window)
+            for v in self.ring.window(self.field, k):
+                self.stats.push(v)
+            self.seen = total
+        return self.stats
+
+
+class PulseRingDiffs:
+    """
+    |فرق| القراءات المتتالية لعمود من الـ ring (آخر window قراءة) بمجاميع جارية.
+    التقسيمة زى analysis_engine: mid = max(2, n // 2) → early = أول mid - 1 فرق، late = الباقى
+    → mean / split_means فى O(1) بدل list + zip على النافذة كلها كل tick.
+    """
+
+    def __init__(self, ring: PulseRing, field: str, window: int) -> None:
+        self.ring = ring
+        self.field = field
+        self.window = max(2, min(int(window), ring.capacity))
+        self.seen = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        self.n = 0  # عدد القراءات فى النافذة
+        self._prev: Optional[float] = None
+        self._early: deque = deque()
+        self._late: deque = deque()
+        self._early_sum = 0.0
+        self._late_sum = 0.0
+        self._pushes = 0
+
+    def _push(self, x: float) -> None:
+        if self._prev is not None:
+            d = abs(x - self._prev)
+            self._late.append(d)
+            self._late_sum += d
+        self._prev = x
+
+        if self.n < self.window:
+            self.n += 1
+        elif self._early:
+            self._early_sum -= self._early.popleft()
+        else:
+            self._late_sum -= self._late.popleft()
+
+        target = max(2, self.n // 2) - 1
+        while len(self._early) < target and self._late:
+            d = self._late.popleft()
+            self._late_sum -= d
+            self._early.append(d)
+            self._early_sum += d
+
+        self._pushes += 1
+        if self._pushes >= self.window:
+            # إعادة جمع كل window push → مفيش drift من الطرح (O(1) amortized)
+            self._pushes = 0
+            self._early_sum = sum(self._early)
+            self._late_sum = sum(self._late)
+
+    def sync(self) -> "PulseRingDiffs":
+        total = self.ring.total
+        if total > self.seen:
+            new = total - self.seen
+            k = min(len(self.ring), self.window)
+            if new > k or self.seen == 0:
+                # فاتتنا قراءات (أو أول مرة) → نبنى من النافذة الحالية
+                self._reset()
+                new = k
+            for v in self.ring.window(self.field, new):
+                self._push(v)
+            self.seen = total
+        return self
+
+    def mean(self) -> float:
+        count = len(self._early) + len(self._late)
+        return (self._early_sum + self._late_sum) / count if count else 0.0
+
+    def split_means(self) -> Tuple[float, float]:
+        early = self._early_sum / len(self._early) if self._early else 0.0
+        late = self._late_sum / len(self._late) if self._late else 0.0
+        return early, late
+
+
+def get_pulse_ring() -> PulseRing:
+    ring = getattr(config, "PULSE_HISTORY", None)
+    if not isinstance(ring, PulseRing):
+        capacity = int(getattr(config, "PULSE_RING_CAPACITY", 60))
+        ring = PulseRing(capacity)
+        config.PULSE_HISTORY = ring  # type: ignore[assignment]
+    return ring
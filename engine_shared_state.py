@@ -0,0 +1,550 @@
+"""
+engine_shared_state.py
+
+✅ Shared State Backend (أكتر من gunicorn worker):
+- Backends:
+    * LocalStateBackend  : dict جوه الـ process (الافتراضى — worker واحد، نفس السلوك القديم)
+    * SQLiteStateBackend : ملف KV مشترك بين الـ workers (WAL) — على /dev/shm لو موجود
+      (يعنى shared memory عملياً) — مبنى على engine_db.SQLiteDatabase
+- Leader lease: worker واحد بس بيشغّل الـ background threads (realtime / smart alert /
+  outbox / checkpoint / prerender ...) → مفيش تحذير بيتبعت مرتين
+  ولو الـ leader مات، الـ lease بيخلص وworker تانى بياخده (failover)
+  ولو leader وقف أكتر من الـ TTL ورجع لقى الـ lease مع حد تانى → بيقفل نفسه (SIGTERM)
+  وgunicorn بيعمل respawn كـ follower (الـ threads القديمة مابتكملش)
+- Fencing: holds_background_lease() بيجدد الـ lease قبل أى إرسال جماعى من الـ background
+- State sync (ثريد فى كل worker كل STATE_SYNC_INTERVAL_SECONDS):
+    * الـ leader بينشر SHARED_FIELDS (caches / pulse ring / ticks / آخر تحذير ...)
+      — الـ field بيتكتب بس لو الـ bytes اتغيرت
+    * باقى الـ workers بيسحبوا اللى اتغير بس (version > آخر version شافوه)
+      ويحدّثوا الـ dicts فى مكانها (in-place) → أى reference قديم لسه شغال
+    * KNOWN_CHAT_IDS: أى worker بيسجل شات جديد → set مشترك (seq متزايد)
+      والـ leader بس هو اللى بيكتبه على الملف / الـ DB
+    * LAST_WEBHOOK_TICK / PRERENDER_DEMAND: كل worker بيكتب key خاص بيه والقيمة = max
+    * WRITABLE_FIELDS (EXTRA_ADMINS / LAST_ALERT_REASON / LAST_AUTO_ALERT_INFO): بتتكتب
+      من الـ handlers فى أى worker (config.share_fields) → آخر كتابة تكسب فى كل الـ workers
+    * APPEND_FIELDS (ALERTS_HISTORY): log مشترك append / clear (config.share_append)
+      → إضافة worker مابتتمسحش بـ overwrite من الـ leader، والـ worker الجديد بيقرا الـ log كله
+- Encoding: JSON (مش pickle) — ملف الـ state مشترك، وقراية محتواه مابتنفّذش كود
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import signal
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import config
+
+
+# الحالة اللى الـ leader بيكتبها والباقى بيقراها
+SHARED_FIELDS: Tuple[str, ...] = (
+    "MARKET_METRICS_CACHE",
+    "REALTIME_CACHE",
+    "PULSE_HISTORY",
+    "API_STATUS",
+    "LAST_SMART_ALERT_INFO",
+    "LAST_BROADCAST_REPORT",
+    "LAST_SMART_ALERT_TS",
+    "LAST_CRITICAL_ALERT_TS",
+    "LAST_WEEKLY_SENT_DATE",
+    "LAST_REALTIME_TICK",
+    "LAST_WEEKLY_TICK",
+    "LAST_WATCHDOG_TICK",
+    "LAST_SMART_ALERT_TICK",
+    "LAST_KEEP_ALIVE_TICK",
+    "LAST_KEEP_ALIVE_OK",
+    "LAST_PRERENDER_TICK",
+)
+
+# كل الـ workers بيكتبوها — القيمة المشتركة = الأكبر (float أو dict key → ts)
+MAX_MERGE_FIELDS: Tuple[str, ...] = ("LAST_WEBHOOK_TICK", "PRERENDER_DEMAND")
+
+# بتتكتب من الـ request handlers فى أى worker → آخر كتابة تكسب (مش الـ leader)
+WRITABLE_FIELDS: Tuple[str, ...] = ("EXTRA_ADMINS", "LAST_ALERT_REASON", "LAST_AUTO_ALERT_INFO")
+
+# deques أى worker بيضيف عليها → log مشترك (append / clear) بدل overwrite
+APPEND_FIELDS: Tuple[str, ...] = ("ALERTS_HISTORY",)
+
+_LEASE_NAME = "background"
+
+
+# ==============================
+#   Backends
+# ==============================
+
+class LocalStateBackend:
+    """نفس الـ interface — جوه الـ process بس (worker واحد)."""
+
+    name = "local"
+
+    def __init__(self) -> None:
+        self._kv: Dict[str, Tuple[int, bytes]] = {}
+        self._sets: Dict[str, List[Any]] = {}
+        self._lease: Dict[str, Tuple[str, float]] = {}
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def set_many(self, items: Dict[str, bytes]) -> None:
+        with self._lock:
+            self._version += 1
+            for k, v in items.items():
+                self._kv[k] = (self._version, v)
+
+    def changed_since(self, version: int) -> Tuple[int, Dict[str, bytes]]:
+        with self._lock:
+            out = {k: v for k, (ver, v) in self._kv.items() if ver > version}
+            return self._version, out
+
+    def sadd(self, key: str, members: Iterable[Any]) -> None:
+        with self._lock:
+            self._sets.setdefault(key, []).extend(members)
+
+    def members_since(self, key: str, seq: int) -> Tuple[int, List[Any]]:
+        with self._lock:
+            items = self._sets.get(key, [])
+            return len(items), list(items[seq:])
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            cur = self._lease.get(name)
+            if cur is None or cur[0] == owner or cur[1] < now:
+                self._lease[name] = (owner, now + ttl)
+                return True
+            return False
+
+    def release_lease(self, name: str, owner: str) -> None:
+        with self._lock:
+            if self._lease.get(name, ("", 0.0))[0] == owner:
+                self._lease.pop(name, None)
+
+
+class SQLiteStateBackend:
+    """KV + sets + lease على ملف SQLite واحد مشترك بين الـ processes."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str) -> None:
+        from engine_db import SQLiteDatabase
+
+        self.path = path
+        self.db = SQLiteDatabase(path, logger=config.logger)
+        self.db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS state_kv (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                version INTEGER NOT NULL
+            )
+            """
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_state_kv_version ON state_kv (version)")
+        self.db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS state_set (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT NOT NULL,
+                member TEXT NOT NULL,
+                UNIQUE (key, member)
+            )
+            """
+        )
+        self.db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS state_lease (
+                name TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+            """
+        )
+
+    def set_many(self, items: Dict[str, bytes]) -> None:
+        if not items:
+            return
+        with self.db.connection() as conn:
+            # BEGIN IMMEDIATE → الـ version ميتكررش بين writers
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM state_kv").fetchone()
+                version = int(row[0])
+                conn.executemany(
+                    """
+                    INSERT INTO state_kv (key, value, version) VALUES (?, ?, ?)
+                    ON CONFLICT (key) DO UPDATE SET value = excluded.value, version = excluded.version
+                    """,
+                    [(k, v, version) for k, v in items.items()],
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def changed_since(self, version: int) -> Tuple[int, Dict[str, bytes]]:
+        rows = self.db.fetchall(
+            "SELECT key, value, version FROM state_kv WHERE version > %s", (int(version),)
+        )
+        if not rows:
+            return version, {}
+        return max(int(r[2]) for r in rows), {r[0]: bytes(r[1]) for r in rows}
+
+    def sadd(self, key: str, members: Iterable[Any]) -> None:
+        self.db.insert_many(
+            "INSERT INTO state_set (key, member) VALUES %s ON CONFLICT DO NOTHING",
+            [(key, str(m)) for m in members],
+        )
+
+    def members_since(self, key: str, seq: int) -> Tuple[int, List[Any]]:
+        rows = self.db.fetchall(
+            "SELECT seq, member FROM state_set WHERE key = %s AND seq > %s ORDER BY seq",
+            (key, int(seq)),
+        )
+        if not rows:
+            return seq, []
+        return int(rows[-1][0]), [r[1] for r in rows]
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        self.db.execute(
+            """
+            INSERT INTO state_lease (name, owner, expires_at) VALUES (%s, %s, %s)
+            ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+            WHERE state_lease.owner = excluded.owner OR state_lease.expires_at < %s
+            """,
+            (name, owner, now + ttl, now),
+        )
+        row = self.db.fetchone("SELECT owner FROM state_lease WHERE name = %s", (name,))
+        return bool(row) and row[0] == owner
+
+    def release_lease(self, name: str, owner: str) -> None:
+        self.db.execute("DELETE FROM state_lease WHERE name = %s AND owner = %s", (name, owner))
+
+
+# ==============================
+#   Sync
+# ==============================
+
+def _json_default(value: Any) -> Any:
+    from engine_pulse_ring import PulseRing
+
+    if isinstance(value, PulseRing):
+        return {"__pulse_ring__": value.to_dict()}
+    if isinstance(value, (deque, set, tuple)):
+        return list(value)
+    return str(value)
+
+
+def _json_hook(obj: Dict[str, Any]) -> Any:
+    if "__pulse_ring__" in obj:
+        from engine_pulse_ring import PulseRing
+
+        return PulseRing.from_dict(obj["__pulse_ring__"])
+    return obj
+
+
+def encode_value(value: Any) -> bytes:
+    return json.dumps(value, default=_json_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def decode_value(blob: bytes) -> Any:
+    # JSON بس (مش pickle) — ملف الـ state على /dev/shm مشترك، ومحتواه مايقدرش ينفّذ كود
+    return json.loads(bytes(blob).decode("utf-8"), object_hook=_json_hook)
+
+
+def _merge_max(cur: Any, value: Any) -> Any:
+    """float → الأكبر | dict (key → ts) → الأكبر لكل key."""
+    if isinstance(cur, dict) and isinstance(value, dict):
+        for k, v in value.items():
+            try:
+                if float(v) > float(cur.get(k) or 0.0):
+                    cur[k] = v
+            except (TypeError, ValueError):
+                continue
+        return cur
+    try:
+        return max(float(cur or 0.0), float(value or 0.0))
+    except (TypeError, ValueError):
+        return cur
+
+
+def _apply_field(name: str, value: Any) -> None:
+    cur = getattr(config, name, None)
+    if isinstance(cur, dict) and isinstance(value, dict):
+        cur.clear()
+        cur.update(value)
+    elif isinstance(cur, (deque, set)) and isinstance(value, list):
+        cur.clear()
+        (cur.extend if isinstance(cur, deque) else cur.update)(value)
+    else:
+        setattr(config, name, value)
+
+
+def _export_field(name: str) -> Any:
+    value = getattr(config, name, None)
+    if isinstance(value, dict):
+        return dict(value)
+    return value
+
+
+class SharedState:
+    def __init__(
+        self,
+        backend,
+        on_leader: Optional[Callable[[], None]] = None,
+        interval: float = 1.0,
+        lease_ttl: float = 15.0,
+    ) -> None:
+        self.backend = backend
+        self.on_leader = on_leader
+        self.interval = float(interval)
+        self.lease_ttl = float(lease_ttl)
+        self.owner = f"{os.uname().nodename}:{os.getpid()}"
+        self.is_leader = False
+
+        self._version = 0
+        self._chats_seq = 0
+        self._log_seq: Dict[str, int] = {name: 0 for name in APPEND_FIELDS}
+        self._published: Dict[str, str] = {}
+        self._max_pushed: Dict[str, str] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._lost = False
+
+        self.syncs = 0
+        self.published = 0
+        self.pulled = 0
+        self.errors = 0
+
+    # ---------- Known chats ----------
+    def on_new_chat(self, chat_id: int) -> None:
+        try:
+            self.backend.sadd("known_chats", [int(chat_id)])
+        except Exception as e:
+            config.logger.exception("Shared state: failed to share chat %s: %s", chat_id, e)
+
+    def _pull_chats(self) -> None:
+        self._chats_seq, members = self.backend.members_since("known_chats", self._chats_seq)
+        for m in members:
+            cid = int(m)
+            if cid in config.KNOWN_CHAT_IDS:
+                continue
+            config.KNOWN_CHAT_IDS.add(cid)
+            if self.is_leader:
+                # الـ leader بس هو اللى بيكتب على الملف / الـ DB
+                config._persist_known_chat(cid)
+
+    # ---------- Writes من أى worker ----------
+    def set_fields(self, *names: str) -> None:
+        """WRITABLE_FIELDS: القيمة الحالية فى الـ worker ده → كل الـ workers (الـ leader كمان)."""
+        items = {
+            name: encode_value({"owner": self.owner, "value": _export_field(name)})
+            for name in names
+            if name in WRITABLE_FIELDS
+        }
+        if items:
+            self.backend.set_many(items)
+
+    def append(self, name: str, item: Any = None, clear: bool = False) -> None:
+        """APPEND_FIELDS: الـ worker ده ضاف item (أو مسح الـ deque) → باقى الـ workers يعملوا نفس الحاجة."""
+        member = json.dumps(
+            {"owner": self.owner, "at": time.time(), "clear": bool(clear), "item": item},
+            default=_json_default,
+            ensure_ascii=False,
+        )
+        self.backend.sadd(f"log:{name}", [member])
+
+    def _pull_logs(self) -> None:
+        for name in APPEND_FIELDS:
+            self._log_seq[name], members = self.backend.members_since(f"log:{name}", self._log_seq[name])
+            buf = getattr(config, name, None)
+            if buf is None:
+                continue
+            for m in members:
+                try:
+                    entry = json.loads(m)
+                except Exception:
+                    continue
+                if entry.get("owner") == self.owner:
+                    continue
+                if entry.get("clear"):
+                    buf.clear()
+                else:
+                    buf.append(entry.get("item"))
+
+    # ---------- Fields ----------
+    def _publish(self) -> None:
+        items: Dict[str, bytes] = {}
+        for name in SHARED_FIELDS:
+            try:
+                blob = encode_value(_export_field(name))
+            except Exception as e:
+                config.logger.debug("Shared state: %s not serialisable: %s", name, e)
+                continue
+            digest = hashlib.sha1(blob).hexdigest()
+            if self._published.get(name) != digest:
+                items[name] = blob
+                self._published[name] = digest
+        self._collect_max_fields(items)
+        if items:
+            self.backend.set_many(items)
+            self.published += len(items)
+
+    def _collect_max_fields(self, items: Dict[str, bytes]) -> None:
+        # كل worker ليه key خاص بيه (NAME@owner) → مفيش worker بيمسح قيمة التانى
+        for name in MAX_MERGE_FIELDS:
+            blob = encode_value(_export_field(name))
+            digest = hashlib.sha1(blob).hexdigest()
+            if self._max_pushed.get(name) != digest:
+                items[f"{name}@{self.owner}"] = blob
+                self._max_pushed[name] = digest
+
+    def _pull(self) -> None:
+        self._version, changed = self.backend.changed_since(self._version)
+        for key, blob in changed.items():
+            name, _, owner = key.partition("@")
+            if owner == self.owner:
+                continue
+            try:
+                value = decode_value(blob)
+            except Exception:
+                continue
+            if name in WRITABLE_FIELDS:
+                if isinstance(value, dict) and value.get("owner") != self.owner:
+                    _apply_field(name, value.get("value"))
+                    self.pulled += 1
+            elif name in MAX_MERGE_FIELDS:
+                merged = _merge_max(getattr(config, name, None), value)
+                if not isinstance(merged, dict):
+                    setattr(config, name, merged)
+            elif not self.is_leader and name in SHARED_FIELDS:
+                _apply_field(name, value)
+                self.pulled += 1
+
+    # ---------- Leadership ----------
+    def _try_lead(self) -> None:
+        leader = self.backend.acquire_lease(_LEASE_NAME, self.owner, self.lease_ttl)
+        if leader and not self.is_leader and not self._lost:
+            self.is_leader = True
+            config.logger.info("Shared state: %s is now the leader (background threads).", self.owner)
+            if self.on_leader:
+                self.on_leader()
+        elif not leader and self.is_leader:
+            self._lost_leadership()
+
+    def _lost_leadership(self) -> None:
+        """
+        حد تانى أخد الـ lease (الـ process ده كان واقف أكتر من الـ TTL).
+        الـ background threads مالهاش stop → الـ worker بيقفل نفسه (SIGTERM = graceful)
+        وgunicorn بيعمل respawn لـ worker جديد بيبدأ follower.
+        """
+        if self._lost:
+            return
+        self._lost = True
+        self.is_leader = False
+        config.logger.error(
+            "Shared state: %s lost leadership — stopping this worker so gunicorn respawns it.",
+            self.owner,
+        )
+        os.kill(os.getpid(), signal.SIGTERM)
+
+    def holds_lease(self) -> bool:
+        """
+        Fencing قبل أى إرسال جماعى من الـ background: بنجدد الـ lease ونتأكد إنه لسه بتاعنا
+        (مش بس is_leader اللى ممكن يكون قديم لحد الـ sync الجاى).
+        """
+        if not self.is_leader:
+            return False
+        try:
+            ok = self.backend.acquire_lease(_LEASE_NAME, self.owner, self.lease_ttl)
+        except Exception as e:
+            config.logger.exception("Shared state: lease check failed: %s", e)
+            return False
+        if not ok:
+            self._lost_leadership()
+        return ok
+
+    def sync_once(self) -> None:
+        self._try_lead()
+        if self.is_leader:
+            self._publish()
+        else:
+            items: Dict[str, bytes] = {}
+            self._collect_max_fields(items)
+            if items:
+                self.backend.set_many(items)
+        self._pull()
+        self._pull_chats()
+        self._pull_logs()
+        self.syncs += 1
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.sync_once()
+            except Exception as e:
+                self.errors += 1
+                config.logger.exception("Shared state sync error: %s", e)
+            time.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        # أول sync sync-ly → الـ leader بيتحدد قبل ما الـ worker يستقبل requests
+        try:
+            self.sync_once()
+        except Exception as e:
+            config.logger.exception("Shared state initial sync failed: %s", e)
+        self._thread = threading.Thread(target=self._run, name="shared_state", daemon=True)
+        self._thread.start()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend.name,
+            "owner": self.owner,
+            "is_leader": self.is_leader,
+            "version": self._version,
+            "syncs": self.syncs,
+            "published": self.published,
+            "pulled": self.pulled,
+            "errors": self.errors,
+        }
+
+
+def create_state_backend(kind: str, path: Optional[str] = None):
+    kind = (kind or "local").strip().lower()
+    if kind == "sqlite" and path:
+        return SQLiteStateBackend(path)
+    return LocalStateBackend()
+
+
+def start_shared_state(on_leader: Callable[[], None]) -> Optional[SharedState]:
+    """
+    STATE_BACKEND=local → None (الـ caller يشغّل الـ background threads مباشرة زى الأول).
+    غير كده: SharedState بيقرر مين الـ leader وبيشغّل on_leader فيه بس.
+    """
+    kind = (getattr(config, "STATE_BACKEND", "local") or "local").lower()
+    if kind == "local":
+        return None
+    if config.SHARED_STATE is not None:
+        return config.SHARED_STATE
+
+    backend = create_state_backend(kind, getattr(config, "STATE_DB", None))
+    state = SharedState(
+        backend,
+        on_leader=on_leader,
+        interval=float(getattr(config, "STATE_SYNC_INTERVAL_SECONDS", 1.0)),
+        lease_ttl=float(getattr(config, "STATE_LEASE_TTL_SECONDS", 15.0)),
+    )
+    config.SHARED_STATE = state
+    state.start()
+    return state
+
+
+def holds_background_lease() -> bool:
+    """True لو مفيش shared state (worker واحد) أو الـ process ده لسه الـ leader."""
+    state = getattr(config, "SHARED_STATE", None)
+    return state is None or state.holds_lease()
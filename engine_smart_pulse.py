@@ -2,7 +2,7 @@
 engine_smart_pulse.py
 
 ✅ Market Pulse Engine:
-- keeps small history buffer in config.REALTIME_CACHE
+- keeps history in the shared columnar PulseRing (engine_pulse_ring)
 - computes speed, acceleration, direction confidence
 - estimates regime (calm/expansion/explosion)
 - optional percentiles for vol/range when enough history exists
@@ -17,14 +17,28 @@ import time
 import math
 
 import config
+from engine_pulse_ring import PulseRing, PulseRingStats, get_pulse_ring
 
 
 # -------------------------
 # helpers
 # -------------------------
 
+# ساعة قابلة للاستبدال (Replay / Backtest بساعة محاكاة)
+_CLOCK = time.time
+
+
+def set_clock(clock=None) -> None:
+    """
+    clock: دالة بدون args ترجع timestamp بالثواني.
+    None → نرجع لـ time.time (الوضع الطبيعي).
+    """
+    global _CLOCK
+    _CLOCK = clock or time.time
+
+
 def _now() -> float:
-    return time.time()
+    return _CLOCK()
 
 
 def _clamp(x: float, lo: float, hi: float) -> float:
@@ -54,75 +68,77 @@ def _percentile(values: List[float], p: float) -> float:
     return float(d0 + d1)
 
 
-def _get_hist() -> List[Dict[str, Any]]:
+def _get_hist() -> PulseRing:
+    return get_pulse_ring()
+
+
+def _get_stats() -> Dict[str, Any]:
+    """
+    Rolling stats (vol / range) مربوطة بنفس الـ PulseRing.
+    لو الـ ring اتغير (replay) بنبنيها تاني وتلحق الموجود.
+    نافذة الإحصائيات مستقلة عن سعة الـ ring (PULSE_STATS_WINDOW).
+    """
+    ring = _get_hist()
     cache = getattr(config, "REALTIME_CACHE", None)
     if cache is None:
         config.REALTIME_CACHE = {}
         cache = config.REALTIME_CACHE
-    hist = cache.get("pulse_history")
-    if not isinstance(hist, list):
-        hist = []
-        cache["pulse_history"] = hist
-    return hist
+    stats = cache.get("pulse_stats")
+    if not isinstance(stats, dict) or stats.get("ring_id") != id(ring):
+        window = int(getattr(config, "PULSE_STATS_WINDOW", 40))
+        stats = {
+            "ring_id": id(ring),
+            "vol": PulseRingStats(ring, "vol", window),
+            "range": PulseRingStats(ring, "range_pct", window),
+        }
+        cache["pulse_stats"] = stats
+    return stats
 
 
 def _push_hist(item: Dict[str, Any], max_len: int = 60) -> None:
-    hist = _get_hist()
-    hist.append(item)
-    # keep last N
-    if len(hist) > max_len:
-        del hist[: len(hist) - max_len]
+    # max_len متساب للتوافق — السعة الفعلية = PULSE_RING_CAPACITY (مفيش del)
+    _get_hist().append(
+        float(item.get("t", _now())),
+        price=float(item.get("price") or 0.0),
+        change_pct=float(item.get("change_pct", 0.0)),
+        range_pct=float(item.get("range_pct", 0.0)),
+        vol=float(item.get("vol", 0.0)),
+    )
 
 
-def _direction_confidence(hist: List[Dict[str, Any]], lookback: int = 12) -> float:
+def _direction_confidence(hist: PulseRing, lookback: int = 12) -> float:
     """
     confidence: 0..100
     based on how consistent sign(change_pct) is in last lookback points.
     """
-    xs = hist[-lookback:] if len(hist) >= lookback else hist[:]
+    xs = hist.window("change_pct", lookback)
     if len(xs) < 3:
         return 0.0
 
-    signs = []
-    for it in xs:
-        ch = float(it.get("change_pct", 0.0))
-        if ch > 0.03:
-            signs.append(1)
-        elif ch < -0.03:
-            signs.append(-1)
-        else:
-            signs.append(0)
-
-    non_zero = [s for s in signs if s != 0]
-    if len(non_zero) < 3:
-        return 0.0
-
-    pos = sum(1 for s in non_zero if s > 0)
-    neg = sum(1 for s in non_zero if s < 0)
+    pos = sum(1 for ch in xs if ch > 0.03)
+    neg = sum(1 for ch in xs if ch < -0.03)
     total = pos + neg
-    if total == 0:
+    if total < 3:
         return 0.0
 
     consistency = max(pos, neg) / total  # 0.5..1.0
     return _clamp(consistency * 100.0, 0.0, 100.0)
 
 
-def _compute_speed(hist: List[Dict[str, Any]], lookback: int = 8) -> float:
+def _compute_speed(hist: PulseRing, lookback: int = 8) -> float:
     """
     Speed index: 0..50 تقريباً
     Uses average absolute delta of change_pct and range_pct.
     """
-    xs = hist[-lookback:] if len(hist) >= lookback else hist[:]
-    if len(xs) < 3:
+    ch = hist.window("change_pct", lookback)
+    if len(ch) < 3:
         return 0.0
+    rg = hist.window("range_pct", lookback)
 
-    deltas = []
-    for i in range(1, len(xs)):
-        a = float(xs[i].get("change_pct", 0.0))
-        b = float(xs[i - 1].get("change_pct", 0.0))
-        ra = float(xs[i].get("range_pct", 0.0))
-        rb = float(xs[i - 1].get("range_pct", 0.0))
-        deltas.append(abs(a - b) + 0.35 * abs(ra - rb))
+    deltas = [
+        abs(a - b) + 0.35 * abs(ra - rb)
+        for a, b, ra, rb in zip(ch[1:], ch, rg[1:], rg)
+    ]
 
     avg = sum(deltas) / max(1, len(deltas))
     # scale to a nicer index
@@ -179,6 +195,7 @@ def update_market_pulse(metrics: Dict[str, Any]) -> Dict[str, Any]:
     _push_hist(
         {
             "t": _now(),
+            "price": metrics.get("price", 0.0),
             "change_pct": change_pct,
             "range_pct": range_pct,
             "vol": vol,
@@ -187,8 +204,8 @@ def update_market_pulse(metrics: Dict[str, Any]) -> Dict[str, Any]:
     )
 
     # compute percentiles when enough history
-    vol_series = [float(it.get("vol", 0.0)) for it in hist[-40:]]
-    rng_series = [float(it.get("range_pct", 0.0)) for it in hist[-40:]]
+    vol_series = hist.window("vol", 40)
+    rng_series = hist.window("range_pct", 40)
 
     if len(vol_series) >= 10:
         vol_pct = _percentile(vol_series, 85.0)
@@ -204,28 +221,25 @@ def update_market_pulse(metrics: Dict[str, Any]) -> Dict[str, Any]:
         rng_rank = 0.0
 
     # speed/accel
-    prev_speed = float(hist[-2].get("speed_index", 0.0)) if len(hist) >= 2 else 0.0
+    prev_speed = float(hist.last("speed_index", back=2, default=0.0))
     speed = _compute_speed(hist, lookback=8)
     accel = _compute_accel(prev_speed, speed)
 
     conf = _direction_confidence(hist, lookback=12)
 
     current_regime = _regime(vol, range_pct, vol_rank, rng_rank)
-    prev_regime = None
-    try:
-        prev_regime = hist[-2].get("regime") if len(hist) >= 2 else None
-    except Exception:
-        prev_regime = None
+    prev_regime = hist.last("regime", back=2)
 
-    # store computed fields into latest hist item
+    # store computed fields into latest ring slot
     try:
-        hist[-1]["speed_index"] = speed
-        hist[-1]["accel_index"] = accel
-        hist[-1]["direction_confidence"] = conf
-        hist[-1]["regime"] = current_regime
-        hist[-1]["prev_regime"] = prev_regime
-        hist[-1]["vol_percentile"] = vol_rank
-        hist[-1]["range_percentile"] = rng_rank
+        hist.set_last(
+            speed_index=speed,
+            accel_index=accel,
+            direction_confidence=conf,
+            regime=current_regime,
+            vol_percentile=vol_rank,
+            range_percentile=rng_rank,
+        )
     except Exception:
         pass
 
@@ -303,6 +317,7 @@ def update_market_pulse(metrics: Dict[str, Any]) -> Dict[str, Any]:
     _push_hist(
         {
             "t": _now(),
+            "price": metrics.get("price", 0.0),
             "change_pct": change_pct,
             "range_pct": range_pct,
             "vol": vol,
@@ -313,41 +328,38 @@ def update_market_pulse(metrics: Dict[str, Any]) -> Dict[str, Any]:
     # recompute hist after pushing
     hist = _get_hist()
 
-    # rank-like percentile indicator
-    vol_series = [float(it.get("vol", 0.0)) for it in hist[-40:]]
-    rng_series = [float(it.get("range_pct", 0.0)) for it in hist[-40:]]
+    # rank-like percentile indicator (RollingStats → O(log n) بدل scan كامل)
+    stats = _get_stats()
+    vol_stats = stats["vol"].sync()
+    rng_stats = stats["range"].sync()
 
-    if len(vol_series) >= 10:
-        vol_rank = sum(1 for x in vol_series if x <= vol) / len(vol_series) * 100.0
-        rng_rank = sum(1 for x in rng_series if x <= range_pct) / len(rng_series) * 100.0
+    if len(vol_stats) >= 10:
+        vol_rank = vol_stats.rank_pct(vol)
+        rng_rank = rng_stats.rank_pct(range_pct)
     else:
         vol_rank = 0.0
         rng_rank = 0.0
 
     # speed/accel
-    prev_speed = float(hist[-2].get("speed_index", 0.0)) if len(hist) >= 2 else 0.0
+    prev_speed = float(hist.last("speed_index", back=2, default=0.0))
     speed = _compute_speed(hist, lookback=8)
     accel = _compute_accel(prev_speed, speed)
 
     conf = _direction_confidence(hist, lookback=12)
 
     current_regime = _regime(vol, range_pct, vol_rank, rng_rank)
-    prev_regime = None
-    try:
-        prev_regime = hist[-2].get("regime") if len(hist) >= 2 else None
-    except Exception:
-        prev_regime = None
+    prev_regime = hist.last("regime", back=2)
 
-    # store computed fields into latest hist item
+    # store computed fields into latest ring slot
     try:
-        hist[-1]["speed_index"] = speed
-        hist[-1]["accel_index"] = accel
-        hist[-1]["direction_confidence"] = conf
-        hist[-1]["regime"] = current_regime
-        hist[-1]["prev_regime"] = prev_regime
-        hist[-1]["vol_percentile"] = vol_rank
-        hist[-1]["range_percentile"] = rng_rank
-        hist[-1]["warmup_used"] = warmup_used
+        hist.set_last(
+            speed_index=speed,
+            accel_index=accel,
+            direction_confidence=conf,
+            regime=current_regime,
+            vol_percentile=vol_rank,
+            range_percentile=rng_rank,
+        )
     except Exception:
         pass
 
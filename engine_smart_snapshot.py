@@ -111,6 +111,23 @@ def compute_smart_market_snapshot(user_symbol: str = "BTCUSDT") -> Optional[Dict
             _safe_logger_info("Smart snapshot: no price data for %s", user_symbol)
             return None
 
+        return build_smart_snapshot_from_price_data(user_symbol, price_data)
+
+    except Exception as e:
+        _safe_logger_exception("Error in compute_smart_market_snapshot: %s", e)
+        return None
+
+
+def build_smart_snapshot_from_price_data(
+    user_symbol: str,
+    price_data: Dict[str, Any],
+) -> Optional[Dict[str, Any]]:
+    """
+    نفس Pipeline الـ Snapshot لكن من price_data جاهزة (بدون Network):
+    metrics → risk → pulse → events → classifier → zones.
+    بيستخدمها compute_smart_market_snapshot في اللايف والـ Replay Engine على شموع تاريخية.
+    """
+    try:
         price = float(price_data.get("price") or 0.0)
         change_pct = float(price_data.get("change_pct") or 0.0)
         high = float(price_data.get("high") or price)
@@ -180,7 +197,7 @@ def compute_smart_market_snapshot(user_symbol: str = "BTCUSDT") -> Optional[Dict
         return snapshot
 
     except Exception as e:
-        _safe_logger_exception("Error in compute_smart_market_snapshot: %s", e)
+        _safe_logger_exception("Error in build_smart_snapshot_from_price_data: %s", e)
         return None
 
 
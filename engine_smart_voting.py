@@ -0,0 +1,334 @@
+"""
+engine_smart_voting.py
+
+✅ الهدف: منطق قرار Smart Alert V11 (conditions + voting + gaps + sleep)
+كدالة نقية بدون إرسال/نوم/Telegram:
+- smart_alert_loop في services.py بيستخدمها في اللايف
+- Replay Engine بيستخدمها على شموع تاريخية بساعة محاكاة
+
+المدخلات: snapshot + الوقت الحالي + آخر أوقات تنبيه.
+المخرج: dict فيه القرار وكل المدخلات اللي اتبنى عليها.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+
+import config
+
+
+# Flavors اللي بتتحسب "Critical" (بتحدّث LAST_CRITICAL_ALERT_TS وبتتبعت بصوت)
+CRITICAL_FLAVORS = ("super_critical", "immediate", "v11_consensus", "failsafe_move")
+
+
+def _log_info(log: bool, msg: str, *args) -> None:
+    if not log:
+        return
+    try:
+        logger = getattr(config, "logger", None)
+        if logger:
+            logger.info(msg, *args)
+    except Exception:
+        pass
+
+
+def _extra_signal(snapshot: Dict[str, Any], *keys: str) -> Dict[str, Any]:
+    for k in keys:
+        v = snapshot.get(k)
+        if v:
+            return v
+    return {}
+
+
+def evaluate_smart_alert_decision(
+    snapshot: Dict[str, Any],
+    now_ts: float,
+    last_alert_ts: float = 0.0,
+    last_critical_ts: float = 0.0,
+    early_threshold: Optional[float] = None,
+    log: bool = True,
+) -> Dict[str, Any]:
+    """
+    نفس منطق V11 في smart_alert_loop بالظبط (بدون side effects).
+    """
+    metrics = snapshot["metrics"]
+    risk = snapshot["risk"]
+    alert_level = snapshot["alert_level"]
+    pulse = snapshot["pulse"]
+    events = snapshot.get("events") or {}
+
+    # إشارات إضافية (هارمونيك / موجى / ICT) لو التحليل بيطلّعها
+    harmonic = _extra_signal(snapshot, "harmonic", "harmonic_signal")
+    wave = _extra_signal(snapshot, "wave", "wave_signal", "elliott")
+    ict = _extra_signal(snapshot, "ict", "ict_signal")
+
+    change = metrics["change_pct"]
+    range_pct = metrics["range_pct"]
+    vol = metrics["volatility_score"]
+
+    level = alert_level["level"]       # none / low / medium / high / critical
+    shock_score = float(alert_level.get("shock_score") or 0.0)
+
+    speed_idx = float(pulse.get("speed_index", 0.0))
+    accel_idx = float(pulse.get("accel_index", 0.0))
+    direction_conf = float(pulse.get("direction_confidence", 0.0))
+
+    risk_score = float(risk.get("score") or 0.0)
+    structural_risk = float(risk.get("structural_risk", 0.0) or 0.0)
+
+    if early_threshold is None:
+        early_threshold = config.EARLY_WARNING_THRESHOLD
+
+    # -----------------------------
+    #   V11: composite & move intensity
+    # -----------------------------
+    composite_intensity = (
+        0.4 * shock_score
+        + 0.3 * speed_idx
+        + 0.3 * abs(accel_idx) * 100.0 / 3.0
+    )
+
+    # مؤشر "حركة فعلية" من التغير + مدى اليوم
+    move_intensity = (
+        abs(change) * 8.0  # مثلا 2% → 16 نقطة
+        + max(range_pct, 0.1) * 2.0
+    )
+
+    base_interval_min = max(0.5, float(config.SMART_ALERT_BASE_INTERVAL))  # بالدقايق
+    adaptive_interval_min = float(
+        snapshot.get("adaptive_interval", base_interval_min)
+    )
+    adaptive_interval_min = max(0.5, adaptive_interval_min)
+
+    # 1) super_critical: حالة انهيار/اندفاع عنيف جدًا
+    super_critical = (
+        level in ("high", "critical")
+        and shock_score >= 85
+        and speed_idx >= 70
+        and abs(accel_idx) >= 0.9
+    )
+
+    # 2) حالة حرجة قوية لكن ليست قصوى
+    immediate_condition = (
+        level in ("high", "critical")
+        and composite_intensity >= 70
+    ) or (
+        risk_score >= 75
+        and shock_score >= 60
+        and speed_idx >= 60
+    )
+
+    # 3) Early warning قوى قبل الحركة بدقائق
+    early_signal = None
+    early_condition = False
+    try:
+        from analysis_engine import detect_early_movement_signal
+
+        early_signal = detect_early_movement_signal(
+            metrics,
+            pulse,
+            events,
+            risk,
+        )
+        if (
+            early_signal
+            and early_signal.get("active")
+            and float(early_signal.get("score", 0.0)) >= early_threshold
+        ):
+            early_condition = True
+    except Exception:
+        early_signal = None
+        early_condition = False
+
+    # 4) نبض حركة عنيفة حتى لو level لسه medium
+    momentum_condition = False
+    if (
+        level in ("medium", "high", "critical")
+        and abs(change) >= 1.2
+        and speed_idx >= 55
+        and abs(accel_idx) >= 0.6
+        and vol >= 3.0
+    ):
+        momentum_condition = True
+
+    # -----------------------------
+    #   V11 Voting Engine — Harmonic / Wave / ICT + باقى المحركات
+    # -----------------------------
+    harmonic_active = False
+    try:
+        h_score = float(harmonic.get("score", 0.0) or 0.0)
+        harmonic_active = bool(harmonic.get("active")) or h_score >= 70.0
+    except Exception:
+        harmonic_active = False
+
+    wave_active = False
+    try:
+        w_score = float(wave.get("score", 0.0) or 0.0)
+        wave_active = bool(wave.get("active")) or w_score >= 70.0
+    except Exception:
+        wave_active = False
+
+    ict_active = False
+    try:
+        i_score = float(ict.get("score", 0.0) or 0.0)
+        ict_active = (
+            bool(ict.get("active"))
+            or bool(ict.get("killzone_alert"))
+            or i_score >= 65.0
+        )
+    except Exception:
+        ict_active = False
+
+    v11_votes = {
+        "shock": shock_score >= 60,
+        "speed": (speed_idx >= 55 and abs(accel_idx) >= 0.6),
+        "risk": risk_score >= 70 or structural_risk >= 60,
+        "early": early_condition,
+        "momentum": momentum_condition,
+        "direction_conf": abs(direction_conf) >= 65.0,
+        # حركة فعلية أعلى من threshold محترم
+        "real_move": (move_intensity >= 25.0),
+        "harmonic": harmonic_active,
+        "wave": wave_active,
+        "ict": ict_active,
+    }
+    v11_agree_count = sum(1 for v in v11_votes.values() if v)
+
+    # -----------------------------
+    #   تحديد نوع التنبيه + الفجوة الزمنية
+    # -----------------------------
+    send_immediate = False
+    send_normal = False
+    alert_flavor = None  # super_critical / immediate / early / momentum / normal / v11_consensus / failsafe_move
+
+    # الفاصل الزمني للحالات الحرجة (أقصر)
+    critical_gap = max(180.0, adaptive_interval_min * 60 * 0.4)  # ~3 دقائق كحد أدنى
+    # الفاصل الزمني للحالات العادية (أطول)
+    normal_gap = max(1200.0, adaptive_interval_min * 60 * 0.8)  # ~20 دقيقة كحد أدنى
+
+    if super_critical:
+        if (now_ts - last_critical_ts) >= critical_gap / 2:
+            send_immediate = True
+            alert_flavor = "super_critical"
+        else:
+            _log_info(
+                log,
+                "Super-critical condition detected but still inside hard gap (%.1fs), skip.",
+                critical_gap / 2,
+            )
+    else:
+        if immediate_condition:
+            if (now_ts - last_critical_ts) >= critical_gap:
+                send_immediate = True
+                alert_flavor = "immediate"
+            else:
+                _log_info(
+                    log,
+                    "Immediate condition detected but within critical gap (%.1fs), skip.",
+                    critical_gap,
+                )
+        elif early_condition:
+            # إنذار مبكر → نسمح بفاصل أقل لكن مع Silent
+            if (now_ts - last_alert_ts) >= critical_gap / 1.5:
+                send_immediate = True
+                alert_flavor = "early"
+            else:
+                _log_info(
+                    log,
+                    "Early warning detected but within early gap (%.1fs), skip.",
+                    critical_gap / 1.5,
+                )
+        elif momentum_condition:
+            if (now_ts - last_alert_ts) >= normal_gap / 2:
+                send_immediate = True
+                alert_flavor = "momentum"
+            else:
+                _log_info(
+                    log,
+                    "Momentum condition detected but within momentum gap (%.1fs), skip.",
+                    normal_gap / 2,
+                )
+        else:
+            # مفيش conditions قوية لكن المستوى العام medium/high
+            if level in ("medium", "high", "critical") and (
+                now_ts - last_alert_ts
+            ) >= normal_gap:
+                send_normal = True
+                alert_flavor = "normal"
+
+    # 👇 V11: توافق عالى بين المحركات حتى لو level = None
+    if not (send_immediate or send_normal):
+        if v11_agree_count >= 3 and (composite_intensity >= 60 or move_intensity >= 30):
+            # نمنع السبام برضه بفاصل زمنى معقول
+            if (now_ts - last_alert_ts) >= normal_gap / 2:
+                send_immediate = True
+                alert_flavor = "v11_consensus"
+                _log_info(
+                    log,
+                    "V11 consensus alert fired: votes=%d, composite=%.1f, move_intensity=%.1f",
+                    v11_agree_count,
+                    composite_intensity,
+                    move_intensity,
+                )
+            else:
+                _log_info(
+                    log,
+                    "V11 consensus detected but within gap (%.1fs), skip.",
+                    normal_gap / 2,
+                )
+
+    # 👇 failsafe: لو الحركة عنيفة جداً بغض النظر عن level
+    if not (send_immediate or send_normal):
+        if abs(change) >= 3.0 and move_intensity >= 35.0:
+            if (now_ts - last_alert_ts) >= normal_gap:
+                send_immediate = True
+                alert_flavor = "failsafe_move"
+                _log_info(
+                    log,
+                    "Failsafe move alert fired: change=%.2f move_intensity=%.1f",
+                    change,
+                    move_intensity,
+                )
+
+    # -----------------------------
+    #   نوم تكيفى بين الدورات
+    # -----------------------------
+    if (
+        super_critical
+        or immediate_condition
+        or early_condition
+        or momentum_condition
+        or (v11_agree_count >= 3)
+    ):
+        # فى الأجواء الساخنة أو توافق محركات عالى نتابع أسرع
+        sleep_seconds = max(15.0, adaptive_interval_min * 60 * 0.3)
+    else:
+        sleep_seconds = max(60.0, adaptive_interval_min * 60 * 0.7)
+
+    return {
+        "send": bool(send_immediate or send_normal),
+        "send_immediate": send_immediate,
+        "send_normal": send_normal,
+        "alert_flavor": alert_flavor,
+        "is_critical": alert_flavor in CRITICAL_FLAVORS,
+        "level": level,
+        "shock_score": shock_score,
+        "speed_index": speed_idx,
+        "accel_index": accel_idx,
+        "direction_confidence": direction_conf,
+        "risk_score": risk_score,
+        "structural_risk": structural_risk,
+        "composite_intensity": composite_intensity,
+        "move_intensity": move_intensity,
+        "super_critical": super_critical,
+        "immediate_condition": immediate_condition,
+        "early_condition": early_condition,
+        "momentum_condition": momentum_condition,
+        "early_signal": early_signal,
+        "votes": v11_votes,
+        "agree_count": v11_agree_count,
+        "critical_gap": critical_gap,
+        "normal_gap": normal_gap,
+        "adaptive_interval_min": adaptive_interval_min,
+        "sleep_seconds": sleep_seconds,
+    }
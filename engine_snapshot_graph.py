@@ -0,0 +1,75 @@
+"""
+engine_snapshot_graph.py
+
+✅ Snapshot DAG (memoized per market tick):
+- كل جزء من اللقطة = node باسم (metrics / risk / smart / fusion / mtf / v14 ...)
+- كل node معروف الـ deps بتاعته، وبيتحسب مرة واحدة بس لكل tick
+- أى تقرير بيطلب الـ nodes اللى محتاجها بس → مفيش engine بيتحسب مرتين
+  (ومفيش update_market_pulse مرتين فى نفس الـ tick)
+- lock لكل node: لو تقريرين طلبوا نفس الـ node فى نفس اللحظة، واحد بيحسب والتانى بيستنى
+
+الـ tick بيتحدد من tick_fn (فى analysis_engine = وقت MARKET_METRICS_CACHE).
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Any, Callable, Dict, Hashable, Sequence, Tuple
+
+
+class SnapshotGraph:
+    def __init__(self, tick_fn: Callable[[], Hashable]) -> None:
+        self._tick_fn = tick_fn
+        self._nodes: Dict[str, Tuple[Callable[..., Any], Tuple[str, ...]]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._memo: Dict[str, Tuple[Hashable, Any]] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    # ---------- Registration ----------
+    def add(self, name: str, fn: Callable[..., Any], deps: Sequence[str] = ()) -> None:
+        """fn بتاخد قيم الـ deps بالترتيب كـ positional args."""
+        self._nodes[name] = (fn, tuple(deps))
+        self._locks[name] = threading.Lock()
+        self._stats[name] = {"hits": 0, "misses": 0}
+
+    def node(self, name: str, deps: Sequence[str] = ()):
+        def _decorator(fn: Callable[..., Any]) -> Callable[..., Any]:
+            self.add(name, fn, deps)
+            return fn
+
+        return _decorator
+
+    # ---------- Evaluation ----------
+    def get(self, name: str) -> Any:
+        return self._resolve(name, self._tick_fn())
+
+    def get_many(self, *names: str) -> Tuple[Any, ...]:
+        tick = self._tick_fn()
+        return tuple(self._resolve(n, tick) for n in names)
+
+    def _resolve(self, name: str, tick: Hashable) -> Any:
+        entry = self._memo.get(name)
+        if entry is not None and entry[0] == tick:
+            self._stats[name]["hits"] += 1
+            return entry[1]
+
+        fn, deps = self._nodes[name]
+        with self._locks[name]:
+            entry = self._memo.get(name)
+            if entry is not None and entry[0] == tick:
+                self._stats[name]["hits"] += 1
+                return entry[1]
+
+            args = [self._resolve(d, tick) for d in deps]
+            value = fn(*args)
+            self._memo[name] = (tick, value)
+            self._stats[name]["misses"] += 1
+            return value
+
+    # ---------- Maintenance ----------
+    def invalidate(self) -> None:
+        """يمسح كل الـ memo (الـ tick الجاى هيحسب كله من جديد)."""
+        self._memo.clear()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {k: dict(v) for k, v in self._stats.items()}
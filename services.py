@@ -1,3 +1,4 @@
+import hashlib
 import logging
 import threading
 import time
@@ -25,6 +26,13 @@ from analysis_engine import (
     compute_smart_market_snapshot,
     format_ultra_pro_alert,
 )
+from engine_smart_voting import evaluate_smart_alert_decision
+from engine_checkpoint import checkpoint_loop, load_checkpoint, save_checkpoint
+from engine_prerender import get_prerendered, prerender_loop, register_report
+from engine_broadcast import get_broadcast_engine
+from engine_outbox import PRIORITY_ALERT, PRIORITY_BULK, get_outbox, start_outbox
+from engine_alert_store import record_alert
+from engine_shared_state import holds_background_lease
 
 logger = logging.getLogger(__name__)
 
@@ -158,28 +166,28 @@ def http_get(url: str, timeout: int = 10, **kwargs):
 
 def save_snapshot():
     """
-    حفظ حالة خفيفة من الكاش (اختياري). مبني على SNAPSHOT_FILE فى config.
+    حفظ Warm-start checkpoint (engine_checkpoint):
+    pulse history + indicator states + cooldowns + MARKET_METRICS_CACHE.
     """
-    if not getattr(config, "SNAPSHOT_FILE", None):
-        logger.info("No SNAPSHOT_FILE configured, skip save.")
-        return
     try:
-        import json
-
-        snapshot = {
-            "MARKET_METRICS_CACHE": config.MARKET_METRICS_CACHE,
-        }
-        with open(config.SNAPSHOT_FILE, "w", encoding="utf-8") as f:
-            json.dump(snapshot, f)
-        logger.info("Snapshot saved to %s", config.SNAPSHOT_FILE)
+        if save_checkpoint():
+            logger.info("Checkpoint saved.")
+        else:
+            logger.info("No checkpoint target configured, skip save.")
     except Exception as e:
         logger.exception("Error saving snapshot: %s", e)
 
 
 def load_snapshot():
     """
-    تحميل حالة خفيفة من الكاش (اختياري).
+    تحميل Warm-start checkpoint، ولو مش موجود نجرب الـ snapshot القديم (JSON).
     """
+    try:
+        if load_checkpoint():
+            return
+    except Exception as e:
+        logger.exception("Error loading checkpoint: %s", e)
+
     if not getattr(config, "SNAPSHOT_FILE", None):
         logger.info("No SNAPSHOT_FILE configured, skipping load.")
         return
@@ -199,7 +207,7 @@ def load_snapshot():
             )
         logger.info("Snapshot loaded from %s", config.SNAPSHOT_FILE)
     except Exception as e:
-        logger.exception("Error loading snapshot: %s", e)
+        logger.info("Legacy snapshot not loaded (%s): %s", config.SNAPSHOT_FILE, e)
 
 
 # =====================================================
@@ -236,6 +244,11 @@ def get_cached_response(key: str, builder_func, ttl: float | None = None) -> str
       - /weekly_report
       - إلخ
     """
+    # نص جاهز من الـ Pre-render (قراءة dict بس)
+    pre = get_prerendered(key)
+    if pre:
+        return pre
+
     cached = _get_cached_response(key)
     if cached:
         return cached
@@ -272,15 +285,22 @@ def broadcast_message_to_group(text: str):
         logger.exception("Error broadcasting message: %s", e)
 
 
-def broadcast_ultra_pro_to_all_chats(text: str, silent: bool = False) -> int:
+def broadcast_ultra_pro_to_all_chats(text: str, silent: bool = False, alert_key: str | None = None) -> int:
     """
     إرسال تنبيه Ultra PRO لجميع الشاتات المسجلة + جروب التحذيرات.
 
     - كل الشاتات (Users + Groups) → نفس نص التحذير.
     - شاتات الأدمن (ADMIN_CHAT_ID + EXTRA_ADMINS) → نفس التحذير لكن مع زر "عرض التفاصيل 📊".
+    - لو الـ Outbox شغال → الرسايل بتتحط فى SQLite (dedupe_key = alert_key:chat_id)
+      وبتكمل بعد أى ريستارت. الرقم الراجع = عدد الرسايل اللى دخلت الطابور.
+    - Fencing: لو الـ worker ده مبقاش الـ leader (shared state) → مفيش إرسال.
     """
     from config import KNOWN_CHAT_IDS, ALERT_TARGET_CHAT_ID, ADMIN_CHAT_ID
 
+    if not holds_background_lease():
+        logger.warning("broadcast_ultra_pro_to_all_chats: not the leader anymore — skipped.")
+        return 0
+
     total = 0
 
     # مجموعة الأدمنز (المالك + الأدمنات الإضافيين)
@@ -307,41 +327,64 @@ def broadcast_ultra_pro_to_all_chats(text: str, silent: bool = False) -> int:
     # الشات الأساسى للتحذيرات (غالباً جروب/قناة)
     target_chat = getattr(config, "ALERT_TARGET_CHAT_ID", None) or ADMIN_CHAT_ID
 
-    # أولاً: إرسال للتحذير الرئيسى (جروب/قناة أو الأدمن)
-    try:
-        if target_chat in admin_ids:
-            # لو الشات الأساسى نفسه أدمن → نفس الرسالة + زر التفاصيل
-            config.send_message_with_keyboard(target_chat, text, keyboard)
-        else:
-            # جروب/قناة للمستخدمين → رسالة عادية بدون زر
-            config.send_message(target_chat, text, silent=silent)
-        total += 1
-    except Exception as e:
-        logger.exception("Error sending Ultra PRO to main alert chat: %s", e)
+    def _payload(cid) -> dict:
+        payload = {"chat_id": cid, "text": text, "parse_mode": "HTML"}
+        if cid in admin_ids:
+            # أى أدمن → نفس التحذير + زر التفاصيل
+            payload["reply_markup"] = keyboard
+        elif silent:
+            payload["disable_notification"] = True
+        return payload
+
+    # أولاً: التحذير الرئيسى (جروب/قناة أو الأدمن) — أول job فى الطابور
+    payloads = [_payload(target_chat)]
 
-    # ثانياً: إرسال لكل الشاتات المعروفة (Users + Admins)
+    # ثانياً: كل الشاتات المعروفة (Users + Admins) بدون تكرار
+    seen = {target_chat}
     for cid in list(KNOWN_CHAT_IDS):
-        # نتجنب تكرار الإرسال لنفس الشات
-        if cid == target_chat:
+        if cid in seen:
             continue
-        try:
-            if cid in admin_ids:
-                # أى أدمن → نفس التحذير + زر التفاصيل
-                config.send_message_with_keyboard(cid, text, keyboard)
-            else:
-                # باقى المستخدمين → نفس التحذير بدون زر
-                config.send_message(cid, text, silent=silent)
-            total += 1
-        except Exception as e:
-            logger.exception(
-                "Error sending Ultra PRO to chat %s: %s",
-                cid,
-                e,
-            )
+        seen.add(cid)
+        payloads.append(_payload(cid))
+
+    # Outbox: enqueue بس (الثريد بتاعه بيبعت بنفس الـ Broadcast Engine)
+    outbox = get_outbox()
+    if outbox is not None:
+        if alert_key is None:
+            alert_key = hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+        queued = 0
+        for p in payloads:
+            if outbox.enqueue(p, dedupe_key=f"ultra:{alert_key}:{p['chat_id']}", priority=PRIORITY_ALERT):
+                queued += 1
+        config.LAST_BROADCAST_REPORT = {
+            "mode": "outbox",
+            "alert_key": alert_key,
+            "total": len(payloads),
+            "queued": queued,
+            "deduped": len(payloads) - queued,
+            "started_at": time.time(),
+        }
+        logger.info("Ultra PRO broadcast queued for %d/%d chats (key=%s).", queued, len(payloads), alert_key)
+        return queued
+
+    # Broadcast Engine: worker pool + token buckets (global / per-chat) + retry_after
+    try:
+        report = get_broadcast_engine().broadcast(payloads)
+    except Exception as e:
+        logger.exception("Error in Ultra PRO broadcast: %s", e)
+        return total
+
+    total = report["sent"]
+    config.LAST_BROADCAST_REPORT = report
 
     logger.info(
-        "Ultra PRO broadcast sent to %d chats (users + main group).",
-        total,
+        "Ultra PRO broadcast sent to %d/%d chats in %.1fs (%.1f msg/s, retries=%d, 429=%d).",
+        report["sent"],
+        report["total"],
+        report["duration_s"],
+        report["throughput_msg_s"],
+        report["retries"],
+        report["rate_limited"],
     )
     return total
 
@@ -454,6 +497,17 @@ def send_weekly_report_to_all_chats() -> int:
         logger.warning("No weekly report text generated for send_weekly_report_to_all_chats.")
         return 0
 
+    # Outbox → التقرير كله يدخل بأولوية منخفضة (الردود على الأوامر تعدّى قبله)
+    outbox = get_outbox()
+    if outbox is not None:
+        queued = 0
+        for cid in [ADMIN_CHAT_ID] + [c for c in list(KNOWN_CHAT_IDS) if c != ADMIN_CHAT_ID]:
+            payload = {"chat_id": cid, "text": text, "parse_mode": "HTML"}
+            if outbox.enqueue(payload, priority=PRIORITY_BULK):
+                queued += 1
+        logger.info("Weekly AI report queued for %d chats (admin + users).", queued)
+        return queued
+
     sent = 0
     # نرسل للأدمن أولًا (لو مش داخل فى KNOWN_CHAT_IDS)
     try:
@@ -494,7 +548,10 @@ def weekly_scheduler_loop():
             target_hour = config.WEEKLY_REPORT_HOUR_UTC
 
             if now.weekday() == target_weekday and now.hour == target_hour:
-                if not config.LAST_WEEKLY_RUN:
+                if not holds_background_lease():
+                    # مبقاش leader → الـ worker بيقفل، والتقرير على الـ leader الجديد
+                    pass
+                elif not config.LAST_WEEKLY_RUN:
                     logger.info("Running weekly report now (first in this window).")
                     run_weekly_ai_report()
                     config.LAST_WEEKLY_RUN = now
@@ -617,7 +674,8 @@ def realtime_engine_loop():
 
 def _append_alert_history(price, change, level, shock_score, immediate: bool):
     """
-    يسجّل أى تنبيه تم إرساله فى ALERT_HISTORY + config.ALERTS_HISTORY (بتاعة البوت القديم).
+    يسجّل أى تنبيه تم إرساله فى ALERT_HISTORY + config.ALERTS_HISTORY (بتاعة البوت القديم)
+    + الـ Alert Store الدائم (engine_alert_store).
     """
     entry = {
         "time": datetime.utcnow().isoformat(timespec="seconds"),
@@ -630,17 +688,27 @@ def _append_alert_history(price, change, level, shock_score, immediate: bool):
     }
     config.ALERT_HISTORY.append(entry)
     # كمان نضيفه على ALERTS_HISTORY القديم كـ log بسيط
-    config.ALERTS_HISTORY.append(
-        {
-            "time": entry["time"],
-            "source": "smart_auto",
-            "reason": f"level={level} shock={shock_score}",
-            "price": price,
-            "change_pct": change,
-        }
-    )
+    legacy = {
+        "time": entry["time"],
+        "source": "smart_auto",
+        "reason": f"level={level} shock={shock_score}",
+        "price": price,
+        "change_pct": change,
+    }
+    config.ALERTS_HISTORY.append(legacy)
+    config.share_append("ALERTS_HISTORY", legacy)
     logger.info("Smart alert history appended: %s", entry)
 
+    record_alert(
+        "smart_auto",
+        f"level={level} shock={shock_score}",
+        level=level,
+        price=price,
+        change_pct=change,
+        shock_score=shock_score,
+        immediate=immediate,
+    )
+
 
 def smart_alert_loop():
     """
@@ -672,24 +740,6 @@ def smart_alert_loop():
             pulse = snapshot["pulse"]
             events = snapshot.get("events") or {}
 
-            # إشارات إضافية (هارمونيك / موجى / ICT) لو التحليل بيطلّعها
-            harmonic = (
-                snapshot.get("harmonic")
-                or snapshot.get("harmonic_signal")
-                or {}
-            )
-            wave = (
-                snapshot.get("wave")
-                or snapshot.get("wave_signal")
-                or snapshot.get("elliott")
-                or {}
-            )
-            ict = (
-                snapshot.get("ict")
-                or snapshot.get("ict_signal")
-                or {}
-            )
-
             price = metrics["price"]
             change = metrics["change_pct"]
             range_pct = metrics["range_pct"]
@@ -722,21 +772,6 @@ def smart_alert_loop():
                 structural_risk,
             )
 
-            # -----------------------------
-            #   V11: composite & move intensity
-            # -----------------------------
-            composite_intensity = (
-                0.4 * shock_score
-                + 0.3 * speed_idx
-                + 0.3 * abs(accel_idx) * 100.0 / 3.0
-            )
-
-            # مؤشر "حركة فعلية" من التغير + مدى اليوم
-            move_intensity = (
-                abs(change) * 8.0  # مثلا 2% → 16 نقطة
-                + max(range_pct, 0.1) * 2.0
-            )
-
             # ====== FORCE TEST ULTRA PRO (One-Shot, Full Path) ======
             if getattr(config, "FORCE_TEST_ULTRA_PRO", False):
                 try:
@@ -751,7 +786,11 @@ def smart_alert_loop():
                             pass
 
                         # فى test mode نبعت بصوت واضح (بدون Silent)
-                        sent_count = broadcast_ultra_pro_to_all_chats(text, silent=False)
+                        sent_count = broadcast_ultra_pro_to_all_chats(
+                            text,
+                            silent=False,
+                            alert_key=f"force_test:{int(time.time() // 60)}",
+                        )
 
                         now_ts = time.time()
                         now_iso = datetime.utcnow().isoformat(timespec="seconds")
@@ -795,204 +834,24 @@ def smart_alert_loop():
             # ================================================================
 
             # -----------------------------
-            #   منطق اتخاذ القرار الأساسى (زى V10 تقريبًا)
+            #   منطق اتخاذ القرار (V11) — engine_smart_voting
+            #   (نفس الدالة بيستخدمها الـ Replay Engine)
             # -----------------------------
             now_ts = time.time()
-            last_alert_ts = getattr(config, "LAST_SMART_ALERT_TS", 0.0) or 0.0
-            last_critical_ts = getattr(config, "LAST_CRITICAL_ALERT_TS", 0.0) or 0.0
-
-            base_interval_min = max(0.5, float(config.SMART_ALERT_BASE_INTERVAL))  # بالدقايق
-            adaptive_interval_min = float(
-                snapshot.get("adaptive_interval", base_interval_min)
-            )
-            adaptive_interval_min = max(0.5, adaptive_interval_min)
-
-            # 1) super_critical: حالة انهيار/اندفاع عنيف جدًا
-            super_critical = (
-                level in ("high", "critical")
-                and shock_score >= 85
-                and speed_idx >= 70
-                and abs(accel_idx) >= 0.9
+            decision = evaluate_smart_alert_decision(
+                snapshot,
+                now_ts=now_ts,
+                last_alert_ts=getattr(config, "LAST_SMART_ALERT_TS", 0.0) or 0.0,
+                last_critical_ts=getattr(config, "LAST_CRITICAL_ALERT_TS", 0.0) or 0.0,
             )
 
-            # 2) حالة حرجة قوية لكن ليست قصوى
-            immediate_condition = (
-                level in ("high", "critical")
-                and composite_intensity >= 70
-            ) or (
-                risk_score >= 75
-                and shock_score >= 60
-                and speed_idx >= 60
-            )
-
-            # 3) Early warning قوى قبل الحركة بدقائق
-            early_signal = None
-            early_condition = False
-            try:
-                from analysis_engine import detect_early_movement_signal
-
-                early_signal = detect_early_movement_signal(
-                    metrics,
-                    pulse,
-                    events,
-                    risk,
-                )
-                if (
-                    early_signal
-                    and early_signal.get("active")
-                    and float(early_signal.get("score", 0.0)) >= config.EARLY_WARNING_THRESHOLD
-                ):
-                    early_condition = True
-            except Exception:
-                early_signal = None
-                early_condition = False
-
-            # 4) نبض حركة عنيفة حتى لو level لسه medium
-            momentum_condition = False
-            if (
-                level in ("medium", "high", "critical")
-                and abs(change) >= 1.2
-                and speed_idx >= 55
-                and abs(accel_idx) >= 0.6
-                and vol >= 3.0
-            ):
-                momentum_condition = True
-
-            # -----------------------------
-            #   V11 Voting Engine — Harmonic / Wave / ICT + باقى المحركات
-            # -----------------------------
-            # Harmonic vote
-            harmonic_active = False
-            try:
-                h_score = float(harmonic.get("score", 0.0) or 0.0)
-                harmonic_active = bool(harmonic.get("active")) or h_score >= 70.0
-            except Exception:
-                harmonic_active = False
-
-            # Wave / Elliott vote
-            wave_active = False
-            try:
-                w_score = float(wave.get("score", 0.0) or 0.0)
-                wave_active = bool(wave.get("active")) or w_score >= 70.0
-            except Exception:
-                wave_active = False
-
-            # ICT vote (killzones / liquidity zones / displacement)
-            ict_active = False
-            try:
-                i_score = float(ict.get("score", 0.0) or 0.0)
-                ict_active = (
-                    bool(ict.get("active"))
-                    or bool(ict.get("killzone_alert"))
-                    or i_score >= 65.0
-                )
-            except Exception:
-                ict_active = False
-
-            v11_votes = {
-                "shock": shock_score >= 60,
-                "speed": (speed_idx >= 55 and abs(accel_idx) >= 0.6),
-                "risk": risk_score >= 70 or structural_risk >= 60,
-                "early": early_condition,
-                "momentum": momentum_condition,
-                "direction_conf": abs(direction_conf) >= 65.0,
-                # حركة فعلية أعلى من threshold محترم
-                "real_move": (move_intensity >= 25.0),
-                "harmonic": harmonic_active,
-                "wave": wave_active,
-                "ict": ict_active,
-            }
-            v11_agree_count = sum(1 for v in v11_votes.values() if v)
-
-            # -----------------------------
-            #   تحديد نوع التنبيه + الفجوة الزمنية
-            # -----------------------------
-            send_immediate = False
-            send_normal = False
-            alert_flavor = None  # super_critical / immediate / early / momentum / normal / v11_consensus / failsafe_move
-
-            # الفاصل الزمني للحالات الحرجة (أقصر)
-            critical_gap = max(180.0, adaptive_interval_min * 60 * 0.4)  # ~3 دقائق كحد أدنى
-            # الفاصل الزمني للحالات العادية (أطول)
-            normal_gap = max(1200.0, adaptive_interval_min * 60 * 0.8)  # ~20 دقيقة كحد أدنى
-
-            # super_critical يغلب على أى شىء
-            if super_critical:
-                if (now_ts - last_critical_ts) >= critical_gap / 2:
-                    send_immediate = True
-                    alert_flavor = "super_critical"
-                else:
-                    logger.info(
-                        "Super-critical condition detected but still inside hard gap (%.1fs), skip.",
-                        critical_gap / 2,
-                    )
-            else:
-                if immediate_condition:
-                    if (now_ts - last_critical_ts) >= critical_gap:
-                        send_immediate = True
-                        alert_flavor = "immediate"
-                    else:
-                        logger.info(
-                            "Immediate condition detected but within critical gap (%.1fs), skip.",
-                            critical_gap,
-                        )
-                elif early_condition:
-                    # إنذار مبكر → نسمح بفاصل أقل لكن مع Silent
-                    if (now_ts - last_alert_ts) >= critical_gap / 1.5:
-                        send_immediate = True
-                        alert_flavor = "early"
-                    else:
-                        logger.info(
-                            "Early warning detected but within early gap (%.1fs), skip.",
-                            critical_gap / 1.5,
-                        )
-                elif momentum_condition:
-                    if (now_ts - last_alert_ts) >= normal_gap / 2:
-                        send_immediate = True
-                        alert_flavor = "momentum"
-                    else:
-                        logger.info(
-                            "Momentum condition detected but within momentum gap (%.1fs), skip.",
-                            normal_gap / 2,
-                        )
-                else:
-                    # مفيش conditions قوية لكن المستوى العام medium/high
-                    if level in ("medium", "high", "critical") and (
-                        now_ts - last_alert_ts
-                    ) >= normal_gap:
-                        send_normal = True
-                        alert_flavor = "normal"
-
-            # 👇 V11: توافق عالى بين المحركات حتى لو level = None
-            if not (send_immediate or send_normal):
-                if v11_agree_count >= 3 and (composite_intensity >= 60 or move_intensity >= 30):
-                    # نمنع السبام برضه بفاصل زمنى معقول
-                    if (now_ts - last_alert_ts) >= normal_gap / 2:
-                        send_immediate = True
-                        alert_flavor = "v11_consensus"
-                        logger.info(
-                            "V11 consensus alert fired: votes=%d, composite=%.1f, move_intensity=%.1f",
-                            v11_agree_count,
-                            composite_intensity,
-                            move_intensity,
-                        )
-                    else:
-                        logger.info(
-                            "V11 consensus detected but within gap (%.1fs), skip.",
-                            normal_gap / 2,
-                        )
-
-            # 👇 failsafe: لو الحركة عنيفة جداً بغض النظر عن level
-            if not (send_immediate or send_normal):
-                if abs(change) >= 3.0 and move_intensity >= 35.0:
-                    if (now_ts - last_alert_ts) >= normal_gap:
-                        send_immediate = True
-                        alert_flavor = "failsafe_move"
-                        logger.info(
-                            "Failsafe move alert fired: change=%.2f move_intensity=%.1f",
-                            change,
-                            move_intensity,
-                        )
+            send_immediate = decision["send_immediate"]
+            send_normal = decision["send_normal"]
+            alert_flavor = decision["alert_flavor"]
+            early_signal = decision["early_signal"]
+            v11_votes = decision["votes"]
+            composite_intensity = decision["composite_intensity"]
+            move_intensity = decision["move_intensity"]
 
             # -----------------------------
             #   إرسال التنبيه (Ultra PRO Alert)
@@ -1104,7 +963,12 @@ def smart_alert_loop():
                         silent_flag = True
 
                     # إرسال للجروب + كل المستخدمين المسجلين (مع زر للأدمن)
-                    sent_count = broadcast_ultra_pro_to_all_chats(text, silent=silent_flag)
+                    # مفتاح ثابت لنفس النوع فى نفس الـ 5 دقايق → مفيش تحذير مكرر بعد ريستارت
+                    sent_count = broadcast_ultra_pro_to_all_chats(
+                        text,
+                        silent=silent_flag,
+                        alert_key=f"{alert_flavor or 'unknown'}:{int(now_ts // 300)}",
+                    )
 
                     config.LAST_SMART_ALERT_TS = now_ts
                     if alert_flavor in ("super_critical", "immediate", "v11_consensus", "failsafe_move"):
@@ -1144,17 +1008,7 @@ def smart_alert_loop():
             # -----------------------------
             #   نوم تكيفى بين الدورات
             # -----------------------------
-            if (
-                super_critical
-                or immediate_condition
-                or early_condition
-                or momentum_condition
-                or (v11_agree_count >= 3)
-            ):
-                # فى الأجواء الساخنة أو توافق محركات عالى نتابع أسرع
-                sleep_seconds = max(15.0, adaptive_interval_min * 60 * 0.3)
-            else:
-                sleep_seconds = max(60.0, adaptive_interval_min * 60 * 0.7)
+            sleep_seconds = decision["sleep_seconds"]
 
             logger.debug("Smart alert V11 loop sleep: %.1fs", sleep_seconds)
             time.sleep(sleep_seconds)
@@ -1165,6 +1019,16 @@ def smart_alert_loop():
             time.sleep(60)
 
 
+# =====================================================
+#   Pre-render Registry (نفس مفاتيح get_cached_response)
+# =====================================================
+
+register_report("market_report", format_market_report)
+register_report("risk_test", format_risk_test)
+register_report("alert_text", format_ai_alert)
+register_report("btc_analysis", lambda: format_analysis("BTCUSDT"))
+
+
 # =====================================================
 #   Public Command Helpers (/market, /risk_test, /coin)
 # =====================================================
@@ -1516,6 +1380,9 @@ def start_background_threads(force: bool = False):
       - Watchdog
       - Keep-Alive (Anti-Sleep)
       - Supervisor (IMMORTAL MODE)
+      - Outbox (تسليم الرسايل الخارجة من SQLite)
+      - Checkpoint (Warm-start كل CHECKPOINT_INTERVAL_SECONDS)
+      - Pre-render (التقارير جاهزة فى REALTIME_CACHE)
       - Startup Broadcast (رسالة افتتاح بعد الريستارت — OWNER فقط)
     """
     if getattr(config, "THREADS_STARTED", False) and not force:
@@ -1569,6 +1436,30 @@ def start_background_threads(force: bool = False):
     )
     supervisor_thread.start()
 
+    # 📮 Outbox (SQLite) — أى رسايل فاضلة من قبل الريستارت بتكمل هنا
+    try:
+        start_outbox()
+    except Exception as e:
+        logger.exception("Failed to start outbox, falling back to direct sends: %s", e)
+        config.OUTBOX = None
+
+    # 💾 Warm-start checkpoint دورى (pulse / indicators / cooldowns)
+    checkpoint_thread = threading.Thread(
+        target=checkpoint_loop,
+        name="checkpoint",
+        daemon=True,
+    )
+    checkpoint_thread.start()
+
+    # 🖨 Pre-render للتقارير (الـ webhook بيقرا نص جاهز)
+    if getattr(config, "PRERENDER_ENABLED", True):
+        prerender_thread = threading.Thread(
+            target=prerender_loop,
+            name="prerender",
+            daemon=True,
+        )
+        prerender_thread.start()
+
     # 🔔 Startup broadcast بعد تشغيل كل الثريدات (يتبعت مرة واحدة بس بعد ثوانى) — OWNER فقط
     startup_thread = threading.Thread(
         target=run_startup_broadcast,
@@ -1636,6 +1527,10 @@ def get_school_cached_response(
     """
     cache_key = f"school:{school_name}:{symbol}"
 
+    pre = get_prerendered(cache_key)
+    if pre:
+        return pre
+
     cached = _school_cache_get(cache_key)
     if cached:
         return cached
@@ -1648,6 +1543,38 @@ def get_school_cached_response(
     return text
 
 
+def get_school_metrics(symbol: str, timeframe: str) -> dict | None:
+    """
+    Metrics للمدارس = سعر/تغير/تقلب الرمز (engine_metrics)
+    + المؤشرات التراكمية (engine_indicators): ema50 / ema200 / rsi / macd_signal ...
+    """
+    try:
+        from engine_metrics import get_market_metrics_cached as _symbol_metrics
+        from engine_indicators import get_indicator_values
+
+        metrics = _symbol_metrics(user_symbol=symbol)
+        if not metrics:
+            return None
+
+        merged = dict(metrics)
+        indicators = get_indicator_values(symbol, timeframe)
+        for key, value in (indicators or {}).items():
+            if key in ("symbol", "timeframe"):
+                continue
+            merged.setdefault(key, value)
+
+        # دعم/مقاومة تقريبية من Bollinger لو مفيش مصدر أدق
+        if merged.get("support") is None and indicators.get("bb_lower") is not None:
+            merged["support"] = indicators["bb_lower"]
+        if merged.get("resistance") is None and indicators.get("bb_upper") is not None:
+            merged["resistance"] = indicators["bb_upper"]
+
+        return merged
+    except Exception as e:
+        logger.exception("Error building school metrics for %s@%s: %s", symbol, timeframe, e)
+        return None
+
+
 # =====================================================
 #   SCHOOL 1: Classical TA — ULTRA
 # =====================================================
@@ -1658,9 +1585,7 @@ def generate_classical_ta_school(symbol: str, timeframe: str) -> str:
     يعتمد على الاتجاه، الزخم، المتوسطات، الدعوم والمقاومات، النماذج.
     """
     try:
-        from analysis_engine import get_market_metrics_cached
-
-        metrics = get_market_metrics_cached(symbol=symbol, timeframe=timeframe)
+        metrics = get_school_metrics(symbol, timeframe)
         if not metrics:
             return "⚠️ تعذّر جلب بيانات التحليل الفني الكلاسيكي حاليًا."
 
@@ -1739,9 +1664,7 @@ def get_classical_ta_school(symbol: str, timeframe: str) -> str:
 
 def generate_smc_school(symbol: str, timeframe: str) -> str:
     try:
-        from analysis_engine import get_market_metrics_cached
-
-        metrics = get_market_metrics_cached(symbol=symbol, timeframe=timeframe)
+        metrics = get_school_metrics(symbol, timeframe)
         if not metrics:
             return "⚠️ تعذّر جلب بيانات SMC حاليًا."
 
@@ -1801,9 +1724,7 @@ def get_smc_school(symbol: str, timeframe: str) -> str:
 
 def generate_wyckoff_school(symbol: str, timeframe: str) -> str:
     try:
-        from analysis_engine import get_market_metrics_cached
-
-        metrics = get_market_metrics_cached(symbol=symbol, timeframe=timeframe)
+        metrics = get_school_metrics(symbol, timeframe)
         if not metrics:
             return "⚠️ تعذّر جلب بيانات Wyckoff حاليًا."
 
@@ -1849,9 +1770,7 @@ def get_wyckoff_school(symbol: str, timeframe: str) -> str:
 
 def generate_ict_school(symbol: str, timeframe: str) -> str:
     try:
-        from analysis_engine import get_market_metrics_cached
-
-        metrics = get_market_metrics_cached(symbol=symbol, timeframe=timeframe)
+        metrics = get_school_metrics(symbol, timeframe)
         if not metrics:
             return "⚠️ تعذّر جلب بيانات ICT حاليًا."
 
@@ -1896,9 +1815,7 @@ def get_ict_school(symbol: str, timeframe: str) -> str:
 
 def generate_harmonic_school(symbol: str, timeframe: str) -> str:
     try:
-        from analysis_engine import get_market_metrics_cached
-
-        metrics = get_market_metrics_cached(symbol=symbol, timeframe=timeframe)
+        metrics = get_school_metrics(symbol, timeframe)
         if not metrics:
             return "⚠️ تعذّر جلب بيانات Harmonic حاليًا."
 
@@ -1941,9 +1858,7 @@ def get_harmonic_school(symbol: str, timeframe: str) -> str:
 
 def generate_elliott_school(symbol: str, timeframe: str) -> str:
     try:
-        from analysis_engine import get_market_metrics_cached
-
-        metrics = get_market_metrics_cached(symbol=symbol, timeframe=timeframe)
+        metrics = get_school_metrics(symbol, timeframe)
         if not metrics:
             return "⚠️ تعذّر جلب بيانات Elliott Wave حاليًا."
 